@@ -4,11 +4,27 @@ import sqlite3
 import time
 import argparse
 import traceback
+import json
+import shutil
+import stat
+import fcntl
+import re
+import itertools
+import socket
 from loguru import logger
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from fnmatch import fnmatch
+from contextlib import contextmanager, nullcontext
 import threading
+import queue
+import heapq
+import resource
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from database import ThreadConnections, execute_with_retry, savepoint, create_schema, bump_data_version, record_event
+from database import adjust_counter, refresh_counters, read_counters, counter_drift
+from database import SCAN_JOB_COLUMNS, scan_job_rows, get_scan_job, enqueue_scan_job
+import telemetry
 
 # Get directories from environment variables
 symlink_directories = os.getenv('SYMLINK_DIR')
@@ -18,6 +34,30 @@ scan_interval = int(os.getenv('SCAN_INTERVAL', '720'))  # Default to 12 hours if
 PENDING_DELETION_GRACE_SECONDS = int(os.getenv('PENDING_DELETION_GRACE_SECONDS', '60'))
 DRY_RUN = os.getenv('DRY_RUN', 'false').lower() == 'true'
 RUN_ON_STARTUP = os.getenv('RUN_ON_STARTUP', 'true').lower() == 'true'
+SCAN_WORKERS = int(os.getenv('SCAN_WORKERS', '1'))  # 1 keeps the serial walk
+SCAN_WORKER_MODE = os.getenv('SCAN_WORKER_MODE', 'threads').lower()
+INCREMENTAL_SCAN = os.getenv('INCREMENTAL_SCAN', 'false').lower() == 'true'
+FULL_SCAN_EVERY = int(os.getenv('FULL_SCAN_EVERY', '10'))  # Force a full scan every N scans (0 = never)
+LINK_MATCH_MODE = os.getenv('LINK_MATCH_MODE', 'path').lower()
+SCAN_CHECKPOINT_SECONDS = int(os.getenv('SCAN_CHECKPOINT_SECONDS', '60'))  # Seconds between saves of a running scan's partial results
+SCAN_SLICE_MINUTES = int(os.getenv('SCAN_SLICE_MINUTES', '0'))  # Pause scans after this long and continue on the next one (0 = off)
+EVENT_QUEUE_SIZE = int(os.getenv('EVENT_QUEUE_SIZE', '10000'))
+EVENT_FLUSH_INTERVAL = float(os.getenv('EVENT_FLUSH_INTERVAL', '1'))  # Seconds to collect events before writing
+EVENT_BATCH_SIZE = int(os.getenv('EVENT_BATCH_SIZE', '500'))
+METRICS_INTERVAL = int(os.getenv('METRICS_INTERVAL', '15'))  # Minutes between metrics history samples
+METRICS_RETENTION_DAYS = int(os.getenv('METRICS_RETENTION_DAYS', '90'))  # Days of raw/hourly samples kept (0 = forever)
+METRICS_EXPORT_SECONDS = int(os.getenv('METRICS_EXPORT_SECONDS', '15'))  # Seconds between /metrics snapshots (0 = off)
+DELETE_WORKERS = int(os.getenv('DELETE_WORKERS', '1'))  # 1 deletes one path at a time
+DELETE_OPS_PER_SECOND = float(os.getenv('DELETE_OPS_PER_SECOND', '0'))  # 0 = unlimited
+DELETE_BYTES_PER_SECOND = float(os.getenv('DELETE_BYTES_PER_SECOND', '0'))  # 0 = unlimited
+DELETION_BATCH_SIZE = 500  # Deletion records written per transaction
+PENDING_DELETION_POLL_SECONDS = 5  # How often pending deletions added by the web interface are picked up
+PENDING_DELETION_BATCH_SIZE = 500  # Pending deletions claimed per transaction
+SCAN_JOB_POLL_SECONDS = 2  # How often queued scan jobs are looked for
+SCAN_JOB_CHECK_SECONDS = 1  # How often a running scan checks whether it was cancelled
+SCAN_PROGRESS_SECONDS = 1  # How often a running scan publishes its progress
+SCAN_CHECKPOINT_MAX_HOURS = 24  # Older checkpoints are discarded instead of resumed
+SCAN_SLICE_REST_SECONDS = 60  # Pause between the slices of a sliced scan
 
 if not symlink_directories or not torrents_directories:
     logger.error("Required environment variables SYMLINK_DIR and TORRENTS_DIR must be set")
@@ -31,6 +71,58 @@ if scan_interval < 0:
     logger.error("SCAN_INTERVAL must be a positive number or 0 to disable")
     sys.exit(1)
 
+if SCAN_WORKERS < 1:
+    logger.error("SCAN_WORKERS must be at least 1")
+    sys.exit(1)
+
+if SCAN_WORKER_MODE not in ['threads', 'processes']:
+    logger.error("SCAN_WORKER_MODE must be either 'threads' or 'processes'")
+    sys.exit(1)
+
+if FULL_SCAN_EVERY < 0:
+    logger.error("FULL_SCAN_EVERY must be a positive number or 0 to disable")
+    sys.exit(1)
+
+if LINK_MATCH_MODE not in ['path', 'inode']:
+    logger.error("LINK_MATCH_MODE must be either 'path' or 'inode'")
+    sys.exit(1)
+
+if SCAN_CHECKPOINT_SECONDS < 1:
+    logger.error("SCAN_CHECKPOINT_SECONDS must be at least 1")
+    sys.exit(1)
+
+if SCAN_SLICE_MINUTES < 0:
+    logger.error("SCAN_SLICE_MINUTES must be a positive number or 0 to disable")
+    sys.exit(1)
+
+if EVENT_QUEUE_SIZE < 1 or EVENT_BATCH_SIZE < 1:
+    logger.error("EVENT_QUEUE_SIZE and EVENT_BATCH_SIZE must be at least 1")
+    sys.exit(1)
+
+if EVENT_FLUSH_INTERVAL < 0:
+    logger.error("EVENT_FLUSH_INTERVAL must be a positive number or 0 to disable batching")
+    sys.exit(1)
+
+if METRICS_INTERVAL < 1:
+    logger.error("METRICS_INTERVAL must be at least 1 minute")
+    sys.exit(1)
+
+if METRICS_RETENTION_DAYS < 0:
+    logger.error("METRICS_RETENTION_DAYS must be a positive number or 0 to keep everything")
+    sys.exit(1)
+
+if METRICS_EXPORT_SECONDS < 0:
+    logger.error("METRICS_EXPORT_SECONDS must be a positive number or 0 to disable")
+    sys.exit(1)
+
+if DELETE_WORKERS < 1:
+    logger.error("DELETE_WORKERS must be at least 1")
+    sys.exit(1)
+
+if DELETE_OPS_PER_SECOND < 0 or DELETE_BYTES_PER_SECOND < 0:
+    logger.error("DELETE_OPS_PER_SECOND and DELETE_BYTES_PER_SECOND must be positive numbers or 0 for no limit")
+    sys.exit(1)
+
 # Convert directories to lists and clean up paths
 symlink_directories = [path.strip() for path in symlink_directories.split(',') if path.strip()]
 torrents_directories = [path.strip() for path in torrents_directories.split(',') if path.strip()]
@@ -46,321 +138,1749 @@ logger.add(
     colorize=True,
 )
 
+# Each thread keeps one connection open for its lifetime
+db_connections = ThreadConnections()
+
 def get_db_connection():
-    conn = sqlite3.connect(db_file, timeout=30)  # 30 second timeout
-    # Enable WAL mode for better concurrency
-    conn.execute('PRAGMA journal_mode=WAL')
-    conn.execute('PRAGMA synchronous=NORMAL')
-    conn.execute('PRAGMA busy_timeout=30000')  # 30 second busy timeout
-    return conn
-
-def execute_with_retry(cursor, query, params=None, max_retries=3):
-    """Execute a query with retry logic for database locks"""
-    for attempt in range(max_retries):
-        try:
-            if params:
-                return cursor.execute(query, params)
-            else:
-                return cursor.execute(query)
-        except sqlite3.OperationalError as e:
-            if 'database is locked' in str(e) and attempt < max_retries - 1:
-                time.sleep(1)  # Wait 1 second before retrying
-                continue
-            raise
+    """Return this thread's persistent connection; callers must not close it"""
+    return db_connections.get(db_file)
+
+def migrate_symlinks_table(conn):
+    """Move the legacy per-row target/ref_count columns into the targets table."""
+    cursor = conn.cursor()
+    execute_with_retry(cursor, 'PRAGMA table_info(symlinks)')
+    columns = [col[1] for col in cursor.fetchall()]
+    if 'target' not in columns:
+        return
+
+    logger.info("🔄 Migrating symlinks table to the normalized targets schema...")
+    conn.execute('BEGIN TRANSACTION')
+    try:
+        execute_with_retry(cursor, 'DROP VIEW IF EXISTS symlink_targets')
+        execute_with_retry(cursor, 'ALTER TABLE symlinks RENAME TO symlinks_legacy')
+        execute_with_retry(cursor, '''
+        CREATE TABLE IF NOT EXISTS targets (
+            id INTEGER PRIMARY KEY,
+            path TEXT UNIQUE NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        # ref_count used to be copied onto every row and could drift, so recompute it
+        execute_with_retry(cursor, '''
+            INSERT OR IGNORE INTO targets (path, ref_count)
+            SELECT target, COUNT(*) FROM symlinks_legacy
+            WHERE target IS NOT NULL
+            GROUP BY target
+        ''')
+        execute_with_retry(cursor, '''
+        CREATE TABLE symlinks (
+            id INTEGER PRIMARY KEY,
+            symlink TEXT UNIQUE,
+            target_id INTEGER NOT NULL REFERENCES targets(id)
+        )
+        ''')
+        execute_with_retry(cursor, '''
+            INSERT INTO symlinks (id, symlink, target_id)
+            SELECT l.id, l.symlink, t.id
+            FROM symlinks_legacy l
+            JOIN targets t ON t.path = l.target
+        ''')
+        execute_with_retry(cursor, 'DROP TABLE symlinks_legacy')
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error migrating symlinks table: {e}")
+        raise
+
+    execute_with_retry(cursor, 'SELECT COUNT(*) FROM symlinks')
+    total = cursor.fetchone()[0]
+    execute_with_retry(cursor, 'SELECT COUNT(*) FROM targets')
+    unique = cursor.fetchone()[0]
+    logger.info(f"✅ Migrated {total} symlinks referencing {unique} targets")
 
 def create_table(conn):
+    migrate_symlinks_table(conn)
     cursor = conn.cursor()
     execute_with_retry(cursor, '''
-    CREATE TABLE IF NOT EXISTS symlinks (
+    CREATE TABLE IF NOT EXISTS targets (
         id INTEGER PRIMARY KEY,
-        symlink TEXT UNIQUE,
-        target TEXT,
-        ref_count INTEGER DEFAULT 1
+        path TEXT UNIQUE NOT NULL,
+        ref_count INTEGER NOT NULL DEFAULT 0
     )
     ''')
     execute_with_retry(cursor, '''
-    CREATE TABLE IF NOT EXISTS scan_times (
+    CREATE TABLE IF NOT EXISTS symlinks (
         id INTEGER PRIMARY KEY,
-        last_scan_time INTEGER,
-        scan_interval INTEGER
-    )
-    ''')
-    execute_with_retry(cursor, '''
-    CREATE TABLE IF NOT EXISTS deletions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        symlink TEXT NOT NULL,
-        target TEXT NOT NULL,
-        timestamp INTEGER NOT NULL,
-        reason TEXT
-    )
-    ''')
-    execute_with_retry(cursor, '''
-    CREATE TABLE IF NOT EXISTS metrics_history (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        total_symlinks INTEGER,
-        unique_targets INTEGER,
-        total_deletions INTEGER
-    )
-    ''')
-    execute_with_retry(cursor, '''
-    CREATE TABLE IF NOT EXISTS scan_statistics (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        scan_time INTEGER NOT NULL,
-        files_checked INTEGER DEFAULT 0,
-        files_deleted INTEGER DEFAULT 0,
-        folders_deleted INTEGER DEFAULT 0
+        symlink TEXT UNIQUE,
+        target_id INTEGER NOT NULL REFERENCES targets(id)
     )
     ''')
+    execute_with_retry(cursor, 'CREATE INDEX IF NOT EXISTS idx_symlinks_target_id ON symlinks(target_id)')
+    # Lets the web UI page through symlinks ordered by reference count without sorting
+    execute_with_retry(cursor, 'CREATE INDEX IF NOT EXISTS idx_targets_ref_count ON targets(ref_count)')
+    # Read-side view with the columns the web interface and backups expect
     execute_with_retry(cursor, '''
-    CREATE TABLE IF NOT EXISTS pending_deletions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        target TEXT NOT NULL,
-        scheduled_time INTEGER NOT NULL
-    )
+    CREATE VIEW IF NOT EXISTS symlink_targets AS
+    SELECT s.id, s.symlink, s.target_id, t.path AS target, t.ref_count
+    FROM symlinks s
+    JOIN targets t ON t.id = s.target_id
     ''')
+    create_schema(cursor)
+    # The counters' reconciliation point: write paths keep them up to date from
+    # here on, and anything they missed since the last start is corrected now
+    for name, (value, counted) in counter_drift(cursor).items():
+        logger.warning(f"⚠️ Counter {name} was {value} but the table has {counted} rows, correcting it")
+    refresh_counters(cursor)
+    backfill_metrics_rollup(cursor)
+    prune_metrics_history(cursor)
     conn.commit()
 
-def upsert_symlink(file_path, conn=None):
+def add_target_reference(cursor, target):
+    """Add one symlink reference to a target, returning (target_id, ref_count)."""
+    execute_with_retry(cursor, '''
+        INSERT INTO targets (path, ref_count) VALUES (?, 1)
+        ON CONFLICT(path) DO UPDATE SET ref_count = ref_count + 1
+    ''', (target,))
+    execute_with_retry(cursor, 'SELECT id, ref_count FROM targets WHERE path = ?', (target,))
+    target_id, ref_count = cursor.fetchone()
+    telemetry.inc('alfred_ref_count_changes_total', direction='increment')
+    if ref_count == 1:
+        adjust_counter(cursor, 'unique_targets', 1)
+        # Remove from pending_deletions since it now has a reference
+        execute_with_retry(cursor, 'DELETE FROM pending_deletions WHERE target = ?', (target,))
+        if cursor.rowcount > 0:
+            logger.info(f"🔄 Removed target {target} from pending deletion - now has reference")
+    return target_id, ref_count
+
+def release_target_reference(cursor, target_id):
+    """Drop one reference from a target, returning (path, ref_count).
+
+    Targets left without references are removed from the targets table.
+    """
+    execute_with_retry(cursor, 'UPDATE targets SET ref_count = ref_count - 1 WHERE id = ?', (target_id,))
+    execute_with_retry(cursor, 'SELECT path, ref_count FROM targets WHERE id = ?', (target_id,))
+    path, ref_count = cursor.fetchone()
+    telemetry.inc('alfred_ref_count_changes_total', direction='decrement')
+    if ref_count <= 0:
+        execute_with_retry(cursor, 'DELETE FROM targets WHERE id = ?', (target_id,))
+        adjust_counter(cursor, 'unique_targets', -1)
+    return path, ref_count
+
+def remove_symlink_entry(cursor, symlink):
+    """Remove a symlink row and release its target.
+
+    Returns (target, remaining ref_count), or None if the symlink is not tracked.
+    """
+    execute_with_retry(cursor, 'SELECT target_id FROM symlinks WHERE symlink = ?', (symlink,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    execute_with_retry(cursor, 'DELETE FROM symlinks WHERE symlink = ?', (symlink,))
+    adjust_counter(cursor, 'total_symlinks', -1)
+    return release_target_reference(cursor, row[0])
+
+def schedule_pending_deletion(cursor, target):
+    """Queue a target for deletion once the grace period has passed."""
+    scheduled_time = int(time.time()) + PENDING_DELETION_GRACE_SECONDS
+    execute_with_retry(cursor, '''
+        INSERT INTO pending_deletions (target, scheduled_time)
+        VALUES (?, ?)
+    ''', (target, scheduled_time))
+    telemetry.inc('alfred_deletions_scheduled_total')
+    pending_deletion_scheduler.notify(scheduled_time)
+    return scheduled_time
+
+def delete_old_target(old_target):
+    """Remove a target that lost its last symlink to a retarget, with delete_behavior"""
+    if not os.path.exists(old_target):
+        return
+    if delete_behavior == 'files':
+        os.remove(old_target)
+        logger.info(f"❌ Deleted old target file: {old_target}")
+    else:
+        parent_dir = os.path.dirname(old_target)
+        if os.path.exists(parent_dir):
+            shutil.rmtree(parent_dir)
+            logger.info(f"❌ Deleted old target folder: {parent_dir}")
+
+def upsert_symlink(file_path, conn=None, orphaned=None):
+    """Track a symlink and its target.
+
+    Commits on its own connection, or when conn is given, adds to the caller's
+    transaction inside a savepoint so a failing path leaves none of its
+    changes behind. A target left without symlinks by a retarget is only
+    removed from disk once the database change is committed: straight away,
+    or by the caller, who is handed it in the orphaned list.
+    """
     if os.path.islink(file_path):
         target = os.readlink(file_path)
         if not os.path.exists(target):
             logger.warning(f"⚠️ Target {target} does not exist for symlink {file_path}")
             return
+        should_commit = conn is None
+        if should_commit:
+            conn = get_db_connection()
+        old_targets = []
         try:
-            should_close = False
-            if conn is None:
-                conn = get_db_connection()
-                should_close = True
-            
-            cursor = conn.cursor()
-            # Check if the symlink already exists
-            execute_with_retry(cursor, 'SELECT target FROM symlinks WHERE symlink = ?', (file_path,))
-            symlink_row = cursor.fetchone()
-            if symlink_row:
-                # If the symlink exists but points to a different target, we need to handle that
-                old_target = symlink_row[0]
-                if old_target != target:
-                    # Decrement ref_count for old target
-                    execute_with_retry(cursor, 'SELECT ref_count FROM symlinks WHERE target = ?', (old_target,))
-                    old_ref_count = cursor.fetchone()[0]
-                    if old_ref_count > 1:
-                        execute_with_retry(cursor, 'UPDATE symlinks SET ref_count = ? WHERE target = ?', (old_ref_count - 1, old_target))
+            with nullcontext(conn.cursor()) if should_commit else savepoint(conn, 'upsert_symlink') as cursor:
+                # Check if the symlink already exists
+                execute_with_retry(cursor, '''
+                    SELECT s.target_id, t.path
+                    FROM symlinks s
+                    JOIN targets t ON t.id = s.target_id
+                    WHERE s.symlink = ?
+                ''', (file_path,))
+                symlink_row = cursor.fetchone()
+                if symlink_row:
+                    # If the symlink exists but points to a different target, we need to handle that
+                    old_target_id, old_target = symlink_row
+                    if old_target != target:
+                        # Decrement ref_count for old target
+                        _, old_ref_count = release_target_reference(cursor, old_target_id)
+                        if old_ref_count <= 0:
+                            # If this was the last reference to the old target, delete it
+                            old_targets.append(old_target)
+
+                        # Update the symlink to point to the new target
+                        target_id, _ = add_target_reference(cursor, target)
+                        execute_with_retry(cursor, 'UPDATE symlinks SET target_id = ? WHERE symlink = ?', (target_id, file_path))
+                        telemetry.inc('alfred_symlink_upserts_total')
                     else:
-                        # If this was the last reference to the old target, delete it
-                        if os.path.exists(old_target):
-                            if delete_behavior == 'files':
-                                os.remove(old_target)
-                                logger.info(f"❌ Deleted old target file: {old_target}")
-                            else:
-                                parent_dir = os.path.dirname(old_target)
-                                if os.path.exists(parent_dir):
-                                    import shutil
-                                    shutil.rmtree(parent_dir)
-                                    logger.info(f"❌ Deleted old target folder: {parent_dir}")
-                        execute_with_retry(cursor, 'DELETE FROM symlinks WHERE target = ?', (old_target,))
-                    
-                    # Update the symlink to point to the new target
-                    execute_with_retry(cursor, 'UPDATE symlinks SET target = ? WHERE symlink = ?', (target, file_path))
-                else:
-                    logger.info(f"🔗 Symlink {file_path} already exists in the database with the same target.")
-            else:
-                # Check if the target exists in symlinks table
-                execute_with_retry(cursor, 'SELECT ref_count FROM symlinks WHERE target = ?', (target,))
-                target_row = cursor.fetchone()
-                if target_row:
-                    ref_count = target_row[0] + 1
-                    execute_with_retry(cursor, 'UPDATE symlinks SET ref_count = ? WHERE target = ?', (ref_count, target))
-                    execute_with_retry(cursor, 'INSERT INTO symlinks (symlink, target, ref_count) VALUES (?, ?, ?)', (file_path, target, ref_count))
-                    logger.info(f"🔄 Incremented ref_count for target {target}, new ref_count is {ref_count}")
+                        logger.info(f"🔗 Symlink {file_path} already exists in the database with the same target.")
                 else:
-                    # Check if target is in pending_deletions table
-                    execute_with_retry(cursor, 'SELECT id FROM pending_deletions WHERE target = ?', (target,))
-                    pending_row = cursor.fetchone()
-                    if pending_row:
-                        # Remove from pending_deletions since it now has a reference
-                        execute_with_retry(cursor, 'DELETE FROM pending_deletions WHERE target = ?', (target,))
-                        logger.info(f"🔄 Removed target {target} from pending deletion - now has reference")
-                    
-                    ref_count = 1
-                    execute_with_retry(cursor, 'INSERT INTO symlinks (symlink, target, ref_count) VALUES (?, ?, ?)', (file_path, target, ref_count))
-                    logger.info(f"🆕 Created new target entry with ref_count {ref_count}")
-            
-            if should_close:
-                conn.commit()
-                conn.close()
-            
-            logger.info(f"🔗 Added/Updated symlink: {file_path} -> {target}")
+                    target_id, ref_count = add_target_reference(cursor, target)
+                    execute_with_retry(cursor, 'INSERT INTO symlinks (symlink, target_id) VALUES (?, ?)', (file_path, target_id))
+                    adjust_counter(cursor, 'total_symlinks', 1)
+                    telemetry.inc('alfred_symlink_upserts_total')
+                    if ref_count > 1:
+                        logger.info(f"🔄 Incremented ref_count for target {target}, new ref_count is {ref_count}")
+                    else:
+                        logger.info(f"🆕 Created new target entry with ref_count {ref_count}")
+                
+                if should_commit:
+                    bump_data_version(cursor)
+                    conn.commit()
         except Exception as e:
             logger.error(f"Error updating symlink {file_path}: {e}")
             logger.debug(traceback.format_exc())
-            if should_close:
-                conn.close()
+            if should_commit:
+                conn.rollback()
+            return
 
-def find_non_linked_files(torrents_directories, symlink_directories, dry_run=False, no_confirm=False, exclude_patterns=[]):
-    dst_links = set()
-    # First, scan all symlinks and add them to the database
-    logger.info("🔍 Scanning for existing symlinks...")
-    
-    # Open a single database connection for batch operations
-    with get_db_connection() as conn:
-        # Enable WAL mode for better performance
-        conn.execute('PRAGMA journal_mode=WAL')
-        conn.execute('PRAGMA synchronous=NORMAL')
-        conn.execute('PRAGMA cache_size=10000')
-        
-        # Start transaction
-        conn.execute('BEGIN TRANSACTION')
-        
+        logger.info(f"🔗 Added/Updated symlink: {file_path} -> {target}")
+        if orphaned is not None:
+            orphaned.extend(old_targets)
+        else:
+            for old_target in old_targets:
+                try:
+                    delete_old_target(old_target)
+                except OSError as e:
+                    logger.error(f"Error deleting old target {old_target}: {e}")
+        return target
+
+class ScanEntry:
+    """Picklable stand-in for os.DirEntry, used for cached listings and process-based scan workers."""
+    __slots__ = ('name', 'path', '_is_symlink', '_stat')
+
+    def __init__(self, name, path, is_symlink, stat_result=None):
+        self.name = name
+        self.path = path
+        self._is_symlink = is_symlink
+        self._stat = stat_result
+
+    @classmethod
+    def from_dir_entry(cls, entry, with_stat=False):
+        """Copy a DirEntry, optionally carrying over its (already fetched) stat result."""
+        stat_result = None
+        if with_stat:
+            try:
+                stat_result = entry.stat()
+            except OSError:
+                pass
+        return cls(entry.name, entry.path, entry.is_symlink(), stat_result)
+
+    def is_symlink(self):
+        return self._is_symlink
+
+    def stat(self, follow_symlinks=True):
+        if not follow_symlinks and self._is_symlink:
+            return os.lstat(self.path)
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+def scan_directory(path):
+    """List one directory the way a single os.walk step does.
+
+    Returns (file_entries, subdirectories). Symlinks to directories are neither
+    reported nor followed, and unreadable directories are skipped silently.
+    """
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    files.append(entry)
+                elif not entry.is_symlink():
+                    subdirs.append(entry.path)
+    except OSError:
+        pass
+    return files, subdirs
+
+def scan_directory_cached(path, cached):
+    """List a directory, reusing the cached listing while its mtime and ctime are unchanged.
+
+    Returns (file_entries, subdirectories, listing). listing is the fresh
+    (mtime_ns, ctime_ns, entries, subdirs) record to store in the directory
+    cache, or None when the cached record was reused.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return [], [], None
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_ctime_ns:
+        _, _, entries, subdirs = cached
+        files = [ScanEntry(name, os.path.join(path, name), is_symlink) for name, is_symlink in entries]
+        return files, [os.path.join(path, name) for name in subdirs], None
+
+    files, subdirs = scan_directory(path)
+    listing = (
+        st.st_mtime_ns,
+        st.st_ctime_ns,
+        [(entry.name, entry.is_symlink()) for entry in files],
+        [os.path.basename(subdir) for subdir in subdirs],
+    )
+    return files, subdirs, listing
+
+def scan_directory_job(path, cached, use_cache, portable, stat_files):
+    """Scan one directory for walk_directories, returning (file_entries, subdirectories, listing)."""
+    if use_cache:
+        files, subdirs, listing = scan_directory_cached(path, cached)
+    else:
+        files, subdirs = scan_directory(path)
+        listing = None
+    if stat_files:
+        # Fetch each entry's stat result here in the worker; DirEntry and ScanEntry keep it
+        for entry in files:
+            try:
+                entry.stat()
+            except OSError:
+                pass
+    if portable:
+        # DirEntry objects can't be pickled back from a worker process
+        files = [entry if isinstance(entry, ScanEntry) else ScanEntry.from_dir_entry(entry, stat_files) for entry in files]
+    return files, subdirs, listing
+
+class DirectoryCache:
+    """Directory listings persisted from earlier scans, validated by directory mtime/ctime.
+
+    A directory's mtime and ctime change whenever an entry is added, removed
+    or renamed in it, so an unchanged directory can be served from its cached
+    listing without being read again. Every directory is still stat'ed once
+    per scan, because changes don't propagate up to parent directories.
+    """
+
+    # Directories modified this recently are not cached, since a change landing
+    # within the same mtime tick as our listing would otherwise go unnoticed.
+    RECENT_CHANGE_SECONDS = 2
+
+    def __init__(self, records, reuse=True):
+        self.records = records
+        self.reuse = reuse
+        self.updates = {}
+        self.visited = set()
+        self.skipped = set()
+        self.hits = 0
+        self.misses = 0
+        self.started = time.time()
+
+    @classmethod
+    def load(cls, conn, reuse=True):
+        cursor = conn.cursor()
+        execute_with_retry(cursor, 'SELECT path, mtime_ns, ctime_ns, entries, subdirs FROM directory_cache')
+        records = {
+            path: (mtime_ns, ctime_ns, [tuple(entry) for entry in json.loads(entries)], json.loads(subdirs))
+            for path, mtime_ns, ctime_ns, entries, subdirs in cursor.fetchall()
+        }
+        return cls(records, reuse)
+
+    def get(self, path):
+        return self.records.get(path) if self.reuse else None
+
+    def visit(self, path, listing):
+        self.visited.add(path)
+        if listing is None:
+            self.hits += 1
+            return
+        self.misses += 1
+        if listing[0] / 1e9 < self.started - self.RECENT_CHANGE_SECONDS:
+            self.updates[path] = listing
+
+    def skip(self, path):
+        """Keep the records below path, which this scan doesn't walk"""
+        self.skipped.add(path)
+
+    def is_skipped(self, path):
+        while path not in self.skipped:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return False
+            path = parent
+        return True
+
+    def save(self, conn, roots):
+        """Persist fresh listings and forget directories under roots that were not seen."""
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT OR REPLACE INTO directory_cache (path, mtime_ns, ctime_ns, entries, subdirs)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (
+            (path, mtime_ns, ctime_ns, json.dumps(entries), json.dumps(subdirs))
+            for path, (mtime_ns, ctime_ns, entries, subdirs) in self.updates.items()
+        ))
+        prefixes = tuple(os.path.join(root, '') for root in roots)
+        stale = [
+            (path,) for path in self.records
+            if path not in self.visited and (path in roots or path.startswith(prefixes))
+            and not (self.skipped and self.is_skipped(path))
+        ]
+        cursor.executemany('DELETE FROM directory_cache WHERE path = ?', stale)
+        conn.commit()
+        self.updates = {}
+
+def walk_directories(roots, workers=None, mode=None, cache=None, stat_files=False, skip_units=(), unit_done=None, prune=None):
+    """Yield (directory, file_entries) for every directory below roots.
+
+    With a single worker this is a serial depth-first walk. Otherwise each
+    subdirectory is handed to a thread or process pool as soon as its parent
+    has been listed, so latency-bound mounts are scanned concurrently across
+    all roots. Directories are yielded in completion order; the set of
+    results is the same as the serial walk.
+
+    When a DirectoryCache is given, unchanged directories are served from it
+    and fresh listings are recorded on it for DirectoryCache.save. With
+    stat_files, each file entry's stat() is fetched by the workers so the
+    caller gets it without another syscall. Subdirectories for which
+    prune(path) returns True are not walked.
+
+    Each root on its own and each subtree directly below a root form a unit
+    (see ScanCheckpoint). Subtrees in skip_units are not walked at all and a
+    root in skip_units is listed but not yielded; unit_done is called with
+    every other unit once all of its directories have been yielded.
+    """
+    workers = workers or SCAN_WORKERS
+    mode = mode or SCAN_WORKER_MODE
+    use_cache = cache is not None
+    portable = workers > 1 and mode == 'processes'
+    outstanding = dict.fromkeys(roots, 1)  # Directories of each unit not yielded yet
+
+    def job(path):
+        return (path, cache.get(path) if use_cache else None, use_cache, portable, stat_files)
+
+    def children(unit, subdirs, is_root):
+        """(subdirectory, unit, is_root) for the subdirectories to walk"""
+        if prune is not None:
+            subdirs = [subdir for subdir in subdirs if not prune(subdir)]
+        if not is_root:
+            outstanding[unit] += len(subdirs)
+            return [(subdir, unit, False) for subdir in subdirs]
+        walked = []
+        for subdir in subdirs:
+            if subdir in skip_units:
+                if use_cache:
+                    cache.skip(subdir)
+                continue
+            outstanding[subdir] = outstanding.get(subdir, 0) + 1
+            walked.append((subdir, subdir, False))
+        return walked
+
+    def finished(unit):
+        outstanding[unit] -= 1
+        if not outstanding[unit]:
+            del outstanding[unit]
+            if unit_done is not None and unit not in skip_units:
+                unit_done(unit)
+
+    if workers <= 1:
+        stack = [(root, root, True) for root in reversed(roots)]
+        while stack:
+            path, unit, is_root = stack.pop()
+            files, subdirs, listing = scan_directory_job(*job(path))
+            if use_cache:
+                cache.visit(path, listing)
+            if not (is_root and path in skip_units):
+                yield path, files
+            stack.extend(reversed(children(unit, subdirs, is_root)))
+            finished(unit)
+        return
+
+    if portable:
+        # spawn avoids forking a process that is already running watchdog threads
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan')
+
+    with executor:
+        pending = {executor.submit(scan_directory_job, *job(root)): (root, root, True) for root in roots}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, unit, is_root = pending.pop(future)
+                files, subdirs, listing = future.result()
+                if use_cache:
+                    cache.visit(path, listing)
+                for child in children(unit, subdirs, is_root):
+                    pending[executor.submit(scan_directory_job, *job(child[0]))] = child
+                if not (is_root and path in skip_units):
+                    yield path, files
+                finished(unit)
+
+def use_incremental_scan(conn, full_scan=False):
+    """Decide whether the next scan may serve unchanged directories from the cache.
+
+    A full scan is forced on request and after every FULL_SCAN_EVERY - 1
+    incremental scans.
+    """
+    if not INCREMENTAL_SCAN or full_scan:
+        return False
+    cursor = conn.cursor()
+    execute_with_retry(cursor, "SELECT MAX(id) FROM scan_statistics WHERE scan_mode = 'full'")
+    last_full_scan = cursor.fetchone()[0]
+    if last_full_scan is None:
+        return False
+    if FULL_SCAN_EVERY:
+        execute_with_retry(cursor, 'SELECT COUNT(*) FROM scan_statistics WHERE id > ?', (last_full_scan,))
+        if cursor.fetchone()[0] >= FULL_SCAN_EVERY - 1:
+            return False
+    return True
+
+def reconcile_symlinks(conn, links, unwalked=None):
+    """Make the symlinks and targets tables match the (symlink, target) pairs found by a scan.
+
+    The pairs are streamed into a temporary table, then the database is
+    diffed against it with a handful of set-based statements instead of
+    one upsert per symlink. Targets that lost their last reference are
+    dropped from the table; deleting the files themselves is left to the
+    scan's unused-file phase. unwalked(symlink), if given, is True for
+    symlinks in parts of the tree this walk did not list; their rows are
+    kept even when they are missing from links. Returns a dict of row
+    counts per change.
+    """
+    cursor = conn.cursor()
+    execute_with_retry(cursor, 'DROP TABLE IF EXISTS temp.scan_links')
+    execute_with_retry(cursor, 'CREATE TEMP TABLE scan_links (symlink TEXT PRIMARY KEY, target TEXT NOT NULL)')
+    # Writes to the temp table don't lock the main database, so event
+    # handlers keep working while the walk is streamed in
+    cursor.executemany('INSERT OR REPLACE INTO temp.scan_links (symlink, target) VALUES (?, ?)', links)
+    execute_with_retry(cursor, 'DROP TABLE IF EXISTS temp.scan_unwalked')
+    execute_with_retry(cursor, 'CREATE TEMP TABLE scan_unwalked (symlink TEXT PRIMARY KEY)')
+    if unwalked is not None:
+        execute_with_retry(cursor, 'SELECT symlink FROM symlinks WHERE symlink NOT IN (SELECT symlink FROM temp.scan_links)')
+        missing = cursor.fetchall()
+        cursor.executemany('INSERT INTO temp.scan_unwalked (symlink) VALUES (?)', [row for row in missing if unwalked(row[0])])
+
+    counts = {}
+    execute_with_retry(cursor, '''
+        INSERT OR IGNORE INTO targets (path, ref_count)
+        SELECT DISTINCT target, 0 FROM temp.scan_links
+    ''')
+    execute_with_retry(cursor, '''
+        DELETE FROM symlinks
+        WHERE symlink NOT IN (SELECT symlink FROM temp.scan_links)
+          AND symlink NOT IN (SELECT symlink FROM temp.scan_unwalked)
+    ''')
+    counts['removed'] = cursor.rowcount
+    execute_with_retry(cursor, '''
+        UPDATE symlinks SET target_id = t.id
+        FROM temp.scan_links l
+        JOIN targets t ON t.path = l.target
+        WHERE l.symlink = symlinks.symlink AND symlinks.target_id != t.id
+    ''')
+    counts['retargeted'] = cursor.rowcount
+    execute_with_retry(cursor, '''
+        INSERT INTO symlinks (symlink, target_id)
+        SELECT l.symlink, t.id
+        FROM temp.scan_links l
+        JOIN targets t ON t.path = l.target
+        WHERE NOT EXISTS (SELECT 1 FROM symlinks s WHERE s.symlink = l.symlink)
+    ''')
+    counts['new'] = cursor.rowcount
+    execute_with_retry(cursor, '''
+        UPDATE targets SET ref_count = refs.total
+        FROM (SELECT target_id, COUNT(*) AS total FROM symlinks GROUP BY target_id) AS refs
+        WHERE refs.target_id = targets.id AND targets.ref_count != refs.total
+    ''')
+    execute_with_retry(cursor, '''
+        DELETE FROM targets
+        WHERE NOT EXISTS (SELECT 1 FROM symlinks s WHERE s.target_id = targets.id)
+    ''')
+    counts['targets_removed'] = cursor.rowcount
+    # Targets that are linked again no longer need to be deleted
+    execute_with_retry(cursor, '''
+        DELETE FROM pending_deletions
+        WHERE target IN (SELECT path FROM targets)
+    ''')
+    if any(counts.values()):
+        refresh_counters(cursor)
+        bump_data_version(cursor)
+    conn.commit()
+    telemetry.inc('alfred_ref_count_changes_total', counts['new'] + counts['retargeted'], direction='increment')
+    telemetry.inc('alfred_ref_count_changes_total', counts['removed'] + counts['retargeted'], direction='decrement')
+    execute_with_retry(cursor, 'DROP TABLE IF EXISTS temp.scan_links')
+    execute_with_retry(cursor, 'DROP TABLE IF EXISTS temp.scan_unwalked')
+    return counts
+
+def link_key(entry):
+    """Key used to match torrent files against symlink targets.
+
+    In 'path' mode this is the fully resolved path. In 'inode' mode it is the
+    (st_dev, st_ino) pair from a single stat of the entry, following symlinks,
+    so hardlinked or bind-mounted copies of a linked file also count as used.
+    Returns None if the entry can't be resolved.
+    """
+    if LINK_MATCH_MODE == 'inode':
         try:
-            for symlink_directory in symlink_directories:
-                if not os.path.exists(symlink_directory):
-                    logger.warning(f"⚠️ Symlink directory {symlink_directory} does not exist or is not accessible.")
+            st = entry.stat()
+        except OSError:
+            return None
+        return (st.st_dev, st.st_ino)
+    return os.path.realpath(entry.path)
+
+def translate_exclude(pattern):
+    """Regex for one .gitignore-style pattern, matched against a path relative
+    to a torrent root; returns (regex, directories_only), or None for blank
+    and comment lines"""
+    pattern = pattern.strip()
+    if not pattern or pattern.startswith('#'):
+        return None
+    directories_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+    # A slash anywhere but the end anchors the pattern to the root; otherwise it matches at any depth
+    anchored = '/' in pattern
+    if pattern.endswith('/**'):
+        # Everything inside a folder is the same as the folder itself once its subtree is pruned
+        pattern = pattern[:-3]
+        directories_only = True
+    pattern = pattern.lstrip('/')
+
+    regex = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        at_segment_start = i == 0 or pattern[i - 1] == '/'
+        if at_segment_start and pattern.startswith('**/', i):
+            regex.append('(?:.*/)?')
+            i += 3
+        elif at_segment_start and pattern[i:] == '**':
+            regex.append('.*')
+            i += 2
+        elif char == '*':
+            regex.append('[^/]*')
+            i += 1
+        elif char == '?':
+            regex.append('[^/]')
+            i += 1
+        elif char == '[':
+            end = i + 1
+            if end < len(pattern) and pattern[end] in '!^':
+                end += 1
+            if end < len(pattern) and pattern[end] == ']':
+                end += 1
+            end = pattern.find(']', end)
+            if end == -1:
+                regex.append(re.escape(char))
+                i += 1
+                continue
+            members = pattern[i + 1:end].replace('\\', '\\\\')
+            if members[0] in '!^':
+                members = '^' + members[1:]
+            regex.append(f'[{members}]')
+            i = end + 1
+        elif char == '\\' and i + 1 < len(pattern):
+            regex.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            regex.append(re.escape(char))
+            i += 1
+    regex = ''.join(regex)
+    return (regex if anchored else f'(?:.*/)?{regex}'), directories_only
+
+class ExcludeMatcher:
+    """The --exclude patterns, compiled once into a regex for folders and one for files.
+
+    Patterns follow .gitignore rules relative to each torrent root: '*.part'
+    matches at any depth, 'incomplete/' only folders, '/incomplete' or
+    'a/b' only from the root, and '**' any number of folders. Absolute
+    patterns under a torrent root are anchored to it; ones outside every
+    root are ignored with a warning. Matching folders are pruned from the
+    walk, so nothing below them is ever listed.
+    """
+
+    def __init__(self, patterns, roots):
+        prefixes = [os.path.join(root, '') for root in roots]
+        folder_patterns = []
+        file_patterns = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            for prefix in prefixes:
+                if pattern.startswith(prefix):
+                    pattern = '/' + pattern[len(prefix):]
+                    break
+            else:
+                if os.path.isabs(pattern):
+                    logger.warning(f"⚠️ Ignoring exclude pattern {pattern}: it is not inside any torrent directory")
                     continue
-                for root, _, files in os.walk(symlink_directory):
-                    for entry in files:
-                        dst_path = os.path.join(root, entry)
-                        if os.path.islink(dst_path):
-                            dst_links.add(os.path.realpath(dst_path))
-                            upsert_symlink(dst_path, conn)
-            
-            # Commit the transaction
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Error during batch symlink processing: {e}")
+            translated = translate_exclude(pattern)
+            if translated is None:
+                continue
+            regex, directories_only = translated
+            folder_patterns.append(regex)
+            if not directories_only:
+                file_patterns.append(regex)
+        root_regex = '|'.join(re.escape(prefix) for prefix in prefixes)
+        self.folders = self.compile(root_regex, folder_patterns)
+        self.files = self.compile(root_regex, file_patterns)
+
+    @staticmethod
+    def compile(root_regex, patterns):
+        if not patterns:
+            return None
+        return re.compile(f"(?:{root_regex})(?:{'|'.join(patterns)})", re.DOTALL)
+
+    def __bool__(self):
+        return self.folders is not None
+
+    def excludes_folder(self, path):
+        return self.folders is not None and self.folders.fullmatch(path) is not None
+
+    def excludes_file(self, path):
+        return self.files is not None and self.files.fullmatch(path) is not None
+
+class RateLimiter:
+    """Token bucket shared by the deletion workers; a rate of 0 means unlimited.
+
+    Requests larger than the bucket (a big file against a bytes limit) are
+    allowed through and pay the difference back before the next one.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= min(amount, self.capacity):
+                    self.tokens -= amount
+                    return
+                delay = (min(amount, self.capacity) - self.tokens) / self.rate
+            time.sleep(delay)
+
+def path_size(path):
+    """Total size of the files under a folder"""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def delete_unused_path(path, file_path, reason, ops_limit, bytes_limit):
+    """Delete an unused file, or an unused folder. Runs on the deletion workers.
+
+    Returns the bytes freed, or None if the path is gone or has changed type.
+    """
+    try:
+        # Never follow a symlink into a folder that is about to be removed
+        st = os.lstat(path) if reason == 'unused_folder' else os.stat(path)
+    except FileNotFoundError:
+        return None  # Skip if the path doesn't exist
+    if reason == 'unused_file':
+        if not stat.S_ISREG(st.st_mode):
+            return None  # Skip directories or other non-file paths
+        logger.info(f"File {file_path} is not used!")
+        size = st.st_size
+    else:
+        if not stat.S_ISDIR(st.st_mode):
+            return None
+        logger.info(f"Folder {path} is not used!")
+        # Walking a folder costs a round trip per entry, so only do it when it is needed
+        size = path_size(path) if bytes_limit.rate > 0 else 0
+    bytes_limit.acquire(size)
+    ops_limit.acquire()
+    if reason == 'unused_file':
+        os.remove(path)
+        logger.info(f"File {path} deleted!")
+    else:
+        shutil.rmtree(path)
+        logger.info(f"Parent folder {path} deleted!")
+    return size
+
+class DeletionExecutor:
+    """Deletes unused files and folders on a bounded worker pool.
+
+    Workers only touch the filesystem; the calling thread records finished
+    deletions in batches of DELETION_BATCH_SIZE, so the connection is never
+    shared between threads.
+    """
+
+    def __init__(self, conn, workers=None, ops_per_second=None, bytes_per_second=None):
+        self.conn = conn
+        self.workers = workers or DELETE_WORKERS
+        self.ops_limit = RateLimiter(DELETE_OPS_PER_SECOND if ops_per_second is None else ops_per_second)
+        self.bytes_limit = RateLimiter(DELETE_BYTES_PER_SECOND if bytes_per_second is None else bytes_per_second)
+        self.pending = []
+        self.deleted_files = 0
+        self.deleted_folders = 0
+        self.bytes_deleted = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.db_seconds = 0.0
+
+    def run(self, operations):
+        """Execute (path, file_path, reason) operations; reason is 'unused_file' or 'unused_folder'"""
+        started = time.monotonic()
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                for operation in operations:
+                    # Keep a few operations queued per worker without materialising them all
+                    if len(in_flight) >= self.workers * 4:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        self.collect(in_flight, done)
+                    future = pool.submit(delete_unused_path, *operation, self.ops_limit, self.bytes_limit)
+                    in_flight[future] = operation
+            finally:
+                # Deletions already under way are recorded even if the operations stop early
+                while in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    self.collect(in_flight, done)
+                self.flush()
+                self.seconds = time.monotonic() - started
+        return self
+
+    def collect(self, in_flight, done):
+        for future in done:
+            path, file_path, reason = in_flight.pop(future)
+            try:
+                size = future.result()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Error deleting {'file' if reason == 'unused_file' else 'parent folder'} {path}: {e}")
+                logger.debug(traceback.format_exc())
+                continue
+            if size is None:
+                continue
+            if reason == 'unused_file':
+                self.deleted_files += 1
+            else:
+                self.deleted_folders += 1
+            self.bytes_deleted += size
+            self.pending.append((path, file_path, int(time.time()), reason))
+            if len(self.pending) >= DELETION_BATCH_SIZE:
+                self.flush()
+
+    def flush(self):
+        """Record the finished deletions in one transaction.
+
+        The paths are already gone from disk, so a row that cannot be written
+        must not take the rest of the batch with it: if the batch insert fails,
+        each deletion is recorded in its own savepoint and only the failing
+        ones are logged and dropped.
+        """
+        if not self.pending:
+            return
+        started = time.perf_counter()
+        pending, self.pending = self.pending, []
+        query = '''
+            INSERT INTO deletions (symlink, target, timestamp, reason)
+            VALUES (?, ?, ?, ?)
+        '''
+        try:
+            with savepoint(self.conn, 'record_deletions') as cursor:
+                cursor.executemany(query, pending)
+            recorded = pending
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Recording {len(pending)} deletions together failed ({e}), recording them one by one")
+            recorded = []
+            for row in pending:
+                try:
+                    with savepoint(self.conn, 'record_deletion') as cursor:
+                        execute_with_retry(cursor, query, row)
+                except sqlite3.Error as e:
+                    self.failures += 1
+                    logger.error(f"Error recording deletion of {row[0]}: {e}")
+                    logger.debug(traceback.format_exc())
+                    continue
+                recorded.append(row)
+        cursor = self.conn.cursor()
+        if recorded:
+            adjust_counter(cursor, 'total_deletions', len(recorded))
+            bump_data_version(cursor)
+        self.conn.commit()
+        for _, _, _, reason in recorded:
+            telemetry.inc('alfred_deletions_committed_total', reason=reason)
+        self.db_seconds += time.perf_counter() - started
+
+    @property
+    def rate(self):
+        """Deletions per second"""
+        deleted = self.deleted_files + self.deleted_folders
+        return deleted / self.seconds if self.seconds > 0 else 0.0
+
+def protected_folders(used_files, roots):
+    """Torrent roots plus every folder with a used file somewhere beneath it"""
+    protected = {os.path.normpath(root) for root in roots}
+    for file_path in used_files:
+        folder = os.path.dirname(file_path)
+        # Stop at the first folder already known, so shared ancestors are walked once
+        while folder not in protected:
+            protected.add(folder)
+            parent = os.path.dirname(folder)
+            if parent == folder:
+                break
+            folder = parent
+    return protected
+
+def plan_deletions(unused_files, used_files, roots, kept=()):
+    """Deletion operations for the unused files, deepest paths first.
+
+    In folder mode, unused files are grouped by parent folder and each folder
+    is checked once: folders holding nothing in use are removed with one
+    rmtree (nested ones collapse into their topmost folder), while torrent
+    roots and folders that also hold used files fall back to deleting just
+    their unused files. Folders holding a kept path (an excluded file or
+    folder) are protected the same way as those holding a used file.
+    """
+    operations = []
+    if delete_behavior == 'files':
+        operations = [(file_path, file_path, 'unused_file') for file_path in unused_files]
+    else:
+        folders = {}
+        for file_path in unused_files:
+            folders.setdefault(os.path.dirname(file_path), []).append(file_path)
+        protected = protected_folders(itertools.chain(used_files, kept), roots)
+        removable = {folder for folder in folders if folder not in protected}
+
+        def inside_removable(folder):
+            parent = os.path.dirname(folder)
+            while parent not in protected and parent != folder:
+                if parent in removable:
+                    return True
+                folder, parent = parent, os.path.dirname(parent)
+            return False
+
+        kept_files = 0
+        for folder, files in folders.items():
+            if folder in removable:
+                if not inside_removable(folder):
+                    operations.append((folder, min(files), 'unused_folder'))
+            else:
+                kept_files += len(files)
+                operations.extend((file_path, file_path, 'unused_file') for file_path in files)
+        if kept_files:
+            logger.info(f"🗂️ {kept_files} unused files share a folder with used files or a torrent root, deleting them individually")
+    operations.sort(key=lambda operation: (-operation[0].count(os.sep), operation[0]))
+    return operations
+
+def deletion_operations(plan, dry_run, no_confirm, checkpoint=None):
+    """Yield the planned operations to run, logging them on dry runs and asking first unless no_confirm is set"""
+    for path, file_path, reason in plan:
+        if checkpoint is not None:
+            checkpoint()
+        if dry_run:
+            if reason == 'unused_file':
+                logger.info(f"🟠 Dry-run: Would delete file: {path}")
+            else:
+                logger.info(f"🟠 Dry-run: Would delete parent folder: {path}")
+            continue
+        if not no_confirm:
+            if reason == 'unused_file':
+                response = input(f"Do you want to delete this file '{path}'? (y/n): ")
+            else:
+                response = input(f"Do you want to delete the parent folder '{path}'? (y/n): ")
+            if response.lower() != 'y':
+                logger.info(f"{'File' if reason == 'unused_file' else 'Parent folder'} not deleted!")
+                continue
+        yield path, file_path, reason
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS mark so the next reading covers only what follows"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass  # Not Linux, or not permitted; the reading falls back to the process lifetime peak
+
+def peak_rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+class ScanStats:
+    """Wall time, syscalls and database work of one scan, broken down by phase.
+
+    Syscalls are counted where the scan makes them rather than traced: one
+    scandir per directory listed (one stat instead when the directory cache
+    serves it), and the stat, readlink and realpath calls made per entry.
+    Statements are counted with a trace callback on the scan's connection and
+    charged to the current phase; database time is measured around the calls
+    that run them.
+    """
+
+    FIELDS = ('seconds', 'db_seconds', 'db_statements', 'items', 'scandir_calls', 'stat_calls', 'readlink_calls', 'realpath_calls')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.phases = {}
+        self.current = None
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        self.peak_rss_kb = 0
+        self.results = {}
+        reset_peak_rss()
+        conn.set_trace_callback(self.statement)
+
+    def record(self, phase):
+        if phase not in self.phases:
+            self.phases[phase] = dict.fromkeys(self.FIELDS, 0)
+        return self.phases[phase]
+
+    def statement(self, sql):
+        if self.current is not None:
+            self.phases[self.current]['db_statements'] += 1
+
+    def count(self, phase, **counts):
+        record = self.record(phase)
+        for name, value in counts.items():
+            record[name] += value
+
+    @contextmanager
+    def phase(self, phase, database=False):
+        """Time the body as phase; database phases count all of it as database time"""
+        record = self.record(phase)
+        previous, self.current = self.current, phase
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - started
+            record['seconds'] += elapsed
+            if database:
+                record['db_seconds'] += elapsed
+            self.current = previous
+
+    def detach(self):
+        """Stop counting statements; the connection is the thread's and outlives the scan"""
+        self.conn.set_trace_callback(None)
+
+    def finish(self):
+        self.detach()
+        self.seconds = time.perf_counter() - self.started
+        self.peak_rss_kb = peak_rss_kb()
+        return self
+
+    @property
+    def db_statements(self):
+        return sum(record['db_statements'] for record in self.phases.values())
+
+    @property
+    def db_seconds(self):
+        return sum(record['db_seconds'] for record in self.phases.values())
+
+    def save(self, cursor, scan_id):
+        cursor.executemany(f'''
+            INSERT INTO scan_phases (scan_id, phase, {', '.join(self.FIELDS)})
+            VALUES (?, ?, {', '.join('?' for _ in self.FIELDS)})
+        ''', [
+            (scan_id, phase, *(record[name] for name in self.FIELDS))
+            for phase, record in self.phases.items()
+        ])
+
+    def summary(self):
+        return ', '.join(f"{phase} {record['seconds']:.2f}s" for phase, record in self.phases.items())
+
+class ScanCancelled(Exception):
+    """Raised inside find_non_linked_files when its should_stop callback returns True"""
+
+class ScanPaused(Exception):
+    """Raised inside find_non_linked_files when its SCAN_SLICE_MINUTES are used up"""
+
+def stored_link_key(key):
+    """link_key() as stored in scan_staged_links: the path, or 'dev:ino' in inode mode"""
+    if key is None or isinstance(key, str):
+        return key
+    return f'{key[0]}:{key[1]}'
+
+class ScanCheckpoint:
+    """Partial results of a scan, kept in the database so it can resume after a restart.
+
+    Both walks are split into units: each root's own files, and each subtree
+    directly below a root. The walk's results are buffered per unit and,
+    once a unit is complete, written to scan_staged_links or
+    scan_staged_files together with its row in scan_units, at most every
+    SCAN_CHECKPOINT_SECONDS. A resumed scan skips the finished units without
+    touching the disk and walks the rest again. The checkpoint only
+    applies to a scan with the same directories and settings, and is
+    dropped when the scan completes.
+    """
+
+    def __init__(self, conn, config, phase='symlinks', started_at=None, runs=1, done=()):
+        self.conn = conn
+        self.config = config
+        self.phase = phase
+        self.started_at = started_at or int(time.time())
+        self.runs = runs
+        self.resumed = runs > 1
+        self.done = set(done)
+        self.earlier = set(done)  # Units of the current phase walked by earlier runs
+        self.roots = []
+        self.buffered = {}  # unit -> rows, while the unit is being walked
+        self.complete = []  # (unit, rows) waiting for the next save
+        self.units_finished = 0  # By this run
+        self.last_save = time.monotonic()
+
+    @classmethod
+    def open(cls, conn, config, full_scan=False):
+        """Resume the saved checkpoint if it matches config, or start a new one"""
+        cursor = conn.cursor()
+        execute_with_retry(cursor, 'SELECT phase, config, started_at, runs FROM scan_checkpoint WHERE id = 1')
+        row = cursor.fetchone()
+        if row is not None:
+            phase, saved_config, started_at, runs = row
+            if full_scan:
+                logger.info("🔁 Full scan requested, discarding the unfinished scan's checkpoint")
+            elif time.time() - started_at > SCAN_CHECKPOINT_MAX_HOURS * 3600:
+                logger.info(f"🔁 The unfinished scan is more than {SCAN_CHECKPOINT_MAX_HOURS} hours old, discarding its checkpoint")
+            elif json.loads(saved_config) != config:
+                logger.info("🔁 Directories or scan settings changed, discarding the unfinished scan's checkpoint")
+            else:
+                execute_with_retry(cursor, 'SELECT path FROM scan_units WHERE phase = ?', (phase,))
+                done = [path for path, in cursor.fetchall()]
+                execute_with_retry(cursor, 'UPDATE scan_checkpoint SET runs = runs + 1, updated_at = ? WHERE id = 1', (int(time.time()),))
+                conn.commit()
+                logger.info(
+                    f"♻️ Resuming the scan started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started_at))} "
+                    f"in its {phase} phase, {len(done)} directories already done"
+                )
+                return cls(conn, config, phase, started_at, runs + 1, done)
+            cls.clear(cursor)
+        checkpoint = cls(conn, config)
+        execute_with_retry(cursor, '''
+            INSERT INTO scan_checkpoint (id, phase, config, started_at, updated_at)
+            VALUES (1, ?, ?, ?, ?)
+        ''', (checkpoint.phase, json.dumps(config), checkpoint.started_at, checkpoint.started_at))
+        conn.commit()
+        return checkpoint
+
+    @staticmethod
+    def clear(cursor):
+        for table in ('scan_checkpoint', 'scan_units', 'scan_staged_links', 'scan_staged_files'):
+            execute_with_retry(cursor, f'DELETE FROM {table}')
+
+    def walk(self, roots, **options):
+        """walk_directories over roots, skipping the units finished by an earlier run"""
+        self.roots = [(root, os.path.join(root, '')) for root in roots]
+        return walk_directories(roots, skip_units=self.done, unit_done=self.unit_done, **options)
+
+    def unit_of(self, directory):
+        for root, prefix in self.roots:
+            if directory == root or directory + os.sep == prefix:
+                return root
+            if directory.startswith(prefix):
+                return prefix + directory[len(prefix):].split(os.sep, 1)[0]
+        return directory
+
+    def add(self, directory, rows):
+        """Buffer a walked directory's rows until its unit is complete"""
+        if rows:
+            self.buffered.setdefault(self.unit_of(directory), []).extend(rows)
+
+    def unit_done(self, unit):
+        self.complete.append((unit, self.buffered.pop(unit, [])))
+        self.units_finished += 1
+
+    def save(self, force=False):
+        """Write the completed units, at most every SCAN_CHECKPOINT_SECONDS unless forced"""
+        if not force and time.monotonic() - self.last_save < SCAN_CHECKPOINT_SECONDS:
+            return
+        self.last_save = time.monotonic()
+        if not self.complete:
+            return
+        cursor = self.conn.cursor()
+        try:
+            rows = (row for _, unit_rows in self.complete for row in unit_rows)
+            if self.phase == 'symlinks':
+                cursor.executemany('INSERT OR REPLACE INTO scan_staged_links (symlink, target, link_key) VALUES (?, ?, ?)', rows)
+            else:
+                cursor.executemany('INSERT OR REPLACE INTO scan_staged_files (path, used) VALUES (?, ?)', rows)
+            cursor.executemany(
+                'INSERT OR IGNORE INTO scan_units (phase, path) VALUES (?, ?)',
+                ((self.phase, unit) for unit, _ in self.complete)
+            )
+            execute_with_retry(cursor, 'UPDATE scan_checkpoint SET updated_at = ? WHERE id = 1', (int(time.time()),))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
             raise
+        self.done.update(unit for unit, _ in self.complete)
+        self.complete = []
+
+    def advance(self, phase):
+        """Move on to the next walk once the current one is saved"""
+        self.save(force=True)
+        self.phase = phase
+        self.done = set()
+        self.earlier = set()
+        self.buffered = {}
+        execute_with_retry(self.conn.cursor(), 'UPDATE scan_checkpoint SET phase = ?, updated_at = ? WHERE id = 1', (phase, int(time.time())))
+        self.conn.commit()
+
+    def links(self):
+        """(symlink, target) for every staged symlink whose target exists.
+
+        Links staged by an earlier run are read again (one readlink and stat,
+        no directory listing) and left out if they are gone or their target
+        no longer exists.
+        """
+        cursor = self.conn.cursor()
+        execute_with_retry(cursor, 'SELECT symlink, target FROM scan_staged_links WHERE target IS NOT NULL')
+        for symlink, target in cursor:
+            if self.staged_earlier(symlink):
+                try:
+                    target = os.readlink(symlink)
+                    os.stat(symlink)
+                except OSError:
+                    continue
+            yield symlink, target
+
+    def staged_earlier(self, symlink):
+        """Whether symlink is in a unit walked by an earlier run rather than this one"""
+        return bool(self.earlier) and self.unit_of(os.path.dirname(symlink)) in self.earlier
+
+    def link_keys(self):
+        cursor = self.conn.cursor()
+        execute_with_retry(cursor, 'SELECT link_key FROM scan_staged_links WHERE link_key IS NOT NULL')
+        return {key for key, in cursor.fetchall()}
+
+    def files(self):
+        """(path, used) for every staged torrent file; used is None for excluded files and folders"""
+        cursor = self.conn.cursor()
+        return execute_with_retry(cursor, 'SELECT path, used FROM scan_staged_files')
+
+    def relinked(self, candidates):
+        """The candidates a tracked symlink points at although no staged link does.
+
+        Symlinks created after their unit was staged are only known to the
+        event writer. Their targets are resolved and matched against the
+        candidates, so a file linked since the walk is never deleted.
+        """
+        cursor = self.conn.cursor()
+        execute_with_retry(cursor, '''
+            SELECT s.symlink, t.path
+            FROM symlinks s
+            JOIN targets t ON t.id = s.target_id
+            WHERE t.path NOT IN (SELECT target FROM scan_staged_links WHERE target IS NOT NULL)
+        ''')
+        keys = set()
+        for symlink, target in cursor.fetchall():
+            path = os.path.join(os.path.dirname(symlink), target)
+            keys.add(link_key(ScanEntry(os.path.basename(path), path, False)))
+        keys.discard(None)
+        if not keys:
+            return set()
+        return {path for path in candidates if link_key(ScanEntry(os.path.basename(path), path, False)) in keys}
+
+    def counts(self):
+        """Staged symlinks, symlinks with a missing target, torrent files and unused torrent files"""
+        cursor = self.conn.cursor()
+        execute_with_retry(cursor, '''
+            SELECT (SELECT COUNT(*) FROM scan_staged_links),
+                   (SELECT COUNT(*) FROM scan_staged_links WHERE target IS NULL),
+                   (SELECT COUNT(*) FROM scan_staged_files WHERE used IS NOT NULL),
+                   (SELECT COUNT(*) FROM scan_staged_files WHERE used = 0)
+        ''')
+        return cursor.fetchone()
+
+class ScanLock:
+    """Exclusive flock on a file next to the database, held while a scan runs.
+
+    Only one process (or thread) can hold it, so the daemon's scans and a
+    second alfred instance sharing the data directory never walk the same
+    trees at once. The kernel drops the lock when its holder exits, so a
+    crashed scan never leaves it behind.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(os.path.dirname(db_file), 'scan.lock')
+        self.file = None
+
+    def acquire(self):
+        """Take the lock if it is free; returns False if another scan holds it"""
+        lock_file = open(self.path, 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        lock_file.truncate(0)
+        lock_file.write(f'{os.getpid()}\n')
+        lock_file.flush()
+        self.file = lock_file
+        return True
 
-    used_files = set()
-    all_files = set()
+    def release(self):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+class ScanProgress:
+    """Live progress of a running scan, for /api/scan-status and /api/events.
+
+    The scan bumps the counters as it goes and calls publish() once per
+    directory and deletion. At most every SCAN_PROGRESS_SECONDS the current
+    state replaces the single scan_progress row and is sent as a
+    'scan_progress' event. Writes go through a connection of its own with a
+    short timeout and are skipped if the database is busy, so progress never
+    holds up the scan. Remaining time is estimated from the previous scan's totals.
+    """
+
+    def __init__(self):
+        self.phase = 'starting'
+        self.scan_mode = None
+        self.started = time.time()
+        self.phase_started = time.monotonic()
+        self.directories = 0
+        self.files = 0
+        self.symlinks = 0
+        self.torrent_files = 0
+        self.candidates = 0
+        self.operations = 0
+        self.executor = None
+        self.last_publish = 0.0
+        self.conn = None
+        self.expected_symlinks, self.expected_files = self.previous_totals()
+
+    def previous_totals(self):
+        """Symlinks and torrent files seen by the last scan, or None before the first one"""
+        cursor = get_db_connection().cursor()
+        execute_with_retry(cursor, '''
+            SELECT (SELECT items FROM scan_phases p WHERE p.scan_id = s.id AND p.phase = 'symlink_walk'),
+                   s.files_checked
+            FROM scan_statistics s
+            ORDER BY s.id DESC LIMIT 1
+        ''')
+        row = cursor.fetchone()
+        return row if row else (None, None)
+
+    def set_phase(self, phase):
+        self.phase = phase
+        self.phase_started = time.monotonic()
+        self.publish(force=True)
+
+    def eta_seconds(self, elapsed):
+        if self.phase in ('symlink_walk', 'torrent_walk'):
+            if self.expected_files is None:
+                return None
+            done = self.symlinks + self.torrent_files
+            remaining = (self.expected_symlinks or 0) + self.expected_files - done
+            return round(remaining * elapsed / done) if done and remaining > 0 else None
+        if self.phase == 'delete' and self.executor is not None:
+            finished = self.executor.deleted_files + self.executor.deleted_folders + self.executor.failures
+            remaining = self.operations - finished
+            if finished and remaining > 0:
+                return round(remaining * (time.monotonic() - self.phase_started) / finished)
+        return None
+
+    def snapshot(self):
+        elapsed = time.time() - self.started
+        data = {
+            'running': self.phase not in ('finished', 'paused', 'cancelled', 'failed'),
+            'phase': self.phase,
+            'scan_mode': self.scan_mode,
+            'started': int(self.started),
+            'elapsed_seconds': round(elapsed, 1),
+            'directories': self.directories,
+            'files': self.files,
+            'files_per_second': round(self.files / elapsed, 1) if elapsed > 0 else None,
+            'symlinks': self.symlinks,
+            'torrent_files': self.torrent_files,
+            'expected_symlinks': self.expected_symlinks,
+            'expected_files': self.expected_files,
+            'candidates': self.candidates,
+            'eta_seconds': self.eta_seconds(elapsed),
+        }
+        if self.executor is not None:
+            data['operations'] = self.operations
+            data['deleted'] = self.executor.deleted_files + self.executor.deleted_folders
+            data['delete_failures'] = self.executor.failures
+        return data
+
+    def publish(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_publish < SCAN_PROGRESS_SECONDS:
+            return
+        self.last_publish = now
+        data = self.snapshot()
+        try:
+            if self.conn is None:
+                self.conn = sqlite3.connect(db_file, timeout=0.2)
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                INSERT INTO scan_progress (id, data, updated_at) VALUES (1, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+            ''', (json.dumps(data), int(time.time())))
+            record_event(cursor, 'scan_progress', data, max_retries=1)
+            self.conn.commit()
+        except sqlite3.OperationalError as e:
+            if self.conn is not None:
+                self.conn.rollback()
+            logger.debug(f"Skipped a scan progress update: {e}")
+
+    def finish(self, phase='finished'):
+        self.set_phase(phase)
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+def find_non_linked_files(torrents_directories, symlink_directories, dry_run=False, no_confirm=False, exclude_patterns=[], full_scan=False, should_stop=None):
+    """Reconcile the symlinks table and delete torrent files no symlink points at.
+
+    should_stop is polled between directories and deletions; when it returns
+    True the scan stops with ScanCancelled. With SCAN_SLICE_MINUTES set, the
+    walks stop with ScanPaused once the slice is used up. Either way the
+    next scan resumes from the checkpoint, see ScanCheckpoint. Progress is
+    published as the scan runs, see ScanProgress. Returns the scan's ScanStats.
+    """
+    progress = ScanProgress()
+    stats = ScanStats(get_db_connection())
+    try:
+        scan_unused_files(stats, progress, torrents_directories, symlink_directories, dry_run, no_confirm, exclude_patterns, full_scan, should_stop)
+    except ScanCancelled:
+        progress.finish('cancelled')
+        raise
+    except ScanPaused:
+        progress.finish('paused')
+        raise
+    except BaseException:
+        progress.finish('failed')
+        raise
+    finally:
+        stats.detach()
+    progress.finish()
+    return stats
+
+def scan_unused_files(stats, progress, torrents_directories, symlink_directories, dry_run, no_confirm, exclude_patterns, full_scan, should_stop):
+    checkpoint = None
+    slice_ends = time.monotonic() + SCAN_SLICE_MINUTES * 60 if SCAN_SLICE_MINUTES else None
+
+    def check_in():
+        """Called once per directory and deletion"""
+        if should_stop is not None and should_stop():
+            # A cancelled scan is not picked up again by the next one
+            ScanCheckpoint.clear(checkpoint.conn.cursor())
+            checkpoint.conn.commit()
+            raise ScanCancelled()
+        # Each slice finishes at least one unit, so even a huge one is eventually done
+        if slice_ends is not None and time.monotonic() >= slice_ends and checkpoint.units_finished:
+            checkpoint.save(force=True)
+            raise ScanPaused()
+        checkpoint.save()
+        progress.publish()
+
+    # Incremental scans serve unchanged directories from the directory cache
+    directory_cache = None
+    incremental = False
+    if INCREMENTAL_SCAN:
+        with get_db_connection() as conn, stats.phase('directory_cache', database=True):
+            incremental = use_incremental_scan(conn, full_scan)
+            directory_cache = DirectoryCache.load(conn, reuse=incremental)
+    scan_mode = 'incremental' if incremental else 'full'
+    progress.scan_mode = scan_mode
+
+    symlink_roots = []
+    for symlink_directory in symlink_directories:
+        if not os.path.exists(symlink_directory):
+            logger.warning(f"⚠️ Symlink directory {symlink_directory} does not exist or is not accessible.")
+            continue
+        symlink_roots.append(symlink_directory)
 
+    torrent_roots = []
     for torrents_directory in torrents_directories:
         if not os.path.exists(torrents_directory):
             logger.warning(f"⚠️ Directory {torrents_directory} does not exist or is not accessible.")
             continue
+        torrent_roots.append(torrents_directory)
+
+    # A scan interrupted by a restart, or paused after its time slice, continues where it stopped
+    checkpoint = ScanCheckpoint.open(get_db_connection(), {
+        'scan_mode': scan_mode,
+        'symlink_roots': symlink_roots,
+        'torrent_roots': torrent_roots,
+        'link_match_mode': LINK_MATCH_MODE,
+        'exclude_patterns': list(exclude_patterns),
+        # Only a scan that may delete the same way finishes this one
+        'dry_run': bool(dry_run),
+        'no_confirm': bool(no_confirm),
+    }, full_scan)
+    if checkpoint.resumed:
+        progress.symlinks, _, progress.torrent_files, progress.candidates = checkpoint.counts()
+
+    logger.info(f"🔍 {'Resuming' if checkpoint.resumed else 'Starting'} {scan_mode} scan")
+    with get_db_connection() as conn:
+        record_event(conn.cursor(), 'scan', {'running': True, 'phase': checkpoint.phase, 'scan_mode': scan_mode})
 
-        for root, _, files in os.walk(torrents_directory):
-            # Skip excluded patterns
-            if any(fnmatch(root, pattern) for pattern in exclude_patterns):
-                continue
+    # Inode matching needs one stat per entry, which the scan workers fetch up front
+    stat_files = LINK_MATCH_MODE == 'inode'
+    # Path mode resolves each entry it matches instead
+    realpath_calls = 0 if stat_files else 1
+
+    def count_directories(phase, directories, misses_before):
+        if directory_cache is None:
+            stats.count(phase, scandir_calls=directories)
+        else:
+            # Cached directories are only stat'ed; the rest are listed again
+            stats.count(phase, stat_calls=directories, scandir_calls=directory_cache.misses - misses_before)
+
+    # Open a single database connection for batch operations
+    with get_db_connection() as conn:
+        # Enable WAL mode for better performance
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA cache_size=10000')
+
+        if checkpoint.phase == 'symlinks':
+            # First, scan all symlinks and add them to the database
+            logger.info("🔍 Scanning for existing symlinks...")
+            progress.set_phase('symlink_walk')
+            with stats.phase('symlink_walk') as record:
+                directories = 0
+                misses_before = directory_cache.misses if directory_cache is not None else 0
+                for root, entries in checkpoint.walk(symlink_roots, cache=directory_cache, stat_files=stat_files):
+                    check_in()
+                    directories += 1
+                    progress.directories += 1
+                    progress.files += len(entries)
+                    if stat_files:
+                        record['stat_calls'] += len(entries)
+                    links = []
+                    for entry in entries:
+                        if not entry.is_symlink():
+                            continue
+                        stats.count('symlink_walk', items=1, readlink_calls=1, stat_calls=0 if stat_files else 1, realpath_calls=realpath_calls)
+                        progress.symlinks += 1
+                        key = stored_link_key(link_key(entry))
+                        try:
+                            target = os.readlink(entry.path)
+                            entry.stat()  # Links whose target doesn't exist are staged without one
+                        except OSError:
+                            target = None
+                        links.append((entry.path, target, key))
+                    checkpoint.add(root, links)
+                count_directories('symlink_walk', directories, misses_before)
+                checkpoint.save(force=True)
 
-            for file in files:
-                file_path = os.path.join(root, file)
-                all_files.add(file_path)
+            try:
+                with stats.phase('symlink_db', database=True) as record:
+                    # Rows under units walked by an earlier run may have been added by the event writer since
+                    counts = reconcile_symlinks(conn, checkpoint.links(), unwalked=checkpoint.staged_earlier if checkpoint.earlier else None)
+                    staged_links, missing_targets, _, _ = checkpoint.counts()
+                    record['items'] = staged_links - missing_targets
+                logger.info(
+                    f"🔗 Symlinks reconciled: {counts['new']} new, {counts['retargeted']} retargeted, "
+                    f"{counts['removed']} removed, {counts['targets_removed']} unreferenced targets dropped"
+                )
+                if missing_targets:
+                    logger.warning(f"⚠️ Skipped {missing_targets} symlinks whose target does not exist")
+                # Bulk changes are reported as one summary instead of per-symlink deltas
+                record_event(conn.cursor(), 'scan', {'running': True, 'phase': 'torrents', 'scan_mode': scan_mode, 'symlinks': counts})
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Error during batch symlink processing: {e}")
+                raise
+            checkpoint.advance('torrents')
+        elif directory_cache is not None:
+            for root in symlink_roots:
+                directory_cache.skip(root)
+
+    dst_links = checkpoint.link_keys()
+    excludes = ExcludeMatcher(exclude_patterns, torrent_roots)
+
+    def prune(folder):
+        """Leave excluded folders out of the walk, staged as kept so deletions never touch them"""
+        if not excludes.excludes_folder(folder):
+            return False
+        checkpoint.add(os.path.dirname(folder), [(folder, None)])
+        return True
 
-                if any(fnmatch(file, pattern) for pattern in exclude_patterns):
+    progress.set_phase('torrent_walk')
+    with stats.phase('torrent_walk') as record:
+        directories = 0
+        misses_before = directory_cache.misses if directory_cache is not None else 0
+        walk = checkpoint.walk(torrent_roots, cache=directory_cache, stat_files=stat_files, prune=prune if excludes else None)
+        for root, entries in walk:
+            check_in()
+            directories += 1
+            progress.directories += 1
+            progress.files += len(entries)
+            progress.torrent_files += len(entries)
+            if stat_files:
+                record['stat_calls'] += len(entries)
+
+            files = []
+            for entry in entries:
+                file_path = entry.path
+                if excludes and excludes.excludes_file(file_path):
+                    files.append((file_path, None))
                     continue
 
-                src_file = os.path.realpath(file_path)
-                if src_file in dst_links:
-                    used_files.add(file_path)
-                    continue  # This file is used, move to the next file
+                record['items'] += 1
+                record['realpath_calls'] += realpath_calls
+                used = stored_link_key(link_key(entry)) in dst_links
+                files.append((file_path, used))
+                if not used:
+                    progress.candidates += 1
+            checkpoint.add(root, files)
+        count_directories('torrent_walk', directories, misses_before)
+        checkpoint.save(force=True)
+    dst_links = None  # Not needed for the deletions
+
+    if directory_cache is not None:
+        with get_db_connection() as conn, stats.phase('directory_cache', database=True):
+            directory_cache.save(conn, symlink_roots + torrent_roots)
+        logger.info(f"📂 Directory cache: {directory_cache.hits} unchanged, {directory_cache.misses} rescanned")
 
+    all_files = set()
+    used_files = set()
+    kept = []
+    for file_path, used in checkpoint.files():
+        if used is None:
+            kept.append(file_path)
+            continue
+        all_files.add(file_path)
+        if used:
+            used_files.add(file_path)
     unused_files = all_files - used_files
+    relinked = checkpoint.relinked(unused_files)
+    if relinked:
+        logger.info(f"🔗 Keeping {len(relinked)} files that were linked after the walk")
+        used_files |= relinked
+        unused_files -= relinked
+    if kept:
+        logger.info(f"🙈 Leaving {len(kept)} excluded files and folders alone")
 
     total_files = len(all_files)
-    deleted_files = 0
-    deleted_folders = 0
+    # Deletions run to the end once started; a restart during them plans them again
+    slice_ends = None
 
     with get_db_connection() as conn:
         cursor = conn.cursor()
         current_time = int(time.time())
 
-        for file_path in unused_files:
-            if not os.path.exists(file_path):
-                continue  # Skip if the file doesn't exist
-
-            if os.path.isfile(file_path):
-                logger.info(f"File {file_path} is not used!")
+        with stats.phase('delete') as record:
+            plan = plan_deletions(unused_files, used_files, torrent_roots, kept)
+            executor = progress.executor = DeletionExecutor(conn)
+            progress.operations = len(plan)
+            progress.set_phase('delete')
+            operations = deletion_operations(plan, dry_run, no_confirm, check_in)
+            if dry_run or not no_confirm:
+                # Dry-run output and prompts are finished before any deletion starts;
+                # otherwise the workers consume operations as they are produced
+                operations = list(operations)
+            executor.run(operations)
+            record['items'] = executor.deleted_files + executor.deleted_folders
+            record['db_seconds'] = executor.db_seconds
+        deleted_files = executor.deleted_files
+        deleted_folders = executor.deleted_folders
+        if executor.deleted_files or executor.deleted_folders or executor.failures:
+            logger.info(
+                f"🗑️ Deleted {deleted_files} files and {deleted_folders} folders "
+                f"({executor.bytes_deleted / 1024 / 1024:.1f} MB) in {executor.seconds:.1f}s: "
+                f"{executor.rate:.1f} deletions/s, {executor.failures} failures"
+            )
 
-                if dry_run:
-                    if delete_behavior == 'files':
-                        logger.info(f"🟠 Dry-run: Would delete file: {file_path}")
-                    else:
-                        parent_dir = os.path.dirname(file_path)
-                        logger.info(f"🟠 Dry-run: Would delete parent folder: {parent_dir}")
-                else:
-                    if no_confirm:
-                        response = 'y'
-                    else:
-                        if delete_behavior == 'files':
-                            response = input(f"Do you want to delete this file '{file_path}'? (y/n): ")
-                        else:
-                            parent_dir = os.path.dirname(file_path)
-                            response = input(f"Do you want to delete the parent folder '{parent_dir}'? (y/n): ")
-                    if response.lower() == 'y':
-                        try:
-                            if delete_behavior == 'files':
-                                os.remove(file_path)
-                                logger.info(f"File {file_path} deleted!")
-                                # Record deletion
-                                execute_with_retry(cursor, '''
-                                    INSERT INTO deletions (symlink, target, timestamp, reason)
-                                    VALUES (?, ?, ?, ?)
-                                ''', (file_path, file_path, current_time, 'unused_file'))
-                                deleted_files += 1
-                            else:
-                                parent_dir = os.path.dirname(file_path)
-                                import shutil
-                                shutil.rmtree(parent_dir)
-                                logger.info(f"Parent folder {parent_dir} deleted!")
-                                # Record deletion
-                                execute_with_retry(cursor, '''
-                                    INSERT INTO deletions (symlink, target, timestamp, reason)
-                                    VALUES (?, ?, ?, ?)
-                                ''', (parent_dir, file_path, current_time, 'unused_folder'))
-                                deleted_folders += 1
-                        except Exception as e:
-                            logger.error(f"Error deleting {'file' if delete_behavior == 'files' else 'parent folder'}: {e}")
-                            logger.error(traceback.format_exc())
-                    else:
-                        logger.info(f"{'File' if delete_behavior == 'files' else 'Parent folder'} not deleted!")
-            else:
-                # Skip directories or other non-file paths
-                continue
+        stats.finish()
+        stats.results = {
+            'files_checked': total_files,
+            'files_deleted': deleted_files,
+            'folders_deleted': deleted_folders,
+            'bytes_deleted': executor.bytes_deleted,
+        }
+        for phase, record in stats.phases.items():
+            telemetry.observe('alfred_scan_phase_seconds', record['seconds'], phase=phase)
+        telemetry.observe('alfred_scan_duration_seconds', stats.seconds, mode=scan_mode)
+        logger.info(
+            f"⏱️ Scan took {stats.seconds:.1f}s ({stats.summary()}); "
+            f"{stats.db_statements} statements in {stats.db_seconds:.1f}s, peak RSS {stats.peak_rss_kb / 1024:.0f} MB"
+        )
 
         # Record scan statistics
         execute_with_retry(cursor, '''
-            INSERT INTO scan_statistics (scan_time, files_checked, files_deleted, folders_deleted)
-            VALUES (?, ?, ?, ?)
-        ''', (current_time, total_files, deleted_files, deleted_folders))
+            INSERT INTO scan_statistics (
+                scan_time, files_checked, files_deleted, folders_deleted, scan_mode,
+                delete_seconds, delete_rate, bytes_deleted, delete_failures,
+                duration_seconds, peak_rss_kb, db_statements, db_seconds
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (current_time, total_files, deleted_files, deleted_folders, scan_mode,
+              executor.seconds, executor.rate, executor.bytes_deleted, executor.failures,
+              stats.seconds, stats.peak_rss_kb, stats.db_statements, stats.db_seconds))
+        stats.save(cursor, cursor.lastrowid)
+        ScanCheckpoint.clear(cursor)
+        record_event(cursor, 'scan', {
+            'running': False,
+            'scan_mode': scan_mode,
+            'files_checked': total_files,
+            'files_deleted': deleted_files,
+            'folders_deleted': deleted_folders,
+        })
+        bump_data_version(cursor)
         conn.commit()
 
     logger.info(f"Total files checked: {total_files}")
     logger.info(f"Total {'files' if delete_behavior == 'files' else 'parent folders'} deleted: {deleted_files if delete_behavior == 'files' else deleted_folders}")
-    
-    # Record metrics after scan
-    with get_db_connection() as conn:
-        update_metrics_if_needed(conn)
 
 def delete_missing_target(symlink, dry_run):
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        # First get the target and check remaining references
-        execute_with_retry(cursor, 'SELECT target FROM symlinks WHERE symlink = ?', (symlink,))
-        row = cursor.fetchone()
-        if row:
-            target = row[0]
+        # Remove the entry and check remaining references on its target
+        removed = remove_symlink_entry(cursor, symlink)
+        if removed:
+            target, remaining_refs = removed
             logger.info(f"🔍 Found target {target} for symlink {symlink}")
-            # Check how many symlinks point to this target
-            execute_with_retry(cursor, 'SELECT COUNT(*) FROM symlinks WHERE target = ?', (target,))
-            total_refs = cursor.fetchone()[0]
-            logger.info(f"🔍 Target {target} has {total_refs} references")
-            if total_refs == 1:
-                # This is the last reference, schedule for deletion
-                scheduled_time = int(time.time()) + PENDING_DELETION_GRACE_SECONDS
-                execute_with_retry(cursor, '''
-                    INSERT INTO pending_deletions (target, scheduled_time)
-                    VALUES (?, ?)
-                ''', (target, scheduled_time))
+            logger.info(f"🔍 Target {target} had {remaining_refs + 1} references")
+            if remaining_refs <= 0:
+                # This was the last reference, schedule for deletion
+                schedule_pending_deletion(cursor, target)
                 logger.info(f"⏳ Scheduled target {target} for deletion in {PENDING_DELETION_GRACE_SECONDS} seconds")
-                # Remove all entries for this target from the database
-                execute_with_retry(cursor, 'DELETE FROM symlinks WHERE target = ?', (target,))
                 logger.info(f"❌ Removed all database entries for target: {target}")
             else:
-                # Just remove this symlink entry
-                execute_with_retry(cursor, 'DELETE FROM symlinks WHERE symlink = ?', (symlink,))
-                logger.info(f"🔄 Target {target} still has {total_refs - 1} references")
+                logger.info(f"🔄 Target {target} still has {remaining_refs} references")
+            bump_data_version(cursor)
             conn.commit()
         else:
             logger.warning(f"⚠️ No database entry found for symlink {symlink}")
@@ -368,128 +1888,198 @@ def delete_missing_target(symlink, dry_run):
             try:
                 if os.path.islink(symlink):
                     target = os.readlink(symlink)
-                    scheduled_time = int(time.time()) + PENDING_DELETION_GRACE_SECONDS
-                    execute_with_retry(cursor, '''
-                        INSERT INTO pending_deletions (target, scheduled_time)
-                        VALUES (?, ?)
-                    ''', (target, scheduled_time))
+                    schedule_pending_deletion(cursor, target)
                     logger.info(f"⏳ Scheduled target {target} for deletion in {PENDING_DELETION_GRACE_SECONDS} seconds (no DB entry)")
             except Exception as e:
                 logger.error(f"Error handling symlink {symlink}: {e}")
                 logger.error(traceback.format_exc())
 
+def remove_symlink(cursor, symlink, record_deletion=True):
+    """Drop a vanished symlink and schedule its target once unreferenced.
+
+    Returns the target it pointed to, or None if the symlink was not tracked.
+    """
+    removed = remove_symlink_entry(cursor, symlink)
+    if not removed:
+        logger.debug(f"⚠️ Symlink {symlink} not found in the database.")
+        return None
+    target, ref_count = removed
+    if ref_count <= 0:
+        # Schedule for deletion instead of deleting immediately
+        schedule_pending_deletion(cursor, target)
+        logger.info(f"⏳ Scheduled target {target} for deletion in {PENDING_DELETION_GRACE_SECONDS} seconds (event handler)")
+        logger.info(f"❌ Removed symlink entry from database: {symlink} (was pointing to {target})")
+        reason = 'last_reference_deleted'
+    else:
+        logger.info(f"🔄 Decremented ref_count for target {target}, new ref_count is {ref_count}")
+        reason = 'symlink_deleted'
+    if record_deletion:
+        timestamp = int(time.time())
+        execute_with_retry(cursor, '''
+            INSERT INTO deletions (symlink, target, timestamp, reason)
+            VALUES (?, ?, ?, ?)
+        ''', (symlink, target, timestamp, reason))
+        adjust_counter(cursor, 'total_deletions', 1)
+        record_event(cursor, 'deletion', {'symlink': symlink, 'target': target, 'timestamp': timestamp, 'reason': reason})
+    return target
+
+class SymlinkEventQueue:
+    """Coalesce watchdog events and apply them from a single writer thread.
+
+    Events are collected for up to EVENT_FLUSH_INTERVAL seconds (or until
+    EVENT_BATCH_SIZE distinct paths are pending), keeping only the latest
+    event per path. Each path is then reconciled against the filesystem in
+    one transaction, so bursts like create+modify or create+delete collapse
+    into a single write or none at all.
+    """
+
+    _STOP = object()
+
+    def __init__(self, flush_interval=None, batch_size=None, maxsize=None):
+        self.flush_interval = EVENT_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.batch_size = batch_size or EVENT_BATCH_SIZE
+        self.events = queue.Queue(maxsize=maxsize or EVENT_QUEUE_SIZE)
+        self.thread = None
+        self.received = []  # When each event in the current batch was queued
+
+    def put(self, kind, path):
+        # Blocks the observer when the writer falls behind instead of growing without bound
+        self.events.put((kind, path, time.monotonic()))
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='symlink-event-writer', daemon=True)
+        self.thread.start()
+        logger.info(f"📝 Event writer started (flush every {self.flush_interval}s or {self.batch_size} paths)")
+
+    def stop(self):
+        if self.thread:
+            self.events.put(self._STOP)
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        pending = {}
+        deadline = None
+        while True:
+            timeout = max(0, deadline - time.monotonic()) if pending else None
+            try:
+                item = self.events.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                self.flush(pending)
+                return
+            if item is not None:
+                kind, path, received = item
+                self.received.append(received)
+                if not pending:
+                    deadline = time.monotonic() + self.flush_interval
+                # Re-insert so the batch keeps the order of each path's latest event
+                pending.pop(path, None)
+                pending[path] = kind
+                if len(pending) < self.batch_size and time.monotonic() < deadline:
+                    continue
+            if pending:
+                self.flush(pending)
+                pending = {}
+
+    def flush(self, pending):
+        """Apply one batch of coalesced events in a single transaction.
+
+        Each path gets its own savepoint, so a path that fails is logged and
+        skipped while the rest of the batch still commits.
+        """
+        if not pending:
+            return
+        upserts = []
+        removals = []
+        for path, kind in pending.items():
+            if os.path.islink(path):
+                upserts.append(path)
+            else:
+                removals.append((path, kind))
+        try:
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                orphaned = []
+                try:
+                    added = []
+                    removed = []
+                    # Add new locations first so a moved last link never schedules its target
+                    for path in upserts:
+                        target = upsert_symlink(path, conn, orphaned)
+                        if target is not None:
+                            added.append({'symlink': path, 'target': target})
+                    for path, kind in removals:
+                        try:
+                            with savepoint(conn, 'remove_symlink') as path_cursor:
+                                target = remove_symlink(path_cursor, path, record_deletion=(kind == 'deleted'))
+                        except Exception as e:
+                            logger.error(f"Error removing symlink {path}: {e}")
+                            logger.debug(traceback.format_exc())
+                            continue
+                        if target is not None:
+                            removed.append({'symlink': path, 'target': target})
+                    if added or removed:
+                        record_event(cursor, 'symlinks', {'added': added, 'removed': removed})
+                        bump_data_version(cursor)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                committed = time.monotonic()
+                for old_target in orphaned:
+                    try:
+                        delete_old_target(old_target)
+                    except OSError as e:
+                        logger.error(f"Error deleting old target {old_target}: {e}")
+                telemetry.observe('alfred_event_commit_latency_seconds', *(committed - received for received in self.received))
+                logger.debug(f"📝 Applied {len(pending)} coalesced events ({len(upserts)} upserts, {len(removals)} removals)")
+        except Exception as e:
+            logger.error(f"Error applying {len(pending)} symlink events: {e}")
+            logger.debug(traceback.format_exc())
+        finally:
+            self.received = []
+
 # Event handler for file system events
 class SymlinkEventHandler(FileSystemEventHandler):
-    def __init__(self, dry_run):
+    def __init__(self, dry_run, events=None):
         self.dry_run = dry_run
+        if events is None:
+            events = SymlinkEventQueue()
+            events.start()
+        self.events = events
         logger.info("🔍 Real-time symlink monitoring initialized")
 
     def on_created(self, event):
-        try:
-            logger.debug(f"📝 Detected creation event: {event.src_path}")
-            if os.path.islink(event.src_path):
-                logger.info(f"🔗 New symlink created: {event.src_path}")
-                with get_db_connection() as conn:
-                    upsert_symlink(event.src_path, conn)
-                    update_metrics_if_needed(conn)
-        except Exception as e:
-            logger.error(f"Error handling creation of {event.src_path}: {e}")
-            logger.debug(traceback.format_exc())
+        if event.is_directory:
+            return
+        logger.debug(f"📝 Detected creation event: {event.src_path}")
+        telemetry.inc('alfred_watchdog_events_total', type='created')
+        self.events.put('created', event.src_path)
 
     def on_modified(self, event):
-        try:
-            logger.debug(f"📝 Detected modification event: {event.src_path}")
-            if os.path.islink(event.src_path):
-                logger.info(f"🔗 Symlink modified: {event.src_path}")
-                upsert_symlink(event.src_path)
-        except Exception as e:
-            logger.error(f"Error handling modification of {event.src_path}: {e}")
-            logger.debug(traceback.format_exc())
+        if event.is_directory:
+            return
+        logger.debug(f"📝 Detected modification event: {event.src_path}")
+        telemetry.inc('alfred_watchdog_events_total', type='modified')
+        self.events.put('modified', event.src_path)
 
     def on_deleted(self, event):
-        try:
-            logger.debug(f"📝 Detected deletion event: {event.src_path}")
-            with get_db_connection() as conn:
-                cursor = conn.cursor()
-                execute_with_retry(cursor, 'SELECT target, ref_count FROM symlinks WHERE symlink = ?', (event.src_path,))
-                row = cursor.fetchone()
-                if row:
-                    target, ref_count = row
-                    ref_count -= 1
-                    if ref_count <= 0:
-                        # Schedule for deletion instead of deleting immediately
-                        scheduled_time = int(time.time()) + PENDING_DELETION_GRACE_SECONDS
-                        execute_with_retry(cursor, '''
-                            INSERT INTO pending_deletions (target, scheduled_time)
-                            VALUES (?, ?)
-                        ''', (target, scheduled_time))
-                        logger.info(f"⏳ Scheduled target {target} for deletion in {PENDING_DELETION_GRACE_SECONDS} seconds (event handler)")
-                        execute_with_retry(cursor, 'DELETE FROM symlinks WHERE target = ?', (target,))
-                        execute_with_retry(cursor, '''
-                            INSERT INTO deletions (symlink, target, timestamp, reason)
-                            VALUES (?, ?, ?, ?)
-                        ''', (event.src_path, target, int(time.time()), 'last_reference_deleted'))
-                        logger.info(f"❌ Removed symlink entry from database: {event.src_path} (was pointing to {target})")
-                    else:
-                        execute_with_retry(cursor, 'UPDATE symlinks SET ref_count = ? WHERE target = ?', (ref_count, target))
-                        execute_with_retry(cursor, 'DELETE FROM symlinks WHERE symlink = ?', (event.src_path,))
-                        execute_with_retry(cursor, '''
-                            INSERT INTO deletions (symlink, target, timestamp, reason)
-                            VALUES (?, ?, ?, ?)
-                        ''', (event.src_path, target, int(time.time()), 'symlink_deleted'))
-                        logger.info(f"🔄 Decremented ref_count for target {target}, new ref_count is {ref_count}")
-                    conn.commit()
-                    update_metrics_if_needed(conn)
-                else:
-                    logger.debug(f"⚠️ Symlink {event.src_path} not found in the database.")
-        except Exception as e:
-            logger.error(f"Error handling deletion of {event.src_path}: {e}")
-            logger.debug(traceback.format_exc())
+        if event.is_directory:
+            return
+        logger.debug(f"📝 Detected deletion event: {event.src_path}")
+        telemetry.inc('alfred_watchdog_events_total', type='deleted')
+        self.events.put('deleted', event.src_path)
 
     def on_moved(self, event):
-        try:
-            logger.debug(f"\U0001F4DD Detected move event: {event.src_path} -> {event.dest_path}")
-            conn_used = False
-            # First handle the new location
-            if os.path.islink(event.dest_path):
-                logger.info(f"\U0001F517 Symlink moved to: {event.dest_path}")
-                with get_db_connection() as conn:
-                    upsert_symlink(event.dest_path, conn)
-                    conn.commit()
-                    update_metrics_if_needed(conn)
-                    conn_used = True
-            # Then handle the old location
-            if os.path.exists(event.src_path) and os.path.islink(event.src_path):
-                logger.info(f"\U0001F517 Cleaning up old symlink: {event.src_path}")
-                target = os.readlink(event.src_path)
-                with get_db_connection() as conn:
-                    cursor = conn.cursor()
-                    execute_with_retry(cursor, 'SELECT ref_count FROM symlinks WHERE target = ?', (target,))
-                    target_row = cursor.fetchone()
-                    if target_row:
-                        ref_count = target_row[0] - 1
-                        if ref_count <= 0:
-                            scheduled_time = int(time.time()) + PENDING_DELETION_GRACE_SECONDS
-                            execute_with_retry(cursor, '''
-                                INSERT INTO pending_deletions (target, scheduled_time)
-                                VALUES (?, ?)
-                            ''', (target, scheduled_time))
-                            logger.info(f"\u23F3 Scheduled target {target} for deletion in {PENDING_DELETION_GRACE_SECONDS} seconds (move handler)")
-                            execute_with_retry(cursor, 'DELETE FROM symlinks WHERE target = ?', (target,))
-                            logger.info(f"\u274C Removed symlink entry from database: {event.src_path} (was pointing to {target})")
-                        else:
-                            execute_with_retry(cursor, 'UPDATE symlinks SET ref_count = ? WHERE target = ?', (ref_count, target))
-                            execute_with_retry(cursor, 'DELETE FROM symlinks WHERE symlink = ?', (event.src_path,))
-                            logger.info(f"\U0001F501 Decremented ref_count for target {target}, new ref_count is {ref_count}")
-                    conn.commit()
-                    update_metrics_if_needed(conn)
-                    conn_used = True
-            if not conn_used:
-                with get_db_connection() as conn:
-                    update_metrics_if_needed(conn)
-        except Exception as e:
-            logger.error(f"Error handling movement from {event.src_path} to {event.dest_path}: {e}")
-            logger.debug(traceback.format_exc())
+        # Directory moves also emit a move event for every file inside them
+        if event.is_directory:
+            return
+        logger.debug(f"\U0001F4DD Detected move event: {event.src_path} -> {event.dest_path}")
+        telemetry.inc('alfred_watchdog_events_total', type='moved')
+        self.events.put('moved', event.src_path)
+        self.events.put('created', event.dest_path)
 
 def has_children(directory):
     """Check if a directory has any children (files or subdirectories)."""
@@ -526,7 +2116,31 @@ def update_scan_time(conn, scan_interval):
     current_time = int(time.time())
     cursor.execute('INSERT INTO scan_times (last_scan_time, scan_interval) VALUES (?, ?)', 
                   (current_time, scan_interval))
+    bump_data_version(cursor)
+    conn.commit()
+
+def resume_scan_checkpoint(conn):
+    """Queue a job to finish the scan that left a checkpoint, as a dry run if that scan was one.
+
+    Jobs can't ask for confirmation, so a checkpoint left by a scan that
+    would have asked is left to the next scan run with the same settings.
+    Returns the job, or None if nothing was queued.
+    """
+    cursor = conn.cursor()
+    execute_with_retry(cursor, 'SELECT config FROM scan_checkpoint WHERE id = 1')
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    config = json.loads(row[0])
+    dry_run, no_confirm = config.get('dry_run', False), config.get('no_confirm', False)
+    if not dry_run and not no_confirm:
+        return None
+    job, created = enqueue_scan_job(cursor, 'resume', dry_run=dry_run)
+    if created:
+        bump_data_version(cursor)
+        logger.info(f"♻️ Queued scan job {job['id']} to finish the unfinished scan{' (dry run)' if dry_run else ''}")
     conn.commit()
+    return job
 
 def should_perform_scan(conn, scan_interval):
     if scan_interval == 0:
@@ -540,67 +2154,279 @@ def should_perform_scan(conn, scan_interval):
     time_since_last_scan = current_time - last_scan_time
     return time_since_last_scan >= (scan_interval * 60)  # Convert minutes to seconds
 
-def background_scan(dry_run, no_confirm, exclude_patterns):
-    """Run find_non_linked_files in the background at specified intervals."""
+def background_scan(no_confirm):
+    """Queue a scan job whenever the scan interval has passed; ScanJobRunner runs it.
+
+    Without no_confirm the jobs are dry runs, since nobody is there to confirm the deletions.
+    A paused scan is continued SCAN_SLICE_REST_SECONDS after its last slice,
+    rather than once the next interval has passed.
+    """
     while True:
         try:
             with get_db_connection() as conn:
-                if should_perform_scan(conn, scan_interval):
-                    logger.info("🔄 Starting background scan...")
-                    find_non_linked_files(
-                        torrents_directories,
-                        symlink_directories,
-                        dry_run,
-                        no_confirm,
-                        exclude_patterns
-                    )
-                    update_scan_time(conn, scan_interval)
-            
+                cursor = conn.cursor()
+                # The scan time is only updated once the job finishes, so don't queue another meanwhile
+                execute_with_retry(cursor, "SELECT 1 FROM scan_jobs WHERE status IN ('queued', 'running') LIMIT 1")
+                if cursor.fetchone() is None:
+                    execute_with_retry(cursor, 'SELECT updated_at FROM scan_checkpoint WHERE id = 1')
+                    checkpoint = cursor.fetchone()
+                    if checkpoint is not None and time.time() - checkpoint[0] < SCAN_SLICE_REST_SECONDS:
+                        pass  # The next slice follows shortly
+                    elif checkpoint is not None and resume_scan_checkpoint(conn):
+                        pass
+                    elif should_perform_scan(conn, scan_interval):
+                        job, _ = enqueue_scan_job(cursor, 'schedule', dry_run=not no_confirm)
+                        bump_data_version(cursor)
+                        conn.commit()
+                        logger.info(f"🔄 Queued background scan job {job['id']}")
+
             time.sleep(60)  # Check every minute if it's time to scan
         except Exception as e:
-            logger.error(f"Error during background scan: {e}")
+            logger.error(f"Error scheduling background scan: {e}")
             logger.error(traceback.format_exc())
             time.sleep(60)  # Wait 1 minute before retrying on error
 
-def record_metrics(conn=None):
-    """Record current metrics to the history table"""
-    should_close = False
-    if conn is None:
+class ScanJobRunner:
+    """Runs the scans queued in scan_jobs, one at a time, under the scan lock.
+
+    The web interface and the scan schedule only insert rows; this thread
+    claims the oldest queued job once the lock is free, runs it and records
+    the outcome. Cancellation is cooperative: the scan checks the job's
+    cancel_requested flag between directories and deletions, at most once
+    per SCAN_JOB_CHECK_SECONDS, and refreshes heartbeat_at as it goes.
+
+    Jobs never prompt: the thread holds the scan lock and has no one to
+    answer. Web requests must ask for no_confirm or a dry run, and scheduled
+    jobs are queued as dry runs unless alfred runs with --no-confirm.
+    """
+
+    def __init__(self, dry_run, exclude_patterns):
+        self.dry_run = dry_run
+        self.exclude_patterns = exclude_patterns
+        self.lock = ScanLock()
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+
+    def run(self):
+        logger.info("📋 Scan job runner started")
+        while True:
+            try:
+                if not self.run_next():
+                    time.sleep(SCAN_JOB_POLL_SECONDS)
+            except Exception as e:
+                logger.error(f"Error running scan job: {e}")
+                logger.debug(traceback.format_exc())
+                time.sleep(SCAN_JOB_POLL_SECONDS)
+
+    def run_next(self):
+        """Run the oldest queued job; returns False if there was nothing to do"""
         conn = get_db_connection()
-        should_close = True
-    try:
         cursor = conn.cursor()
-        # Get current stats
-        execute_with_retry(cursor, 'SELECT COUNT(*) as total, COUNT(DISTINCT target) as unique_targets FROM symlinks')
-        total, unique = cursor.fetchone()
-        
-        # Get total deletions
-        execute_with_retry(cursor, 'SELECT COUNT(*) FROM deletions')
-        deletions = cursor.fetchone()[0]
-        
-        # Record metrics
+        execute_with_retry(cursor, "SELECT 1 FROM scan_jobs WHERE status = 'queued' LIMIT 1")
+        if cursor.fetchone() is None or not self.lock.acquire():
+            return False
+        try:
+            job = self.claim(conn)
+            if job is None:
+                return False
+            self.execute(conn, job)
+            return True
+        finally:
+            self.lock.release()
+
+    def claim(self, conn):
+        cursor = conn.cursor()
+        now = int(time.time())
+        try:
+            # Holding the lock means no scan is running anywhere, so 'running' rows are left over from a crash
+            execute_with_retry(cursor, '''
+                UPDATE scan_jobs SET status = 'failed', finished_at = ?, error = 'Interrupted'
+                WHERE status = 'running'
+            ''', (now,))
+            execute_with_retry(cursor, f'''
+                UPDATE scan_jobs SET status = 'running', started_at = ?, heartbeat_at = ?, worker = ?
+                WHERE id = (SELECT id FROM scan_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+                RETURNING {', '.join(SCAN_JOB_COLUMNS)}
+            ''', (now, now, self.worker))
+            jobs = scan_job_rows(cursor)
+            if jobs:
+                record_event(cursor, 'scan_job', jobs[0])
+            bump_data_version(cursor)
+            conn.commit()
+            return jobs[0] if jobs else None
+        except Exception:
+            conn.rollback()
+            raise
+
+    def execute(self, conn, job):
+        logger.info(f"📋 Running scan job {job['id']} ({job['requested_by']}{', dry run' if job['dry_run'] else ''}{', full scan' if job['full_scan'] else ''})")
+        status, error, result = 'succeeded', None, None
+        # Cancellation is checked through a separate connection, since the scan's may be mid-statement
+        check_conn = sqlite3.connect(db_file, timeout=1)
+        try:
+            stats = find_non_linked_files(
+                torrents_directories,
+                symlink_directories,
+                dry_run=self.dry_run or job['dry_run'],
+                no_confirm=True,
+                exclude_patterns=self.exclude_patterns,
+                full_scan=job['full_scan'],
+                should_stop=self.stop_check(check_conn, job['id']),
+            )
+            result = dict(stats.results, duration_seconds=round(stats.seconds, 3))
+            update_scan_time(conn, scan_interval)
+        except ScanPaused:
+            conn.rollback()
+            result = {'paused': True}
+            # The scan isn't finished, so the interval isn't restarted; background_scan queues the next slice
+            logger.info(f"⏸️ Scan job {job['id']} paused after {SCAN_SLICE_MINUTES} minutes, continuing in {SCAN_SLICE_REST_SECONDS}s")
+        except ScanCancelled:
+            conn.rollback()
+            status = 'cancelled'
+            logger.info(f"🛑 Scan job {job['id']} cancelled")
+        except Exception as e:
+            conn.rollback()
+            status, error = 'failed', str(e)
+            logger.error(f"Scan job {job['id']} failed: {e}")
+            logger.debug(traceback.format_exc())
+            record_event(conn.cursor(), 'scan', {'running': False, 'error': str(e)})
+            conn.commit()
+        finally:
+            check_conn.close()
+
+        cursor = conn.cursor()
         execute_with_retry(cursor, '''
-        INSERT INTO metrics_history (total_symlinks, unique_targets, total_deletions)
-        VALUES (?, ?, ?)
-        ''', (total, unique, deletions))
+            UPDATE scan_jobs SET status = ?, finished_at = ?, error = ?, result = ?
+            WHERE id = ?
+        ''', (status, int(time.time()), error, json.dumps(result) if result is not None else None, job['id']))
+        if status == 'cancelled':
+            record_event(cursor, 'scan', {'running': False, 'cancelled': True})
+        record_event(cursor, 'scan_job', get_scan_job(cursor, job['id']))
+        bump_data_version(cursor)
         conn.commit()
-    finally:
-        if should_close:
-            conn.close()
 
-# Update metrics after significant operations
-def update_metrics_if_needed(conn):
-    """Update metrics if significant changes occurred"""
-    try:
-        record_metrics(conn)
-    except Exception as e:
-        logger.error(f"Error recording metrics: {e}")
-        logger.debug(traceback.format_exc())
+    def stop_check(self, check_conn, job_id):
+        """should_stop callback for find_non_linked_files that also keeps the heartbeat fresh"""
+        last_check = 0
+
+        def should_stop():
+            nonlocal last_check
+            now = time.time()
+            if now - last_check < SCAN_JOB_CHECK_SECONDS:
+                return False
+            last_check = now
+            cursor = check_conn.cursor()
+            try:
+                # Best effort; a heartbeat is skipped rather than waiting behind the scan's own writes
+                cursor.execute('UPDATE scan_jobs SET heartbeat_at = ? WHERE id = ?', (int(now), job_id))
+                check_conn.commit()
+            except sqlite3.OperationalError:
+                check_conn.rollback()
+            cursor.execute('SELECT cancel_requested FROM scan_jobs WHERE id = ?', (job_id,))
+            row = cursor.fetchone()
+            return bool(row and row[0])
+
+        return should_stop
+
+# Bucket label formats, valid for both time.strftime and SQLite's strftime
+METRICS_ROLLUPS = {
+    'hour': '%Y-%m-%d %H:00',
+    'day': '%Y-%m-%d',
+    'month': '%Y-%m',
+}
+METRIC_COLUMNS = ['total_symlinks', 'unique_targets', 'total_deletions']
+
+def backfill_metrics_rollup(cursor):
+    """Build the rollups from existing metrics_history rows the first time they are needed"""
+    execute_with_retry(cursor, 'SELECT 1 FROM metrics_rollup LIMIT 1')
+    if cursor.fetchone():
+        return
+    execute_with_retry(cursor, 'SELECT 1 FROM metrics_history LIMIT 1')
+    if not cursor.fetchone():
+        return
+    logger.info("📊 Building metrics rollups from existing history...")
+    for granularity, bucket_format in METRICS_ROLLUPS.items():
+        for metric in METRIC_COLUMNS:
+            execute_with_retry(cursor, f'''
+            INSERT INTO metrics_rollup (granularity, bucket, metric, min_value, max_value, last_value, samples)
+            SELECT ?, bucket, ?, MIN(value), MAX(value), MAX(last_value), COUNT(*)
+            FROM (
+                SELECT strftime(?, timestamp) AS bucket,
+                       {metric} AS value,
+                       LAST_VALUE({metric}) OVER (
+                           PARTITION BY strftime(?, timestamp) ORDER BY id
+                           ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+                       ) AS last_value
+                FROM metrics_history
+                WHERE {metric} IS NOT NULL
+            )
+            GROUP BY bucket
+            HAVING bucket IS NOT NULL
+            ''', (granularity, metric, bucket_format, bucket_format))
+
+def prune_metrics_history(cursor):
+    """Drop raw samples and hourly rollups older than METRICS_RETENTION_DAYS"""
+    if METRICS_RETENTION_DAYS == 0:
+        return
+    cutoff = time.gmtime(time.time() - METRICS_RETENTION_DAYS * 86400)
+    execute_with_retry(cursor, 'DELETE FROM metrics_history WHERE timestamp < ?',
+                       (time.strftime('%Y-%m-%d %H:%M:%S', cutoff),))
+    execute_with_retry(cursor, "DELETE FROM metrics_rollup WHERE granularity = 'hour' AND bucket < ?",
+                       (time.strftime(METRICS_ROLLUPS['hour'], cutoff),))
+
+def record_metrics(conn=None):
+    """Record current metrics to the history table and fold them into the rollups"""
+    if conn is None:
+        conn = get_db_connection()
+    cursor = conn.cursor()
+    counters = read_counters(cursor)
+    now = time.gmtime()
+    execute_with_retry(cursor, '''
+    INSERT INTO metrics_history (timestamp, total_symlinks, unique_targets, total_deletions)
+    VALUES (?, ?, ?, ?)
+    ''', (time.strftime('%Y-%m-%d %H:%M:%S', now),
+          counters['total_symlinks'], counters['unique_targets'], counters['total_deletions']))
+    cursor.executemany('''
+    INSERT INTO metrics_rollup (granularity, bucket, metric, min_value, max_value, last_value, samples)
+    VALUES (?, ?, ?, ?, ?, ?, 1)
+    ON CONFLICT(granularity, bucket, metric) DO UPDATE SET
+        min_value = MIN(min_value, excluded.min_value),
+        max_value = MAX(max_value, excluded.max_value),
+        last_value = excluded.last_value,
+        samples = samples + 1
+    ''', [
+        (granularity, time.strftime(bucket_format, now), metric, counters[metric], counters[metric], counters[metric])
+        for granularity, bucket_format in METRICS_ROLLUPS.items()
+        for metric in METRIC_COLUMNS
+    ])
+    prune_metrics_history(cursor)
+    conn.commit()
+
+def start_metrics_sampling():
+    """Sample the counters into metrics_history every METRICS_INTERVAL minutes."""
+    while True:
+        time.sleep(METRICS_INTERVAL * 60)
+        try:
+            record_metrics()
+        except Exception as e:
+            logger.error(f"Error recording metrics: {e}")
+            logger.debug(traceback.format_exc())
+
+def start_metrics_export():
+    """Write this process's telemetry for the web interface's /metrics every METRICS_EXPORT_SECONDS."""
+    while METRICS_EXPORT_SECONDS > 0:
+        try:
+            telemetry.write_snapshot()
+        except Exception as e:
+            logger.error(f"Error exporting metrics: {e}")
+            logger.debug(traceback.format_exc())
+        time.sleep(METRICS_EXPORT_SECONDS)
 
 def reload_env_settings():
     """Reload environment variables and reinitialize components."""
     global symlink_directories, torrents_directories, delete_behavior, scan_interval
-    global PENDING_DELETION_GRACE_SECONDS, DRY_RUN, RUN_ON_STARTUP
+    global PENDING_DELETION_GRACE_SECONDS, DRY_RUN, RUN_ON_STARTUP, SCAN_WORKERS, SCAN_WORKER_MODE
+    global INCREMENTAL_SCAN, FULL_SCAN_EVERY, LINK_MATCH_MODE, SCAN_CHECKPOINT_SECONDS, SCAN_SLICE_MINUTES, METRICS_INTERVAL, METRICS_RETENTION_DAYS, METRICS_EXPORT_SECONDS
+    global DELETE_WORKERS, DELETE_OPS_PER_SECOND, DELETE_BYTES_PER_SECOND
 
     try:
         # Read and parse the .env file
@@ -631,6 +2457,19 @@ def reload_env_settings():
         PENDING_DELETION_GRACE_SECONDS = int(os.getenv('PENDING_DELETION_GRACE_SECONDS', '60'))
         DRY_RUN = os.getenv('DRY_RUN', 'false').lower() == 'true'
         RUN_ON_STARTUP = os.getenv('RUN_ON_STARTUP', 'true').lower() == 'true'
+        SCAN_WORKERS = int(os.getenv('SCAN_WORKERS', '1'))
+        SCAN_WORKER_MODE = os.getenv('SCAN_WORKER_MODE', 'threads').lower()
+        INCREMENTAL_SCAN = os.getenv('INCREMENTAL_SCAN', 'false').lower() == 'true'
+        FULL_SCAN_EVERY = int(os.getenv('FULL_SCAN_EVERY', '10'))
+        LINK_MATCH_MODE = os.getenv('LINK_MATCH_MODE', 'path').lower()
+        SCAN_CHECKPOINT_SECONDS = int(os.getenv('SCAN_CHECKPOINT_SECONDS', '60'))
+        SCAN_SLICE_MINUTES = int(os.getenv('SCAN_SLICE_MINUTES', '0'))
+        METRICS_INTERVAL = int(os.getenv('METRICS_INTERVAL', '15'))
+        METRICS_RETENTION_DAYS = int(os.getenv('METRICS_RETENTION_DAYS', '90'))
+        METRICS_EXPORT_SECONDS = int(os.getenv('METRICS_EXPORT_SECONDS', '15'))
+        DELETE_WORKERS = int(os.getenv('DELETE_WORKERS', '1'))
+        DELETE_OPS_PER_SECOND = float(os.getenv('DELETE_OPS_PER_SECOND', '0'))
+        DELETE_BYTES_PER_SECOND = float(os.getenv('DELETE_BYTES_PER_SECOND', '0'))
 
         # Clean up and validate directories
         symlink_directories = [path.strip() for path in symlink_directories if path.strip()]
@@ -646,6 +2485,39 @@ def reload_env_settings():
         if scan_interval < 0:
             raise ValueError("SCAN_INTERVAL must be a positive number or 0")
 
+        if SCAN_WORKERS < 1:
+            raise ValueError("SCAN_WORKERS must be at least 1")
+
+        if SCAN_WORKER_MODE not in ['threads', 'processes']:
+            raise ValueError("SCAN_WORKER_MODE must be either 'threads' or 'processes'")
+
+        if FULL_SCAN_EVERY < 0:
+            raise ValueError("FULL_SCAN_EVERY must be a positive number or 0")
+
+        if LINK_MATCH_MODE not in ['path', 'inode']:
+            raise ValueError("LINK_MATCH_MODE must be either 'path' or 'inode'")
+
+        if SCAN_CHECKPOINT_SECONDS < 1:
+            raise ValueError("SCAN_CHECKPOINT_SECONDS must be at least 1")
+
+        if SCAN_SLICE_MINUTES < 0:
+            raise ValueError("SCAN_SLICE_MINUTES must be a positive number or 0")
+
+        if METRICS_INTERVAL < 1:
+            raise ValueError("METRICS_INTERVAL must be at least 1 minute")
+
+        if METRICS_RETENTION_DAYS < 0:
+            raise ValueError("METRICS_RETENTION_DAYS must be a positive number or 0")
+
+        if METRICS_EXPORT_SECONDS < 0:
+            raise ValueError("METRICS_EXPORT_SECONDS must be a positive number or 0")
+
+        if DELETE_WORKERS < 1:
+            raise ValueError("DELETE_WORKERS must be at least 1")
+
+        if DELETE_OPS_PER_SECOND < 0 or DELETE_BYTES_PER_SECOND < 0:
+            raise ValueError("DELETE_OPS_PER_SECOND and DELETE_BYTES_PER_SECOND must be positive numbers or 0")
+
         # Update scan times table with new interval
         with get_db_connection() as conn:
             cursor = conn.cursor()
@@ -657,6 +2529,7 @@ def reload_env_settings():
                 # Insert new record with updated interval
                 cursor.execute('INSERT INTO scan_times (last_scan_time, scan_interval) VALUES (?, ?)',
                              (last_scan_time, scan_interval))
+                bump_data_version(cursor)
                 conn.commit()
 
         # Log the reloaded settings
@@ -668,6 +2541,10 @@ def reload_env_settings():
         logger.info(f"🕒 Pending deletion grace period: {PENDING_DELETION_GRACE_SECONDS} seconds")
         logger.info(f"🧪 Dry run mode: {DRY_RUN}")
         logger.info(f"🚦 Run on startup: {RUN_ON_STARTUP}")
+        logger.info(f"🧵 Scan workers: {SCAN_WORKERS} ({SCAN_WORKER_MODE})")
+        logger.info(f"📂 Incremental scans: {INCREMENTAL_SCAN} (full scan every {FULL_SCAN_EVERY} scans)")
+        logger.info(f"🔗 Link match mode: {LINK_MATCH_MODE}")
+        logger.info(f"🗑️ Delete workers: {DELETE_WORKERS}")
 
         return True
 
@@ -676,6 +2553,126 @@ def reload_env_settings():
         logger.debug(traceback.format_exc())
         raise
 
+class PendingDeletionScheduler:
+    """Deletes pending targets as soon as their grace period ends.
+
+    Due times are kept in a heap so the thread sleeps until exactly the next
+    one. Deletions scheduled by this process are pushed with notify(); rows
+    added by the web interface are picked up by id every
+    PENDING_DELETION_POLL_SECONDS. Due rows are claimed in one short
+    transaction and removed from disk outside of it, so writers are never
+    blocked behind filesystem calls.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.condition = threading.Condition()
+        self.last_id = 0
+
+    def notify(self, scheduled_time):
+        with self.condition:
+            heapq.heappush(self.heap, scheduled_time)
+            self.condition.notify()
+
+    def load(self, cursor):
+        """Push the due times of rows added since the last load"""
+        execute_with_retry(cursor, '''
+            SELECT id, scheduled_time FROM pending_deletions
+            WHERE id > ? AND claimed_at IS NULL
+            ORDER BY id
+        ''', (self.last_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        with self.condition:
+            for _, scheduled_time in rows:
+                heapq.heappush(self.heap, scheduled_time)
+        self.last_id = rows[-1][0]
+
+    def run(self):
+        conn = get_db_connection()
+        next_load = 0
+        while True:
+            try:
+                now = time.time()
+                if now >= next_load:
+                    self.load(conn.cursor())
+                    next_load = now + PENDING_DELETION_POLL_SECONDS
+                with self.condition:
+                    if not self.heap or self.heap[0] > now:
+                        due = self.heap[0] if self.heap else next_load
+                        self.condition.wait(max(min(due, next_load) - now, 0))
+                        continue
+                    # Everything due is claimed together below
+                    while self.heap and self.heap[0] <= now:
+                        heapq.heappop(self.heap)
+                self.process_due(conn)
+            except Exception as e:
+                logger.error(f'Error during pending deletion cleanup: {e}')
+                logger.debug(traceback.format_exc())
+                time.sleep(1)
+
+    def claim(self, conn):
+        """Mark up to PENDING_DELETION_BATCH_SIZE due rows as ours, returning [(id, target)]"""
+        cursor = conn.cursor()
+        now = int(time.time())
+        try:
+            # Targets that were linked again are dropped rather than deleted
+            execute_with_retry(cursor, '''
+                DELETE FROM pending_deletions
+                WHERE scheduled_time <= ? AND claimed_at IS NULL
+                AND target IN (SELECT path FROM targets)
+            ''', (now,))
+            execute_with_retry(cursor, '''
+                UPDATE pending_deletions SET claimed_at = ?
+                WHERE id IN (
+                    SELECT id FROM pending_deletions
+                    WHERE scheduled_time <= ? AND claimed_at IS NULL
+                    ORDER BY scheduled_time
+                    LIMIT ?
+                )
+                RETURNING id, target
+            ''', (now, now, PENDING_DELETION_BATCH_SIZE))
+            claimed = cursor.fetchall()
+            conn.commit()
+            return claimed
+        except Exception:
+            conn.rollback()
+            raise
+
+    def process_due(self, conn):
+        while True:
+            claimed = self.claim(conn)
+            if not claimed:
+                return
+            cursor = conn.cursor()
+            # A target linked again after the claim had its row deleted by add_target_reference
+            placeholders = ', '.join('?' * len(claimed))
+            execute_with_retry(cursor, f'SELECT id FROM pending_deletions WHERE id IN ({placeholders})',
+                               [row_id for row_id, _ in claimed])
+            still_pending = {row[0] for row in cursor.fetchall()}
+            removed = 0
+            for row_id, target in claimed:
+                if row_id not in still_pending or not os.path.exists(target):
+                    continue
+                try:
+                    if not DRY_RUN:
+                        os.remove(target)
+                        removed += 1
+                        logger.info(f"❌ Deleted pending target file: {target}")
+                    else:
+                        logger.info(f"🟠 Dry-run: Would delete pending target file: {target}")
+                except Exception as e:
+                    logger.error(f'Error deleting pending target {target}: {e}')
+            cursor.executemany('DELETE FROM pending_deletions WHERE id = ?', [(row_id,) for row_id, _ in claimed])
+            bump_data_version(cursor)
+            conn.commit()
+            telemetry.inc('alfred_deletions_committed_total', removed, reason='pending_deletion')
+            if len(claimed) < PENDING_DELETION_BATCH_SIZE:
+                return
+
+pending_deletion_scheduler = PendingDeletionScheduler()
+
 def clear_pending_deletions_on_startup():
     """Clear all pending deletions on startup to prevent deletion of files during restart"""
     with get_db_connection() as conn:
@@ -684,6 +2681,7 @@ def clear_pending_deletions_on_startup():
         count = cursor.fetchone()[0]
         if count > 0:
             execute_with_retry(cursor, 'DELETE FROM pending_deletions')
+            bump_data_version(cursor)
             conn.commit()
             logger.info(f"🧹 Cleared {count} pending deletions on startup")
 
@@ -719,28 +2717,39 @@ def main(dry_run, no_confirm, exclude_patterns):
         
         # Check if we need to perform a full scan
         if should_perform_scan(conn, scan_interval):
-            logger.info("⏳ Waiting for content in torrents directories...")
-            wait_for_children(torrents_directories)
+            scan_lock = ScanLock()
+            if not scan_lock.acquire():
+                logger.warning("⚠️ Another process is scanning, skipping the startup scan")
+            else:
+                try:
+                    logger.info("⏳ Waiting for content in torrents directories...")
+                    wait_for_children(torrents_directories)
 
-            logger.info(f"🟢 Running startup script with DELETE_BEHAVIOR={delete_behavior}...")
-            find_non_linked_files(
-                torrents_directories,
-                symlink_directories,
-                dry_run,
-                no_confirm,
-                exclude_patterns
-            )
-            update_scan_time(conn, scan_interval)
-            update_metrics_if_needed(conn)  # Record metrics after scan
+                    logger.info(f"🟢 Running startup script with DELETE_BEHAVIOR={delete_behavior}...")
+                    try:
+                        find_non_linked_files(
+                            torrents_directories,
+                            symlink_directories,
+                            dry_run,
+                            no_confirm,
+                            exclude_patterns
+                        )
+                        update_scan_time(conn, scan_interval)
+                    except ScanPaused:
+                        logger.info(f"⏸️ Startup scan paused after {SCAN_SLICE_MINUTES} minutes, the background scan continues it")
+                finally:
+                    scan_lock.release()
         else:
             last_scan_time, _ = get_last_scan_time(conn)
             next_scan = last_scan_time + (scan_interval * 60)
             time_until_next = next_scan - int(time.time())
             logger.info(f"⏳ Skipping initial scan. Next scan in {time_until_next//60} minutes")
+            # A scan a restart interrupted is finished by the job runner, with the settings it started with
+            resume_scan_checkpoint(conn)
 
     # Start the cleanup thread AFTER the tables are created
     if RUN_ON_STARTUP:
-        cleanup_thread = threading.Thread(target=start_pending_deletion_cleanup, daemon=True)
+        cleanup_thread = threading.Thread(target=pending_deletion_scheduler.run, daemon=True)
         cleanup_thread.start()
 
     logger.info("")
@@ -749,17 +2758,27 @@ def main(dry_run, no_confirm, exclude_patterns):
     logger.info(f"📁 Monitoring torrent directories: {', '.join(torrents_directories)}")
     logger.info("")
 
+    metrics_thread = threading.Thread(target=start_metrics_sampling, daemon=True)
+    metrics_thread.start()
+
+    # Scans requested from the web interface or by the schedule run here, one at a time
+    scan_job_runner = ScanJobRunner(dry_run, exclude_patterns)
+    threading.Thread(target=scan_job_runner.run, name='scan-jobs', daemon=True).start()
+
     # Start background scan if interval is set
     if scan_interval > 0:
-        background_thread = threading.Thread(
-            target=background_scan,
-            args=(dry_run, no_confirm, exclude_patterns),
-            daemon=True
-        )
+        background_thread = threading.Thread(target=background_scan, args=(no_confirm,), daemon=True)
         background_thread.start()
         logger.info(f"🔄 Background scanning started with interval of {scan_interval} minutes")
-
-    event_handler = SymlinkEventHandler(dry_run)
+        if not no_confirm:
+            logger.warning("⚠️ Background scans are dry runs without --no-confirm, as there is nobody to confirm deletions")
+
+    event_queue = SymlinkEventQueue()
+    event_queue.start()
+    telemetry.track('alfred_event_queue_depth', event_queue.events.qsize)
+    if METRICS_EXPORT_SECONDS > 0:
+        threading.Thread(target=start_metrics_export, name='metrics-export', daemon=True).start()
+    event_handler = SymlinkEventHandler(dry_run, event_queue)
     observer = Observer()
     for symlink_directory in symlink_directories:
         observer.schedule(event_handler, path=symlink_directory, recursive=True)
@@ -772,47 +2791,7 @@ def main(dry_run, no_confirm, exclude_patterns):
         observer.stop()
         logger.info("🛑 Real-time scanning stopped by user.")
     observer.join()
-
-def cleanup_pending_deletions():
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        now = int(time.time())
-        
-        # Start transaction to prevent race conditions
-        conn.execute('BEGIN TRANSACTION')
-        
-        try:
-            execute_with_retry(cursor, 'SELECT id, target FROM pending_deletions WHERE scheduled_time <= ?', (now,))
-            rows = cursor.fetchall()
-            for row in rows:
-                target = row[1]
-                # Check if any symlink now points to this target
-                execute_with_retry(cursor, 'SELECT COUNT(*) as count FROM symlinks WHERE target = ?', (target,))
-                count = cursor.fetchone()[0]
-                if count == 0 and os.path.exists(target):
-                    try:
-                        if not DRY_RUN:
-                            os.remove(target)
-                            logger.info(f"❌ Deleted pending target file: {target}")
-                        else:
-                            logger.info(f"🟠 Dry-run: Would delete pending target file: {target}")
-                    except Exception as e:
-                        logger.error(f'Error deleting pending target {target}: {e}')
-                # Remove from pending_deletions table
-                execute_with_retry(cursor, 'DELETE FROM pending_deletions WHERE id = ?', (row[0],))
-            
-            # Commit the transaction
-            conn.commit()
-        except Exception as e:
-            # Rollback on error
-            conn.rollback()
-            logger.error(f'Error during pending deletion cleanup: {e}')
-            raise
-
-def start_pending_deletion_cleanup():
-    while True:
-        cleanup_pending_deletions()
-        time.sleep(60)
+    event_queue.stop()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Manage symlinks and their targets.")
@@ -0,0 +1,6 @@
+"""Benchmarks for alfred's scan, database and deletion phases.
+
+Run from the repository root:
+
+    python -m benchmarks.run --torrent-files 100000 --symlinks 80000 --output results.json
+"""
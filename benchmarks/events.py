@@ -0,0 +1,271 @@
+"""Measure how many watchdog events the real-time pipeline absorbs.
+
+    python -m benchmarks.events --events 50000 --rate 5000 --mix created=60,deleted=20,moved=20
+    python -m benchmarks.events --events 50000 --rate 0 --output storm.json
+
+Synthetic FileCreatedEvent/FileDeletedEvent/FileMovedEvent calls are made on
+a SymlinkEventHandler at a fixed rate (0 = as fast as possible), each after
+the matching change on disk, in a scratch directory with its own database.
+Reports sustained throughput, event-to-commit latency percentiles, how long
+the producer was blocked by a full queue, and lock retries seen by
+execute_with_retry. A competing writer (--writer-rate) stands in for the web
+interface. The JSON output can be compared with benchmarks.run --compare.
+"""
+import argparse
+import collections
+import json
+import os
+import platform
+import queue
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from watchdog.events import FileCreatedEvent, FileDeletedEvent, FileMovedEvent
+
+from benchmarks.run import StatementCounter, peak_rss_kb, load_alfred, alfred_revision
+
+EVENT_KINDS = ['created', 'deleted', 'moved']
+
+class CountingQueue(queue.Queue):
+    """Queue that counts items taken off it; the queue is FIFO, so the count
+    tells which submitted events the writer has picked up"""
+
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self.taken = 0
+
+    def _get(self):
+        self.taken += 1  # Called with the queue's mutex held
+        return super()._get()
+
+def instrumented_queue(alfred, flush_interval=None, batch_size=None, maxsize=None):
+    """A SymlinkEventQueue that records when each submitted event was committed"""
+
+    class InstrumentedEventQueue(alfred.SymlinkEventQueue):
+        def __init__(self):
+            super().__init__(flush_interval, batch_size, maxsize)
+            self.events = CountingQueue(self.events.maxsize)
+            self.submitted = collections.deque()
+            self.committed = 0
+            self.latencies = []
+            self.flushes = 0
+            self.blocked_seconds = 0.0
+            self.last_commit = None
+            self.statements = StatementCounter()
+
+        def put(self, kind, path):
+            submitted = time.perf_counter()
+            self.submitted.append(submitted)
+            super().put(kind, path)
+            self.blocked_seconds += time.perf_counter() - submitted
+
+        def _run(self):
+            alfred.get_db_connection().set_trace_callback(self.statements)
+            super()._run()
+
+        def flush(self, pending):
+            super().flush(pending)
+            now = time.perf_counter()
+            # Everything taken off the queue so far is in this batch or an earlier one
+            for _ in range(self.events.taken - self.committed):
+                if not self.submitted:
+                    break  # The stop sentinel
+                self.latencies.append(now - self.submitted.popleft())
+            self.committed = self.events.taken
+            self.flushes += 1
+            self.last_commit = now
+
+    return InstrumentedEventQueue()
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in EVENT_KINDS:
+            raise ValueError(f"Unknown event kind '{kind}', expected one of: {', '.join(EVENT_KINDS)}")
+        weights[kind] = float(weight)
+    return weights
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def competing_writer(alfred, db_path, rate, stop):
+    """Short write transactions from another connection, like the web interface makes"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    interval = 1 / rate
+    while not stop.is_set():
+        cursor = conn.cursor()
+        alfred.execute_with_retry(cursor, "UPDATE counters SET value = value WHERE name = 'data_version'")
+        alfred.bump_data_version(cursor)
+        conn.commit()
+        stop.wait(interval)
+    conn.close()
+
+def run_storm(args):
+    weights = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='alfred-events-', dir=args.dir)
+    try:
+        torrents = os.path.join(workdir, 'torrents')
+        links = os.path.join(workdir, 'links')
+        os.makedirs(torrents)
+        os.makedirs(links)
+        targets = []
+        for i in range(args.targets):
+            target = os.path.join(torrents, f'file{i}.mkv')
+            open(target, 'w').close()
+            targets.append(target)
+        folders = []
+        for i in range(args.folders):
+            folder = os.path.join(links, f'folder{i}')
+            os.makedirs(folder)
+            folders.append(folder)
+
+        db_path = os.path.join(workdir, 'bench.db')
+        alfred = load_alfred({'links': links, 'torrents': torrents}, db_path)
+        alfred.create_table(alfred.get_db_connection())
+        from database import lock_retry_count
+        retries_before = lock_retry_count()
+
+        events = instrumented_queue(alfred, args.flush_interval, args.batch_size, args.queue_size)
+        events.start()
+        handler = alfred.SymlinkEventHandler(dry_run=False, events=events)
+
+        stop_writer = threading.Event()
+        writer = None
+        if args.writer_rate > 0:
+            writer = threading.Thread(target=competing_writer, args=(alfred, db_path, args.writer_rate, stop_writer), daemon=True)
+            writer.start()
+
+        live = []
+        counts = dict.fromkeys(EVENT_KINDS, 0)
+        kinds = list(weights)
+        next_name = 0
+        started = time.perf_counter()
+        for i in range(args.events):
+            if args.rate > 0:
+                delay = started + i / args.rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            kind = rng.choices(kinds, weights=[weights[kind] for kind in kinds])[0]
+            if kind != 'created' and not live:
+                kind = 'created'
+            if kind == 'created':
+                path = os.path.join(rng.choice(folders), f'link{next_name}.mkv')
+                next_name += 1
+                os.symlink(rng.choice(targets), path)
+                live.append(path)
+                handler.on_created(FileCreatedEvent(path))
+            elif kind == 'deleted':
+                path = live.pop(rng.randrange(len(live)))
+                os.remove(path)
+                handler.on_deleted(FileDeletedEvent(path))
+            else:
+                index = rng.randrange(len(live))
+                source = live[index]
+                dest = os.path.join(rng.choice(folders), f'link{next_name}.mkv')
+                next_name += 1
+                os.rename(source, dest)
+                live[index] = dest
+                handler.on_moved(FileMovedEvent(source, dest))
+            counts[kind] += 1
+        produced = time.perf_counter()
+        events.stop()
+        stop_writer.set()
+        if writer:
+            writer.join()
+
+        cursor = alfred.get_db_connection().cursor()
+        cursor.execute('SELECT COUNT(*) FROM symlinks')
+        tracked = cursor.fetchone()[0]
+        from database import counter_drift
+        drift = counter_drift(cursor)
+        seconds = events.last_commit - started
+        latencies = events.latencies
+        return {
+            'revision': alfred_revision(),
+            'created': int(time.time()),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'parameters': {
+                'events': args.events,
+                'rate': args.rate,
+                'mix': weights,
+                'targets': args.targets,
+                'folders': args.folders,
+                'writer_rate': args.writer_rate,
+                'seed': args.seed,
+            },
+            'config': {
+                'EVENT_FLUSH_INTERVAL': events.flush_interval,
+                'EVENT_BATCH_SIZE': events.batch_size,
+                'EVENT_QUEUE_SIZE': events.events.maxsize,
+            },
+            'event_counts': counts,
+            'queue_items': len(latencies),
+            'produce_seconds': round(produced - started, 4),
+            'producer_blocked_seconds': round(events.blocked_seconds, 4),
+            'flushes': events.flushes,
+            'lock_retries': lock_retry_count() - retries_before,
+            'latency_ms': {
+                name: round(percentile(latencies, fraction) * 1000, 2) if latencies else None
+                for name, fraction in [('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0)]
+            },
+            'consistent': tracked == len(live),
+            'counters_match': not drift,
+            'counter_drift': drift,
+            # Same shape as benchmarks.run, so --compare works on these files too
+            'phases': {
+                'event_storm': {
+                    'items': args.events,
+                    'seconds': round(seconds, 4),
+                    'items_per_second': round(args.events / seconds, 1) if seconds > 0 else None,
+                    'sql_statements': events.statements.count,
+                    'peak_rss_kb': peak_rss_kb(),
+                },
+            },
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def print_storm(results):
+    phase = results['phases']['event_storm']
+    latency = results['latency_ms']
+    print(f"Events:             {phase['items']} ({', '.join(f'{k} {v}' for k, v in results['event_counts'].items())})")
+    print(f"Sustained:          {phase['items_per_second']} events/s over {phase['seconds']}s, {results['flushes']} commits")
+    print(f"Commit latency ms:  p50 {latency['p50']}  p90 {latency['p90']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"Producer blocked:   {results['producer_blocked_seconds']}s waiting to enqueue")
+    print(f"Lock retries:       {results['lock_retries']}")
+    print(f"SQL statements:     {phase['sql_statements']}")
+    print(f"Database matches disk: {results['consistent']}")
+    print(f"Counters match tables: {results['counters_match']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the real-time symlink event pipeline.")
+    parser.add_argument('--events', type=int, default=20000, help="Number of handler events to generate.")
+    parser.add_argument('--rate', type=float, default=0, help="Events per second to generate (0 = as fast as possible).")
+    parser.add_argument('--mix', default='created=60,deleted=20,moved=20', help="Relative weights of created, deleted and moved events.")
+    parser.add_argument('--targets', type=int, default=1000, help="Torrent files the symlinks point at.")
+    parser.add_argument('--folders', type=int, default=50, help="Folders the symlinks are spread over.")
+    parser.add_argument('--writer-rate', type=float, default=0, help="Write transactions per second from a competing connection (0 = none).")
+    parser.add_argument('--flush-interval', type=float, default=None, help="Override EVENT_FLUSH_INTERVAL.")
+    parser.add_argument('--batch-size', type=int, default=None, help="Override EVENT_BATCH_SIZE.")
+    parser.add_argument('--queue-size', type=int, default=None, help="Override EVENT_QUEUE_SIZE.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed, so runs are repeatable.")
+    parser.add_argument('--dir', default=None, help="Where to create the scratch directory (default: the system temp directory).")
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = run_storm(args)
+    print_storm(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
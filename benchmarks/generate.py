@@ -0,0 +1,134 @@
+"""Build a synthetic torrent library and symlink tree for the benchmarks.
+
+    python -m benchmarks.generate /tmp/alfred-library --torrent-files 100000 --symlinks 80000
+
+Point it at a tmpfs or local disk; the layout is:
+
+    <path>/torrents/    torrent files spread over a depth x fanout directory tree
+    <path>/hardlinks/   hardlinked copies of some linked torrent files
+    <path>/links/       symlinks to torrent files (or their hardlinks), same tree shape
+    <path>/library.json the parameters and resulting counts
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+
+MANIFEST = 'library.json'
+
+def build_tree(root, depth, fanout):
+    """Create a depth x fanout directory tree under root and return its leaf directories"""
+    folders = [root]
+    for level in range(depth):
+        folders = [os.path.join(folder, f'd{level}_{i}') for folder in folders for i in range(fanout)]
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
+    return folders
+
+def generate_library(path, torrent_files=10000, symlinks=8000, depth=3, fanout=8,
+                     orphan_ratio=0.2, hardlink_ratio=0.0, file_size=0, seed=0):
+    """Generate a library at path and return its manifest.
+
+    orphan_ratio of the torrent files get no symlink, so a scan deletes them.
+    Symlinks are spread over the remaining files, several per file when there
+    are more symlinks than linked files. hardlink_ratio of the linked files are
+    reached through a hardlinked copy instead, which only LINK_MATCH_MODE=inode
+    recognises as used. Files are sparse, so file_size costs no disk space.
+    """
+    if os.path.exists(path):
+        if os.listdir(path) and not os.path.exists(os.path.join(path, MANIFEST)):
+            raise ValueError(f'{path} is not empty and was not created by the benchmark generator')
+        shutil.rmtree(path)
+    if not 0 <= orphan_ratio <= 1 or not 0 <= hardlink_ratio <= 1:
+        raise ValueError('orphan_ratio and hardlink_ratio must be between 0 and 1')
+
+    rng = random.Random(seed)
+    torrents_root = os.path.join(path, 'torrents')
+    links_root = os.path.join(path, 'links')
+    hardlinks_root = os.path.join(path, 'hardlinks')
+    os.makedirs(hardlinks_root)
+
+    torrent_folders = build_tree(torrents_root, depth, fanout)
+    files = []
+    for i in range(torrent_files):
+        file_path = os.path.join(torrent_folders[i % len(torrent_folders)], f'file{i}.mkv')
+        with open(file_path, 'wb') as f:
+            if file_size:
+                f.truncate(file_size)
+        files.append(file_path)
+
+    orphans = set(rng.sample(range(torrent_files), round(torrent_files * orphan_ratio)))
+    linked = [file_path for i, file_path in enumerate(files) if i not in orphans]
+    if symlinks and not linked:
+        raise ValueError('Every torrent file is an orphan, so there is nothing to link to')
+
+    # Swap some linked files for a hardlinked copy outside the torrents tree
+    hardlinked = 0
+    for i in rng.sample(range(len(linked)), round(len(linked) * hardlink_ratio)):
+        copy = os.path.join(hardlinks_root, f'hardlink{i}.mkv')
+        os.link(linked[i], copy)
+        linked[i] = copy
+        hardlinked += 1
+
+    link_folders = build_tree(links_root, depth, fanout)
+    for j in range(symlinks):
+        os.symlink(linked[j % len(linked)], os.path.join(link_folders[j % len(link_folders)], f'link{j}.mkv'))
+
+    manifest = {
+        'path': path,
+        'torrents': torrents_root,
+        'links': links_root,
+        'hardlinks': hardlinks_root,
+        'parameters': {
+            'torrent_files': torrent_files,
+            'symlinks': symlinks,
+            'depth': depth,
+            'fanout': fanout,
+            'orphan_ratio': orphan_ratio,
+            'hardlink_ratio': hardlink_ratio,
+            'file_size': file_size,
+            'seed': seed,
+        },
+        'counts': {
+            'torrent_files': torrent_files,
+            'orphans': len(orphans),
+            'hardlinks': hardlinked,
+            'symlinks': symlinks,
+            'torrent_folders': len(torrent_folders),
+            'link_folders': len(link_folders),
+        },
+    }
+    with open(os.path.join(path, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def add_library_arguments(parser):
+    parser.add_argument('--torrent-files', type=int, default=10000, help="Number of torrent files.")
+    parser.add_argument('--symlinks', type=int, default=8000, help="Number of symlinks.")
+    parser.add_argument('--depth', type=int, default=3, help="Directory depth of the torrent and symlink trees.")
+    parser.add_argument('--fanout', type=int, default=8, help="Subdirectories per directory.")
+    parser.add_argument('--orphan-ratio', type=float, default=0.2, help="Fraction of torrent files with no symlink.")
+    parser.add_argument('--hardlink-ratio', type=float, default=0.0, help="Fraction of linked files reached through a hardlink.")
+    parser.add_argument('--file-size', type=int, default=0, help="Apparent size of each (sparse) torrent file in bytes.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed, so runs are repeatable.")
+
+def library_options(args):
+    return {
+        'torrent_files': args.torrent_files,
+        'symlinks': args.symlinks,
+        'depth': args.depth,
+        'fanout': args.fanout,
+        'orphan_ratio': args.orphan_ratio,
+        'hardlink_ratio': args.hardlink_ratio,
+        'file_size': args.file_size,
+        'seed': args.seed,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic library for the alfred benchmarks.")
+    parser.add_argument('path', help="Directory to create the library in (replaced if it holds an earlier library).")
+    add_library_arguments(parser)
+    args = parser.parse_args()
+    manifest = generate_library(args.path, **library_options(args))
+    print(json.dumps(manifest['counts'], indent=2))
@@ -0,0 +1,245 @@
+"""Time alfred's scan phases against a synthetic library.
+
+    python -m benchmarks.run --torrent-files 100000 --symlinks 80000 --output after.json
+    python -m benchmarks.run --compare before.json after.json
+
+Each phase reports its wall time, items per second, the number of SQL
+statements it ran and the process's peak RSS once it finished. Settings such
+as SCAN_WORKERS, LINK_MATCH_MODE or DELETE_WORKERS are read from the
+environment exactly as alfred.py reads them.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from benchmarks.generate import generate_library, add_library_arguments, library_options
+
+class StatementCounter:
+    """sqlite3 trace callback counting the statements a connection runs"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, statement):
+        self.count += 1
+
+def peak_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+@contextmanager
+def measure(results, name, conn):
+    """Time the body and record it under results[name]; the body sets record['items']
+    and may set record['sql_statements'] when the connection's trace callback is taken"""
+    counter = StatementCounter()
+    conn.set_trace_callback(counter)
+    record = {'items': 0}
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        conn.set_trace_callback(None)
+    seconds = time.perf_counter() - started
+    record.update({
+        'seconds': round(seconds, 4),
+        'items_per_second': round(record['items'] / seconds, 1) if seconds > 0 else None,
+        'sql_statements': record.get('sql_statements', counter.count),
+        'peak_rss_kb': peak_rss_kb(),
+    })
+    results[name] = record
+
+def load_alfred(manifest, db_path):
+    """Import alfred.py configured for the generated library"""
+    os.environ['SYMLINK_DIR'] = manifest['links']
+    os.environ['TORRENTS_DIR'] = manifest['torrents']
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import alfred
+    alfred.db_file = db_path
+    # Per-file log lines would dominate the timings
+    alfred.logger.remove()
+    alfred.logger.add(sys.stderr, level='WARNING')
+    return alfred
+
+def run_phases(alfred, manifest, upserts):
+    results = {}
+    symlink_roots = [manifest['links']]
+    torrent_roots = [manifest['torrents']]
+    conn = alfred.get_db_connection()
+    alfred.create_table(conn)
+    stat_files = alfred.LINK_MATCH_MODE == 'inode'
+
+    links = []
+    dst_links = set()
+    with measure(results, 'symlink_walk', conn) as record:
+        for _, entries in alfred.walk_directories(symlink_roots, stat_files=stat_files):
+            for entry in entries:
+                if not entry.is_symlink():
+                    continue
+                key = alfred.link_key(entry)
+                if key is not None:
+                    dst_links.add(key)
+                links.append((entry.path, os.readlink(entry.path)))
+        record['items'] = len(links)
+
+    all_files = set()
+    used_files = set()
+    with measure(results, 'torrent_walk', conn) as record:
+        for _, entries in alfred.walk_directories(torrent_roots, stat_files=stat_files):
+            for entry in entries:
+                all_files.add(entry.path)
+                if alfred.link_key(entry) in dst_links:
+                    used_files.add(entry.path)
+        record['items'] = len(all_files)
+
+    with measure(results, 'db_reconcile', conn) as record:
+        alfred.reconcile_symlinks(conn, iter(links))
+        record['items'] = len(links)
+
+    # A steady-state scan, where nothing changed since the last one
+    with measure(results, 'db_reconcile_unchanged', conn) as record:
+        alfred.reconcile_symlinks(conn, iter(links))
+        record['items'] = len(links)
+
+    # Real-time events: forget a sample of symlinks, then add them back one at a time
+    sample = [path for path, _ in links[:upserts]]
+    cursor = conn.cursor()
+    for path in sample:
+        alfred.remove_symlink_entry(cursor, path)
+    conn.commit()
+    with measure(results, 'upsert_symlink', conn) as record:
+        for path in sample:
+            alfred.upsert_symlink(path)
+        record['items'] = len(sample)
+
+    with measure(results, 'full_scan_dry_run', conn) as record:
+        stats = alfred.find_non_linked_files(torrent_roots, symlink_roots, dry_run=True, no_confirm=True)
+        record['items'] = len(all_files)
+        # The scan counts its own statements with the connection's trace callback
+        record['sql_statements'] = stats.db_statements
+        record['scan_phases'] = stats.phases
+
+    # Destructive, so it goes last
+    with measure(results, 'delete', conn) as record:
+        plan = alfred.plan_deletions(all_files - used_files, used_files, torrent_roots)
+        executor = alfred.DeletionExecutor(conn).run(plan)
+        record['items'] = executor.deleted_files + executor.deleted_folders
+        record['failures'] = executor.failures
+
+    return results
+
+def alfred_revision():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(args):
+    workdir = tempfile.mkdtemp(prefix='alfred-bench-', dir=args.dir)
+    try:
+        started = time.perf_counter()
+        manifest = generate_library(os.path.join(workdir, 'library'), **library_options(args))
+        generate_seconds = time.perf_counter() - started
+
+        alfred = load_alfred(manifest, os.path.join(workdir, 'bench.db'))
+        phases = run_phases(alfred, manifest, args.upserts)
+        from database import counter_drift
+        drift = counter_drift(alfred.get_db_connection().cursor())
+        return {
+            'revision': alfred_revision(),
+            'created': int(time.time()),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'library': manifest['parameters'],
+            'library_counts': manifest['counts'],
+            'generate_seconds': round(generate_seconds, 2),
+            'config': {
+                'DELETE_BEHAVIOR': alfred.delete_behavior,
+                'LINK_MATCH_MODE': alfred.LINK_MATCH_MODE,
+                'SCAN_WORKERS': alfred.SCAN_WORKERS,
+                'SCAN_WORKER_MODE': alfred.SCAN_WORKER_MODE,
+                'DELETE_WORKERS': alfred.DELETE_WORKERS,
+            },
+            'phases': phases,
+            # The counters are adjusted by hand on every write path; they must still match the tables
+            'counters_match': not drift,
+            'counter_drift': drift,
+        }
+    finally:
+        if args.keep:
+            print(f"Library kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def print_results(results):
+    print(f"{'phase':<24}{'seconds':>10}{'items/s':>14}{'sql':>10}{'peak rss MB':>14}")
+    for name, phase in results['phases'].items():
+        rate = phase['items_per_second']
+        print(
+            f"{name:<24}{phase['seconds']:>10.3f}{rate if rate is not None else '-':>14}"
+            f"{phase['sql_statements']:>10}{phase['peak_rss_kb'] / 1024:>14.1f}"
+        )
+    if 'counters_match' in results:
+        print(f"Counters match tables: {results['counters_match']}")
+
+def compare(before_path, after_path, threshold):
+    """Print per-phase changes; returns the phases that slowed down by more than threshold"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    if before.get('library') != after.get('library'):
+        print("⚠️ The two runs used different library parameters", file=sys.stderr)
+
+    regressions = []
+    print(f"{'phase':<24}{'before s':>10}{'after s':>10}{'change':>9}{'sql before':>12}{'sql after':>11}")
+    for name, new in after['phases'].items():
+        old = before['phases'].get(name)
+        if old is None:
+            print(f"{name:<24}{'-':>10}{new['seconds']:>10.3f}{'new':>9}{'-':>12}{new['sql_statements']:>11}")
+            continue
+        change = (new['seconds'] - old['seconds']) / old['seconds'] if old['seconds'] else 0.0
+        if threshold is not None and change > threshold:
+            regressions.append(name)
+        print(
+            f"{name:<24}{old['seconds']:>10.3f}{new['seconds']:>10.3f}{change:>+9.1%}"
+            f"{old['sql_statements']:>12}{new['sql_statements']:>11}"
+        )
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark alfred's scan phases on a synthetic library.")
+    add_library_arguments(parser)
+    parser.add_argument('--upserts', type=int, default=1000, help="Symlinks re-added one at a time in the upsert_symlink phase.")
+    parser.add_argument('--dir', default=None, help="Where to create the library (default: the system temp directory; a tmpfs is best).")
+    parser.add_argument('--keep', action='store_true', help="Keep the generated library and database afterwards.")
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="Compare two result files instead of running.")
+    parser.add_argument('--threshold', type=float, default=None, help="With --compare, exit with status 1 if a phase is slower by more than this fraction (e.g. 0.1).")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        if regressions:
+            print(f"Slower than the threshold: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+        sys.exit(0)
+
+    results = run_benchmark(args)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,488 @@
+import os
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import telemetry
+
+# Tuning shared by alfred.py and web/app.py
+CACHED_STATEMENTS = 512  # Prepared statements kept per connection
+READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', '8'))
+WRITE_POOL_SIZE = int(os.getenv('DB_WRITE_POOL_SIZE', '4'))
+MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))  # Bytes, 0 disables memory-mapped reads
+
+def connect(path, readonly=False, row_factory=None, check_same_thread=True):
+    """Open a connection and apply the PRAGMAs once for its whole lifetime"""
+    conn = sqlite3.connect(
+        path,
+        timeout=30,  # 30 second timeout
+        cached_statements=CACHED_STATEMENTS,
+        check_same_thread=check_same_thread,
+    )
+    if row_factory is not None:
+        conn.row_factory = row_factory
+    conn.execute('PRAGMA busy_timeout=30000')  # 30 second busy timeout
+    conn.execute('PRAGMA synchronous=NORMAL')
+    if readonly:
+        conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+        conn.execute('PRAGMA query_only=ON')
+    else:
+        # Enable WAL mode for better concurrency
+        conn.execute('PRAGMA journal_mode=WAL')
+    return conn
+
+def lock_retry_count():
+    """Times execute_with_retry has waited out a 'database is locked' error in this process"""
+    return telemetry.value('alfred_db_lock_retries_total')
+
+def execute_with_retry(cursor, query, params=None, max_retries=3):
+    """Execute a query with retry logic for database locks"""
+    for attempt in range(max_retries):
+        try:
+            if params:
+                return cursor.execute(query, params)
+            else:
+                return cursor.execute(query)
+        except sqlite3.OperationalError as e:
+            if 'database is locked' in str(e) and attempt < max_retries - 1:
+                telemetry.inc('alfred_db_lock_retries_total')
+                time.sleep(1)  # Wait 1 second before retrying
+                continue
+            raise
+
+@contextmanager
+def savepoint(conn, name):
+    """Run the body in a savepoint of conn's transaction, yielding a cursor.
+
+    If the body raises, only its own changes are undone and the rest of the
+    transaction carries on; committing is left to the caller.
+    """
+    cursor = conn.cursor()
+    # An outermost savepoint would commit on release, so open the transaction first
+    if not conn.in_transaction:
+        cursor.execute('BEGIN')
+    cursor.execute(f'SAVEPOINT {name}')
+    try:
+        yield cursor
+    except BaseException:
+        cursor.execute(f'ROLLBACK TO {name}')
+        cursor.execute(f'RELEASE {name}')
+        raise
+    cursor.execute(f'RELEASE {name}')
+
+class ThreadConnections:
+    """One persistent connection per thread, opened on first use.
+
+    Callers must not close the returned connection; it is reused by every
+    later call from the same thread.
+    """
+
+    def __init__(self, **options):
+        self.options = options
+        self.local = threading.local()
+
+    def get(self, path):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None and self.local.path == path:
+            return conn
+        if conn is not None:
+            conn.close()
+        conn = connect(path, **self.options)
+        self.local.conn = conn
+        self.local.path = path
+        return conn
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+class ConnectionPool:
+    """A bounded pool of connections shared between threads.
+
+    Connections are opened lazily up to `size` and handed out most recently
+    used first, so a lightly loaded server keeps reusing the same warm ones.
+    """
+
+    def __init__(self, path, size, readonly=False, row_factory=None):
+        self.path = path
+        self.size = size
+        self.readonly = readonly
+        self.row_factory = row_factory
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout=30):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            can_open = self.opened < self.size
+            if can_open:
+                self.opened += 1
+        if can_open:
+            try:
+                return connect(self.path, readonly=self.readonly, row_factory=self.row_factory, check_same_thread=False)
+            except Exception:
+                with self.lock:
+                    self.opened -= 1
+                raise
+        try:
+            return self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f'No database connection available after {timeout} seconds')
+
+    def release(self, conn):
+        try:
+            # Never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self.lock:
+                self.opened -= 1
+            return
+        self.idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+def ensure_columns(cursor, table, columns):
+    """Add any columns missing from an existing table (for databases created by older versions)."""
+    execute_with_retry(cursor, f'PRAGMA table_info({table})')
+    existing = {col[1] for col in cursor.fetchall()}
+    for name, definition in columns.items():
+        if name not in existing:
+            execute_with_retry(cursor, f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+
+def create_schema(cursor):
+    """Create the tables alfred.py and web/app.py share, whichever starts first.
+
+    The symlinks and targets tables are left to alfred's create_table, which
+    migrates them from the legacy layout before creating them.
+    """
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS scan_times (
+        id INTEGER PRIMARY KEY,
+        last_scan_time INTEGER,
+        scan_interval INTEGER
+    )
+    ''')
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS deletions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symlink TEXT NOT NULL,
+        target TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
+        reason TEXT
+    )
+    ''')
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS metrics_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        total_symlinks INTEGER,
+        unique_targets INTEGER,
+        total_deletions INTEGER
+    )
+    ''')
+    execute_with_retry(cursor, 'CREATE INDEX IF NOT EXISTS idx_metrics_history_timestamp ON metrics_history(timestamp)')
+    # Hourly/daily/monthly summaries of metrics_history, read by the dashboard charts
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS metrics_rollup (
+        granularity TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        min_value INTEGER NOT NULL,
+        max_value INTEGER NOT NULL,
+        last_value INTEGER NOT NULL,
+        samples INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (granularity, bucket, metric)
+    ) WITHOUT ROWID
+    ''')
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS scan_statistics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        scan_time INTEGER NOT NULL,
+        files_checked INTEGER DEFAULT 0,
+        files_deleted INTEGER DEFAULT 0,
+        folders_deleted INTEGER DEFAULT 0,
+        scan_mode TEXT DEFAULT 'full'
+    )
+    ''')
+    ensure_columns(cursor, 'scan_statistics', {
+        'scan_mode': "TEXT DEFAULT 'full'",
+        'delete_seconds': 'REAL DEFAULT 0',
+        'delete_rate': 'REAL DEFAULT 0',
+        'bytes_deleted': 'INTEGER DEFAULT 0',
+        'delete_failures': 'INTEGER DEFAULT 0',
+        'duration_seconds': 'REAL DEFAULT 0',
+        'peak_rss_kb': 'INTEGER DEFAULT 0',
+        'db_statements': 'INTEGER DEFAULT 0',
+        'db_seconds': 'REAL DEFAULT 0',
+    })
+    # Per-phase breakdown of each scan, shown as a trend on the dashboard
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS scan_phases (
+        scan_id INTEGER NOT NULL REFERENCES scan_statistics(id),
+        phase TEXT NOT NULL,
+        seconds REAL NOT NULL DEFAULT 0,
+        db_seconds REAL NOT NULL DEFAULT 0,
+        db_statements INTEGER NOT NULL DEFAULT 0,
+        items INTEGER NOT NULL DEFAULT 0,
+        scandir_calls INTEGER NOT NULL DEFAULT 0,
+        stat_calls INTEGER NOT NULL DEFAULT 0,
+        readlink_calls INTEGER NOT NULL DEFAULT 0,
+        realpath_calls INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (scan_id, phase)
+    ) WITHOUT ROWID
+    ''')
+    # Scans requested through the web interface or the schedule, run by ScanJobRunner
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS scan_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT NOT NULL,
+        requested_by TEXT NOT NULL,
+        dry_run INTEGER NOT NULL DEFAULT 0,
+        full_scan INTEGER NOT NULL DEFAULT 0,
+        created_at INTEGER NOT NULL,
+        started_at INTEGER,
+        finished_at INTEGER,
+        heartbeat_at INTEGER,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        worker TEXT,
+        error TEXT,
+        result TEXT
+    )
+    ''')
+    execute_with_retry(cursor, 'CREATE INDEX IF NOT EXISTS idx_scan_jobs_status ON scan_jobs(status)')
+    # Single row replaced by the running scan, see ScanProgress
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS scan_progress (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        data TEXT NOT NULL,
+        updated_at INTEGER NOT NULL
+    )
+    ''')
+    # Partial results of an unfinished scan, see ScanCheckpoint
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS scan_checkpoint (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        phase TEXT NOT NULL,
+        config TEXT NOT NULL,
+        started_at INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL,
+        runs INTEGER NOT NULL DEFAULT 1
+    )
+    ''')
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS scan_units (
+        phase TEXT NOT NULL,
+        path TEXT NOT NULL,
+        PRIMARY KEY (phase, path)
+    ) WITHOUT ROWID
+    ''')
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS scan_staged_links (
+        symlink TEXT PRIMARY KEY,
+        target TEXT,
+        link_key TEXT
+    ) WITHOUT ROWID
+    ''')
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS scan_staged_files (
+        path TEXT PRIMARY KEY,
+        used INTEGER
+    ) WITHOUT ROWID
+    ''')
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS directory_cache (
+        path TEXT PRIMARY KEY,
+        mtime_ns INTEGER NOT NULL,
+        ctime_ns INTEGER NOT NULL,
+        entries TEXT NOT NULL,
+        subdirs TEXT NOT NULL
+    )
+    ''')
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS pending_deletions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        target TEXT NOT NULL,
+        scheduled_time INTEGER NOT NULL,
+        claimed_at INTEGER
+    )
+    ''')
+    ensure_columns(cursor, 'pending_deletions', {'claimed_at': 'INTEGER'})
+    execute_with_retry(cursor, 'CREATE INDEX IF NOT EXISTS idx_pending_deletions_target ON pending_deletions(target)')
+    execute_with_retry(cursor, 'CREATE INDEX IF NOT EXISTS idx_pending_deletions_scheduled_time ON pending_deletions(scheduled_time)')
+    # Named counters; data_version is bumped by every write the web UI can observe
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    # Recent changes, tailed by the web interface and pushed to browsers
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        data TEXT NOT NULL
+    )
+    ''')
+    # Position reached by interrupted restores in the web interface, keyed by backup_identity()
+    execute_with_retry(cursor, '''
+    CREATE TABLE IF NOT EXISTS restore_progress (
+        backup_key TEXT PRIMARY KEY,
+        entries_done INTEGER NOT NULL,
+        restored INTEGER NOT NULL DEFAULT 0,
+        skipped INTEGER NOT NULL DEFAULT 0,
+        updated_at INTEGER NOT NULL
+    )
+    ''')
+
+def bump_data_version(cursor):
+    """Mark that data served by the read APIs changed; call inside the writing transaction"""
+    execute_with_retry(cursor, '''
+        INSERT INTO counters (name, value) VALUES ('data_version', 1)
+        ON CONFLICT(name) DO UPDATE SET value = value + 1
+    ''')
+
+COUNTER_NAMES = ['total_symlinks', 'unique_targets', 'total_deletions']
+
+def adjust_counter(cursor, name, delta):
+    """Add delta to a named counter; call inside the writing transaction"""
+    if delta:
+        execute_with_retry(cursor, '''
+            INSERT INTO counters (name, value) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+        ''', (name, delta))
+
+def refresh_counters(cursor):
+    """Recount the totals from their tables, after bulk changes or on startup.
+
+    alfred's create_table calls this on every start, so that is where any
+    drift the write paths' adjust_counter calls let in gets corrected.
+    """
+    execute_with_retry(cursor, '''
+        INSERT INTO counters (name, value) VALUES
+            ('total_symlinks', (SELECT COUNT(*) FROM symlinks)),
+            ('unique_targets', (SELECT COUNT(*) FROM targets)),
+            ('total_deletions', (SELECT COUNT(*) FROM deletions))
+        ON CONFLICT(name) DO UPDATE SET value = excluded.value
+    ''')
+
+def counter_drift(cursor):
+    """Counters that no longer match their tables, as {name: (counter, rows)}"""
+    execute_with_retry(cursor, '''
+        SELECT c.name, c.value, t.counted
+        FROM counters c
+        JOIN (
+            SELECT 'total_symlinks' AS name, COUNT(*) AS counted FROM symlinks
+            UNION ALL SELECT 'unique_targets', COUNT(*) FROM targets
+            UNION ALL SELECT 'total_deletions', COUNT(*) FROM deletions
+        ) t ON t.name = c.name
+        WHERE c.value != t.counted
+    ''')
+    return {name: (value, counted) for name, value, counted in cursor.fetchall()}
+
+def read_counters(cursor):
+    """Current totals as a dict, without counting any rows"""
+    execute_with_retry(cursor, f'''
+        SELECT name, value FROM counters
+        WHERE name IN ({', '.join('?' * len(COUNTER_NAMES))})
+    ''', COUNTER_NAMES)
+    counters = dict.fromkeys(COUNTER_NAMES, 0)
+    counters.update((row[0], row[1]) for row in cursor.fetchall())
+    return counters
+
+def get_data_version(cursor):
+    execute_with_retry(cursor, "SELECT value FROM counters WHERE name = 'data_version'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+EVENT_HISTORY = 1000  # Rows kept in the events table for /api/events subscribers
+
+def record_event(cursor, event_type, data, max_retries=3):
+    """Publish a change to /api/events subscribers; call inside the writing transaction"""
+    execute_with_retry(cursor, '''
+        INSERT INTO events (timestamp, type, data)
+        VALUES (?, ?, ?)
+    ''', (int(time.time()), event_type, json.dumps(data)), max_retries)
+    execute_with_retry(cursor, 'DELETE FROM events WHERE id <= ?', (cursor.lastrowid - EVENT_HISTORY,), max_retries)
+
+# Scan jobs are queued by the web interface (and the scan schedule) and run by alfred.py
+SCAN_JOB_STATES = ['queued', 'running', 'succeeded', 'failed', 'cancelled']
+SCAN_JOB_COLUMNS = [
+    'id', 'status', 'requested_by', 'dry_run', 'full_scan', 'created_at', 'started_at',
+    'finished_at', 'heartbeat_at', 'cancel_requested', 'worker', 'error', 'result',
+]
+
+def scan_job_rows(cursor):
+    """Fetch scan_jobs rows selected with SCAN_JOB_COLUMNS as dicts"""
+    jobs = []
+    for row in cursor.fetchall():
+        job = dict(zip(SCAN_JOB_COLUMNS, row))
+        job['dry_run'] = bool(job['dry_run'])
+        job['full_scan'] = bool(job['full_scan'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        jobs.append(job)
+    return jobs
+
+def get_scan_job(cursor, job_id):
+    execute_with_retry(cursor, f'SELECT {", ".join(SCAN_JOB_COLUMNS)} FROM scan_jobs WHERE id = ?', (job_id,))
+    jobs = scan_job_rows(cursor)
+    return jobs[0] if jobs else None
+
+def enqueue_scan_job(cursor, requested_by, dry_run=False, full_scan=False):
+    """Queue a scan unless an identical one is already waiting; returns (job, created).
+
+    Call inside the writing transaction.
+    """
+    execute_with_retry(cursor, f'''
+        SELECT {", ".join(SCAN_JOB_COLUMNS)} FROM scan_jobs
+        WHERE status = 'queued' AND dry_run = ? AND full_scan = ?
+        ORDER BY id LIMIT 1
+    ''', (int(dry_run), int(full_scan)))
+    waiting = scan_job_rows(cursor)
+    if waiting:
+        return waiting[0], False
+    execute_with_retry(cursor, '''
+        INSERT INTO scan_jobs (status, requested_by, dry_run, full_scan, created_at)
+        VALUES ('queued', ?, ?, ?, ?)
+    ''', (requested_by, int(dry_run), int(full_scan), int(time.time())))
+    job = get_scan_job(cursor, cursor.lastrowid)
+    record_event(cursor, 'scan_job', job)
+    return job, True
+
+def cancel_scan_job(cursor, job_id):
+    """Cancel a queued job now, or ask the runner to stop a running one.
+
+    Returns the updated job, or None if it doesn't exist. Call inside the
+    writing transaction.
+    """
+    execute_with_retry(cursor, '''
+        UPDATE scan_jobs SET status = 'cancelled', finished_at = ?
+        WHERE id = ? AND status = 'queued'
+    ''', (int(time.time()), job_id))
+    execute_with_retry(cursor, '''
+        UPDATE scan_jobs SET cancel_requested = 1
+        WHERE id = ? AND status = 'running'
+    ''', (job_id,))
+    job = get_scan_job(cursor, job_id)
+    if job is not None:
+        record_event(cursor, 'scan_job', job)
+    return job
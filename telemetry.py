@@ -0,0 +1,153 @@
+"""In-process counters, gauges and histograms, rendered in the Prometheus text format.
+
+alfred.py and the web interface run as separate processes, so each keeps its
+own registry. The daemon writes its registry to a JSON snapshot file every few
+seconds and the web interface merges that into /metrics, labelled by process.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+SNAPSHOT_FILE = os.getenv('METRICS_FILE', '/app/data/metrics.json')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DURATION_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'alfred_watchdog_events_total': ('counter', 'Filesystem events received from watchdog, by type', None),
+    'alfred_symlink_upserts_total': ('counter', 'Symlinks added or retargeted one at a time', None),
+    'alfred_ref_count_changes_total': ('counter', 'Target reference count changes, by direction', None),
+    'alfred_deletions_scheduled_total': ('counter', 'Targets queued in pending_deletions', None),
+    'alfred_deletions_committed_total': ('counter', 'Files and folders removed from disk, by reason', None),
+    'alfred_db_lock_retries_total': ('counter', "Statements retried after 'database is locked'", None),
+    'alfred_event_commit_latency_seconds': ('histogram', 'Time from a watchdog event to the commit that applied it', LATENCY_BUCKETS),
+    'alfred_scan_phase_seconds': ('histogram', 'Wall time of each scan phase', DURATION_BUCKETS),
+    'alfred_scan_duration_seconds': ('histogram', 'Wall time of whole scans', DURATION_BUCKETS),
+    'alfred_http_request_seconds': ('histogram', 'Web interface handler latency, by endpoint', LATENCY_BUCKETS),
+    'alfred_event_queue_depth': ('gauge', 'Watchdog events waiting for the event writer', None),
+    'alfred_pending_deletions': ('gauge', 'Rows in pending_deletions, by state', None),
+    'alfred_pending_deletions_overdue_seconds': ('gauge', 'How far past its due time the oldest unclaimed pending deletion is', None),
+    'alfred_metrics_snapshot_age_seconds': ('gauge', "Age of the daemon's metrics snapshot", None),
+}
+
+_lock = threading.Lock()
+_series = {}  # (name, labels) -> value, or [bucket counts..., sum, count] for histograms
+_gauge_callbacks = {}
+
+def _key(name, labels):
+    if name not in METRICS:
+        raise KeyError(f'Unknown metric {name}')
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _series[key] = _series.get(key, 0) + amount
+
+def set_gauge(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _series[key] = value
+
+def track(name, callback, **labels):
+    """Read a gauge from callback whenever a snapshot is taken"""
+    _gauge_callbacks[_key(name, labels)] = callback
+
+def observe(name, *values, **labels):
+    key = _key(name, labels)
+    buckets = METRICS[name][2]
+    with _lock:
+        series = _series.get(key)
+        if series is None:
+            series = _series[key] = [0] * (len(buckets) + 2)
+        for value in values:
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+def value(name, **labels):
+    with _lock:
+        return _series.get(_key(name, labels), 0)
+
+def snapshot():
+    """Every series as a JSON-serialisable dict of name -> [[labels, value]]"""
+    for key, callback in list(_gauge_callbacks.items()):
+        try:
+            with _lock:
+                _series[key] = callback()
+        except Exception:
+            pass  # A broken callback shouldn't take the whole export down
+    metrics = {}
+    with _lock:
+        for (name, labels), series in _series.items():
+            metrics.setdefault(name, []).append([dict(labels), list(series) if isinstance(series, list) else series])
+    return metrics
+
+def write_snapshot(path=None):
+    """Replace the snapshot file atomically, so readers never see a partial one"""
+    path = path or SNAPSHOT_FILE
+    data = json.dumps({'written': time.time(), 'pid': os.getpid(), 'metrics': snapshot()})
+    fd, temp_path = tempfile.mkstemp(prefix='.metrics-', dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def read_snapshot(path=None):
+    """The snapshot written by another process, or None if there is none"""
+    try:
+        with open(path or SNAPSHOT_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+def render(sources):
+    """Prometheus text exposition of [(extra_labels, snapshot metrics)] sources"""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        samples = [
+            (dict(labels, **extra), series)
+            for extra, metrics in sources
+            for labels, series in metrics.get(name, [])
+        ]
+        if not samples:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, series in samples:
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(series)}')
+                continue
+            if len(series) != len(buckets) + 2:
+                continue  # Written with different buckets by another version
+            cumulative = 0
+            for bound, count in zip(buckets, series):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(dict(labels, le=_format_value(float(bound))))} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(dict(labels, le="+Inf"))} {series[-1]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(series[-2])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {series[-1]}')
+    return '\n'.join(lines) + '\n'
@@ -1,11 +1,10 @@
-from flask import Flask, jsonify, request, send_from_directory, Response
+from flask import Flask, jsonify, request, send_from_directory, Response, g, make_response
 import sqlite3
 import os
 from pathlib import Path
 import time
 import subprocess
 import sys
-from io import StringIO
 import contextlib
 from datetime import datetime, timedelta
 import json
@@ -13,6 +12,14 @@ import logging
 import traceback
 from loguru import logger
 import threading
+import base64
+import functools
+import hashlib
+import queue
+import gzip
+import zlib
+import codecs
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__, static_folder='.')
 
@@ -21,44 +28,104 @@ DB_PATH = '/app/data/symlinks.db'
 
 # Add parent directory to Python path
 sys.path.append('/app')
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from database import ConnectionPool, READ_POOL_SIZE, WRITE_POOL_SIZE, execute_with_retry, create_schema, bump_data_version, get_data_version, record_event
+from database import adjust_counter, read_counters
+from database import SCAN_JOB_COLUMNS, scan_job_rows, get_scan_job, enqueue_scan_job, cancel_scan_job
+import telemetry
+
+try:
+    import zstandard  # Optional, enables zstd compressed backups
+except ImportError:
+    zstandard = None
 
 # Grace period for pending deletions (in seconds), configurable via environment variable
 PENDING_DELETION_GRACE_SECONDS = int(os.getenv('PENDING_DELETION_GRACE_SECONDS', '60'))  # Default: 1 minute
 
-# Thread-safe scan status indicator
-default_scan_status = {
+# Restores check the filesystem and create symlinks on a worker pool, and
+# commit every RESTORE_BATCH_SIZE entries so an interrupted restore can resume
+RESTORE_WORKERS = int(os.getenv('RESTORE_WORKERS', '8'))
+RESTORE_BATCH_SIZE = int(os.getenv('RESTORE_BATCH_SIZE', '1000'))
+RESTORE_READ_SIZE = 64 * 1024  # Bytes read from the upload at a time
+RESTORE_MAX_ENTRY_SIZE = 1024 * 1024  # Characters one JSON array entry may span
+RESTORE_MAX_ERRORS = 100  # Error messages returned to the browser; the rest are only counted
+
+SCAN_HISTORY_LIMIT = 30  # Scans shown in the dashboard's scan performance trend
+
+restore_status = {
     'running': False,
-    'last_started': None,
-    'last_finished': None,
-    'last_type': None  # 'manual' or 'auto'
+    'file': None,
+    'processed': 0,
+    'restored': 0,
+    'skipped': 0,
+    'resumed_from': 0,
+    'started': None,
+    'finished': None,
+    'error': None
 }
-scan_status = default_scan_status.copy()
-scan_status_lock = threading.Lock()
+restore_status_lock = threading.Lock()
+restore_lock = threading.Lock()  # One restore at a time
+
+# Connections stay open between requests. Routes borrow one for the length of
+# the request and hand it back in release_db_connections.
+read_pool = ConnectionPool(DB_PATH, READ_POOL_SIZE, readonly=True, row_factory=sqlite3.Row)
+write_pool = ConnectionPool(DB_PATH, WRITE_POOL_SIZE, row_factory=sqlite3.Row)
+
+def get_read_connection():
+    """Read-only connection for the current request"""
+    if 'read_conn' not in g:
+        g.read_conn = read_pool.acquire()
+    return g.read_conn
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH, timeout=30)  # 30 second timeout
-    conn.row_factory = sqlite3.Row
-    
-    # Enable WAL mode for better concurrency
-    conn.execute('PRAGMA journal_mode=WAL')
-    conn.execute('PRAGMA synchronous=NORMAL')
-    conn.execute('PRAGMA busy_timeout=30000')  # 30 second busy timeout
-    
-    return conn
+    """Writable connection for the current request"""
+    if 'write_conn' not in g:
+        g.write_conn = write_pool.acquire()
+    return g.write_conn
 
-def execute_with_retry(cursor, query, params=None, max_retries=3):
-    """Execute a query with retry logic for database locks"""
-    for attempt in range(max_retries):
-        try:
-            if params:
-                return cursor.execute(query, params)
-            else:
-                return cursor.execute(query)
-        except sqlite3.OperationalError as e:
-            if 'database is locked' in str(e) and attempt < max_retries - 1:
-                time.sleep(1)  # Wait 1 second before retrying
-                continue
-            raise
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # The route pattern rather than the path, so symlink paths don't become label values
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        telemetry.observe('alfred_http_request_seconds', time.perf_counter() - started,
+                          endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+@app.teardown_appcontext
+def release_db_connections(exception):
+    conn = g.pop('read_conn', None)
+    if conn is not None:
+        read_pool.release(conn)
+    conn = g.pop('write_conn', None)
+    if conn is not None:
+        write_pool.release(conn)
+
+def conditional_response(response, etag):
+    """Tag a response and turn it into a 304 if the client already has it"""
+    response = make_response(response)
+    if response.status_code != 200:
+        return response
+    response.set_etag(etag)
+    # Make browsers revalidate every poll instead of reusing a stale copy
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def cached_by_data_version(view):
+    """Skip the database work when nothing changed since the client's last poll"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = f'v{get_data_version(get_read_connection().cursor())}'
+        if request.if_none_match.contains(etag):
+            return conditional_response(Response(), etag)
+        return conditional_response(view(*args, **kwargs), etag)
+    return wrapper
 
 @app.route('/')
 def index():
@@ -96,76 +163,119 @@ def settings_js():
 def serve_asset(filename):
     return send_from_directory('assets', filename)
 
+def scan_performance(cursor, limit=SCAN_HISTORY_LIMIT):
+    """Totals and per-phase stats of the most recent scans, oldest first"""
+    execute_with_retry(cursor, '''
+        SELECT id, scan_time, scan_mode, duration_seconds, peak_rss_kb,
+               db_statements, db_seconds, bytes_deleted
+        FROM scan_statistics
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (limit,))
+    scans = [dict(row) for row in reversed(cursor.fetchall())]
+    if not scans:
+        return {'last': None, 'history': []}
+
+    by_id = {scan['id']: scan for scan in scans}
+    for scan in scans:
+        scan['phases'] = {}
+    execute_with_retry(cursor, '''
+        SELECT scan_id, phase, seconds, db_seconds, db_statements, items,
+               scandir_calls, stat_calls, readlink_calls, realpath_calls
+        FROM scan_phases
+        WHERE scan_id >= ?
+    ''', (scans[0]['id'],))
+    for row in cursor.fetchall():
+        scan = by_id.get(row['scan_id'])
+        if scan is not None:
+            scan['phases'][row['phase']] = {key: row[key] for key in row.keys() if key not in ('scan_id', 'phase')}
+
+    # The trend only needs the phase timings; the last scan keeps everything
+    history = [
+        dict(scan, phases={phase: stats['seconds'] for phase, stats in scan['phases'].items()})
+        for scan in scans
+    ]
+    return {'last': scans[-1], 'history': history}
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text exposition of this process's metrics and the daemon's last snapshot"""
+    cursor = get_read_connection().cursor()
+    now = int(time.time())
+    execute_with_retry(cursor, '''
+        SELECT
+            COALESCE(SUM(claimed_at IS NULL AND scheduled_time > ?), 0) AS waiting,
+            COALESCE(SUM(claimed_at IS NULL AND scheduled_time <= ?), 0) AS due,
+            COALESCE(SUM(claimed_at IS NOT NULL), 0) AS claimed,
+            MIN(CASE WHEN claimed_at IS NULL THEN scheduled_time END) AS oldest
+        FROM pending_deletions
+    ''', (now, now))
+    backlog = cursor.fetchone()
+    for state in ('waiting', 'due', 'claimed'):
+        telemetry.set_gauge('alfred_pending_deletions', backlog[state], state=state)
+    overdue = now - backlog['oldest'] if backlog['oldest'] is not None else 0
+    telemetry.set_gauge('alfred_pending_deletions_overdue_seconds', max(overdue, 0))
+
+    sources = [({'process': 'web'}, telemetry.snapshot())]
+    daemon = telemetry.read_snapshot()
+    if daemon is not None:
+        age = round(time.time() - daemon['written'], 3)
+        sources.append(({'process': 'daemon'}, dict(daemon['metrics'], alfred_metrics_snapshot_age_seconds=[[{}, age]])))
+    return Response(telemetry.render(sources), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/dashboard')
+@cached_by_data_version
 def get_dashboard_data():
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     
-    try:
-        # Get total symlinks and unique targets
-        execute_with_retry(cursor, 'SELECT COUNT(*) as count FROM symlinks')
-        total_symlinks = cursor.fetchone()['count']
-        
-        execute_with_retry(cursor, 'SELECT COUNT(DISTINCT target) as count FROM symlinks')
-        unique_targets = cursor.fetchone()['count']
-        
-        # Get last scan time and interval
-        execute_with_retry(cursor, 'SELECT last_scan_time, scan_interval FROM scan_times ORDER BY id DESC LIMIT 1')
-        scan_row = cursor.fetchone()
-        last_scan_time = scan_row['last_scan_time'] if scan_row else None
-        scan_interval = scan_row['scan_interval'] if scan_row else None
-        
-        # Calculate next scan time
-        next_scan_time = None
-        if last_scan_time and scan_interval:
-            next_scan_time = last_scan_time + (scan_interval * 60)  # Convert minutes to seconds
-        
-        # Get total deletions
-        execute_with_retry(cursor, 'SELECT COUNT(*) as count FROM deletions')
-        total_deletions = cursor.fetchone()['count']
-        
-        # Get scan statistics from the last scan
-        files_checked = 0
-        files_deleted = 0
-        folders_deleted = 0
-        
-        if last_scan_time:
-            execute_with_retry(cursor, '''
-                SELECT files_checked, files_deleted, folders_deleted 
-                FROM scan_statistics 
-                WHERE scan_time = ?
-            ''', (last_scan_time,))
-            stats_row = cursor.fetchone()
-            if stats_row:
-                files_checked = stats_row['files_checked']
-                files_deleted = stats_row['files_deleted']
-                folders_deleted = stats_row['folders_deleted']
-        
-        return jsonify({
-            'total_symlinks': total_symlinks,
-            'unique_targets': unique_targets,
-            'last_scan': last_scan_time,
-            'next_scan': next_scan_time,
-            'total_deletions': total_deletions,
-            'scan_results': {
-                'files_checked': files_checked,
-                'files_deleted': files_deleted,
-                'folders_deleted': folders_deleted,
-                'scan_interval': scan_interval
-            }
-        })
-    finally:
-        conn.close()
+    # Totals are maintained by the write paths
+    counters = read_counters(cursor)
+
+    # Get last scan time and interval
+    execute_with_retry(cursor, 'SELECT last_scan_time, scan_interval FROM scan_times ORDER BY id DESC LIMIT 1')
+    scan_row = cursor.fetchone()
+    last_scan_time = scan_row['last_scan_time'] if scan_row else None
+    scan_interval = scan_row['scan_interval'] if scan_row else None
 
-class StringIOHandler(logging.Handler):
-    def __init__(self):
-        super().__init__()
-        self.stream = StringIO()
+    # Calculate next scan time
+    next_scan_time = None
+    if last_scan_time and scan_interval:
+        next_scan_time = last_scan_time + (scan_interval * 60)  # Convert minutes to seconds
 
-    def emit(self, record):
-        msg = self.format(record)
-        self.stream.write(msg + '\n')
-        self.stream.flush()
+    # Get scan statistics from the last scan
+    files_checked = 0
+    files_deleted = 0
+    folders_deleted = 0
+    performance = {'last': None, 'history': []}
+
+    if last_scan_time:
+        execute_with_retry(cursor, '''
+            SELECT files_checked, files_deleted, folders_deleted 
+            FROM scan_statistics 
+            WHERE scan_time = ?
+        ''', (last_scan_time,))
+        stats_row = cursor.fetchone()
+        if stats_row:
+            files_checked = stats_row['files_checked']
+            files_deleted = stats_row['files_deleted']
+            folders_deleted = stats_row['folders_deleted']
+        performance = scan_performance(cursor)
+
+    return jsonify({
+        'total_symlinks': counters['total_symlinks'],
+        'unique_targets': counters['unique_targets'],
+        'last_scan': last_scan_time,
+        'next_scan': next_scan_time,
+        'total_deletions': counters['total_deletions'],
+        'scan_results': {
+            'files_checked': files_checked,
+            'files_deleted': files_deleted,
+            'folders_deleted': folders_deleted,
+            'scan_interval': scan_interval
+        },
+        'scan_performance': performance
+    })
 
 class ScanStatusLogFilter(logging.Filter):
     def filter(self, record):
@@ -176,144 +286,343 @@ class ScanStatusLogFilter(logging.Filter):
 log = logging.getLogger('werkzeug')
 log.addFilter(ScanStatusLogFilter())
 
-@app.route('/api/scan-status')
-def get_scan_status():
-    with scan_status_lock:
-        return jsonify(scan_status)
+def format_event(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
 
-@app.route('/api/scan', methods=['POST'])
-def run_scan():
-    data = request.get_json()
-    dry_run = data.get('dry_run', False)
-    no_confirm = data.get('no_confirm', False)
-    
-    def generate():
-        # Set scan status to running
-        with scan_status_lock:
-            scan_status['running'] = True
-            scan_status['last_started'] = int(time.time())
-            scan_status['last_type'] = 'manual'
-        output = StringIO()
-        handler_id = None
-        
-        try:
-            # Add string IO handler to logger
-            handler_id = logger.add(output, format="{message}", catch=False)
-            
-            # Log initial state
-            logger.info("Starting scan...")
-            yield "Starting scan...\n"
-            
-            # Verify environment variables
-            symlink_directories = os.getenv('SYMLINK_DIR', '').split(',')
-            torrents_directories = os.getenv('TORRENTS_DIR', '').split(',')
-            scan_interval = int(os.getenv('SCAN_INTERVAL', '720'))  # Default to 12 hours
-            
-            if not symlink_directories[0] or not torrents_directories[0]:
-                error_msg = "Error: SYMLINK_DIR or TORRENTS_DIR environment variables are not set properly\n"
-                logger.error(error_msg)
-                yield error_msg
-                return
-                
-            # Log directories being scanned
-            logger.info(f"Scanning symlink directories: {', '.join(symlink_directories)}")
-            logger.info(f"Scanning torrent directories: {', '.join(torrents_directories)}")
-            yield f"Scanning symlink directories: {', '.join(symlink_directories)}\n"
-            yield f"Scanning torrent directories: {', '.join(torrents_directories)}\n"
-            
-            # Import and run the find_non_linked_files function
-            sys.path.append('..')
-            try:
-                from alfred import find_non_linked_files
-            except ImportError as e:
-                error_msg = f"Error importing alfred module: {str(e)}\n"
-                logger.error(error_msg)
-                yield error_msg
-                return
-            
-            # Run the scan
+class EventBroadcaster:
+    """Fan out changes to every /api/events subscriber from a single thread.
+
+    The thread checks data_version and the newest events row (two primary-key
+    lookups) twice a second and only reads the events table or recounts when
+    one of them moved. It also rechecks the watched directories, so browsers
+    no longer poll /api/directories. It stops while nobody is subscribed.
+    """
+
+    def __init__(self, interval=0.5, directory_interval=30):
+        self.interval = interval
+        self.directory_interval = directory_interval
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=1000)
+        with self.lock:
+            self.subscribers.add(subscriber)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='event-broadcaster', daemon=True)
+                self.thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def is_subscribed(self, subscriber):
+        with self.lock:
+            return subscriber in self.subscribers
+
+    def publish(self, event_type, data):
+        message = format_event(event_type, data)
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
             try:
-                find_non_linked_files(
-                    torrents_directories,
-                    symlink_directories,
-                    dry_run=dry_run,
-                    no_confirm=no_confirm
-                )
-            except Exception as e:
-                error_msg = f"Error during find_non_linked_files: {str(e)}\n"
-                logger.error(error_msg)
-                logger.error(traceback.format_exc())
-                yield error_msg
-                return
-            
-            # Update last scan time and interval
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # Drop clients that stopped reading; EventSource reconnects and reloads
+                self.unsubscribe(subscriber)
+
+    def run(self):
+        last_version = None
+        last_event_id = None
+        directories = None
+        next_directory_check = 0
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    return
             try:
-                with get_db_connection() as conn:
+                with read_pool.connection() as conn:
                     cursor = conn.cursor()
-                    # Get current scan interval from settings
-                    with open('/app/data/.env', 'r') as f:
-                        for line in f:
-                            if line.startswith('SCAN_INTERVAL='):
-                                scan_interval = int(line.split('=')[1].strip())
-                                break
-                    cursor.execute('INSERT INTO scan_times (last_scan_time, scan_interval) VALUES (?, ?)', 
-                                 (int(time.time()), scan_interval))
-                    conn.commit()
+                    execute_with_retry(cursor, '''
+                        SELECT (SELECT value FROM counters WHERE name = 'data_version'),
+                               (SELECT MAX(id) FROM events)
+                    ''')
+                    version, event_id = cursor.fetchone()
+                    version, event_id = version or 0, event_id or 0
+                    # Subscribers load the current state themselves; only newer changes are pushed
+                    if last_event_id is None:
+                        last_version, last_event_id = version, event_id
+                    if event_id != last_event_id:
+                        execute_with_retry(cursor, 'SELECT id, type, data FROM events WHERE id > ? ORDER BY id', (last_event_id,))
+                        for row in cursor.fetchall():
+                            self.publish(row['type'], json.loads(row['data']))
+                            last_event_id = row['id']
+                    if version != last_version:
+                        last_version = version
+                        self.publish('counters', dict(read_counters(cursor), data_version=version))
+                if time.time() >= next_directory_check:
+                    next_directory_check = time.time() + self.directory_interval
+                    status = directory_status()
+                    if status != directories:
+                        directories = status
+                        self.publish('directories', status)
             except Exception as e:
-                error_msg = f"Error updating scan time in database: {str(e)}\n"
-                logger.error(error_msg)
-                yield error_msg
-                return
-            
-            # Get the captured output
-            scan_output = output.getvalue()
-            if scan_output:
-                yield scan_output
-            
-            yield "Scan completed successfully.\n"
-            
-        except Exception as e:
-            error_msg = f"Unexpected error during scan: {str(e)}\nTraceback:\n{traceback.format_exc()}\n"
-            logger.error(error_msg)
-            yield error_msg
+                logger.error(f"Error polling for events: {e}")
+            time.sleep(self.interval)
+
+broadcaster = EventBroadcaster()
+
+@app.route('/api/events')
+def stream_events():
+    subscriber = broadcaster.subscribe()
+    status = current_scan_status(get_read_connection().cursor())
+
+    def generate():
+        try:
+            # Start with the current scan state so the indicator is right straight away
+            yield format_event('scan', status)
+            while True:
+                try:
+                    yield subscriber.get(timeout=15)
+                except queue.Empty:
+                    if not broadcaster.is_subscribed(subscriber):
+                        return
+                    # Comment line keeps proxies from closing the idle stream
+                    yield ': keepalive\n\n'
         finally:
-            # Set scan status to not running
-            with scan_status_lock:
-                scan_status['running'] = False
-                scan_status['last_finished'] = int(time.time())
-            # Remove the handler if it was added
-            try:
-                if handler_id is not None:
-                    logger.remove(handler_id)
-            except ValueError:
-                pass  # Handler was already removed or invalid
-    
+            broadcaster.unsubscribe(subscriber)
+
     return Response(
         generate(),
-        mimetype='text/plain',
+        mimetype='text/event-stream',
         headers={
             'Cache-Control': 'no-cache',
             'X-Accel-Buffering': 'no'  # Disable response buffering
         }
     )
 
+def current_scan_status(cursor):
+    """Scan indicator state, derived from the scan_jobs table"""
+    execute_with_retry(cursor, f'''
+        SELECT {", ".join(SCAN_JOB_COLUMNS)} FROM scan_jobs
+        WHERE status IN ('queued', 'running')
+        ORDER BY status = 'running' DESC, id
+    ''')
+    active = scan_job_rows(cursor)
+    execute_with_retry(cursor, f'''
+        SELECT {", ".join(SCAN_JOB_COLUMNS)} FROM scan_jobs
+        WHERE started_at IS NOT NULL
+        ORDER BY id DESC LIMIT 1
+    ''')
+    last = scan_job_rows(cursor)
+    last = last[0] if last else None
+    # Published by the scan itself, so it also covers the startup scan, which isn't a job
+    execute_with_retry(cursor, 'SELECT data, updated_at FROM scan_progress WHERE id = 1')
+    row = cursor.fetchone()
+    # An unfinished scan the next one resumes, after a restart, cancel or time slice
+    execute_with_retry(cursor, 'SELECT phase, started_at, updated_at, runs FROM scan_checkpoint WHERE id = 1')
+    checkpoint = cursor.fetchone()
+    return {
+        'running': bool(active) and active[0]['status'] == 'running',
+        'last_started': last['started_at'] if last else None,
+        'last_finished': last['finished_at'] if last else None,
+        'last_type': last['requested_by'] if last else None,
+        'job': active[0] if active else None,
+        'queued': sum(1 for job in active if job['status'] == 'queued'),
+        'progress': dict(json.loads(row[0]), updated_at=row[1]) if row else None,
+        'checkpoint': dict(zip(('phase', 'started_at', 'updated_at', 'runs'), checkpoint)) if checkpoint else None,
+    }
+
+@app.route('/api/scan-status')
+def get_scan_status():
+    return jsonify(current_scan_status(get_read_connection().cursor()))
+
+@app.route('/api/scan', methods=['POST'])
+def run_scan():
+    """Queue a scan for the alfred daemon and return the job straight away"""
+    data = request.get_json(silent=True) or {}
+    dry_run = bool(data.get('dry_run', False))
+    no_confirm = bool(data.get('no_confirm', False))
+    full_scan = bool(data.get('full_scan', False))
+    if not dry_run and not no_confirm:
+        return jsonify({'error': "Scans run in the background and can't ask for confirmation; set no_confirm or dry_run"}), 400
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        job, created = enqueue_scan_job(cursor, 'manual', dry_run=dry_run, full_scan=full_scan)
+        bump_data_version(cursor)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return jsonify({'error': f'Error queueing scan: {str(e)}'}), 500
+    return jsonify({'job': job, 'created': created}), 202
+
+@app.route('/api/scan-jobs')
+def list_scan_jobs():
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    cursor = get_read_connection().cursor()
+    execute_with_retry(cursor, f'SELECT {", ".join(SCAN_JOB_COLUMNS)} FROM scan_jobs ORDER BY id DESC LIMIT ?', (limit,))
+    return jsonify({'jobs': scan_job_rows(cursor)})
+
+@app.route('/api/scan-jobs/<int:job_id>')
+def get_scan_job_status(job_id):
+    job = get_scan_job(get_read_connection().cursor(), job_id)
+    if job is None:
+        return jsonify({'error': 'Scan job not found'}), 404
+    return jsonify({'job': job})
+
+@app.route('/api/scan-jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_scan(job_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        job = cancel_scan_job(cursor, job_id)
+        if job is None:
+            conn.rollback()
+            return jsonify({'error': 'Scan job not found'}), 404
+        bump_data_version(cursor)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return jsonify({'error': f'Error cancelling scan: {str(e)}'}), 500
+    if job['status'] not in ('cancelled', 'running'):
+        return jsonify({'error': f"Scan job already {job['status']}", 'job': job}), 409
+    return jsonify({'job': job})
+
+SYMLINK_FIELDS = ['id', 'symlink', 'target', 'ref_count']
+# Keyset columns for each sort order; trailing columns break ties so every row has a unique position
+SYMLINK_SORT_KEYS = {
+    'symlink': ['symlink'],
+    'target': ['target', 'id'],
+    'ref_count': ['ref_count', 'target_id', 'id'],
+}
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def symlink_filters(args):
+    """Build the WHERE clauses for the symlink list filters"""
+    clauses = []
+    params = []
+    search = args.get('search')
+    if search:
+        pattern = f"%{escape_like(search)}%"
+        clauses.append("(symlink LIKE ? ESCAPE '\\' OR target LIKE ? ESCAPE '\\')")
+        params += [pattern, pattern]
+    for column in ('symlink', 'target'):
+        prefix = args.get(f'{column}_prefix')
+        if prefix:
+            # A range on the raw value lets SQLite use the unique index
+            clauses.append(f'{column} >= ? AND {column} < ?')
+            params += [prefix, prefix + '\U0010ffff']
+        contains = args.get(f'{column}_contains')
+        if contains:
+            clauses.append(f"{column} LIKE ? ESCAPE '\\'")
+            params.append(f"%{escape_like(contains)}%")
+    return clauses, params
+
 @app.route('/api/symlinks')
+@cached_by_data_version
 def get_symlinks():
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM symlinks')
-    symlinks = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(symlinks)
+
+    if not request.args:
+        # Unpaginated listing kept for existing API clients
+        execute_with_retry(cursor, 'SELECT id, symlink, target, ref_count FROM symlink_targets')
+        return jsonify([dict(row) for row in cursor.fetchall()])
+
+    limit = request.args.get('limit', default=50, type=int)
+    sort = request.args.get('sort', 'symlink')
+    order = request.args.get('order', 'asc').lower()
+    fields = [field.strip() for field in request.args.get('fields', ','.join(SYMLINK_FIELDS)).split(',') if field.strip()]
+
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+    if sort not in SYMLINK_SORT_KEYS:
+        return jsonify({'error': f"sort must be one of: {', '.join(SYMLINK_SORT_KEYS)}"}), 400
+    if order not in ['asc', 'desc']:
+        return jsonify({'error': "order must be either 'asc' or 'desc'"}), 400
+    if not fields or any(field not in SYMLINK_FIELDS for field in fields):
+        return jsonify({'error': f"fields must be a comma separated list of: {', '.join(SYMLINK_FIELDS)}"}), 400
+
+    keys = SYMLINK_SORT_KEYS[sort]
+    clauses, params = symlink_filters(request.args)
+    page_clauses = list(clauses)
+    page_params = list(params)
+
+    page_cursor = request.args.get('cursor')
+    if page_cursor:
+        try:
+            after = decode_cursor(page_cursor)
+            if not isinstance(after, list) or len(after) != len(keys):
+                raise ValueError('cursor does not match the sort order')
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        comparison = '>' if order == 'asc' else '<'
+        page_clauses.append(f"({', '.join(keys)}) {comparison} ({', '.join('?' * len(keys))})")
+        page_params += after
+
+    # Sort keys are always selected so the next cursor can be built from the last row
+    columns = list(dict.fromkeys(fields + keys))
+    where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ''
+    direction = 'ASC' if order == 'asc' else 'DESC'
+    execute_with_retry(cursor, f'''
+        SELECT {', '.join(columns)}
+        FROM symlink_targets
+        {where}
+        ORDER BY {', '.join(f'{key} {direction}' for key in keys)}
+        LIMIT ?
+    ''', page_params + [limit + 1])
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][key] for key in keys])
+
+    result = {
+        'items': [{field: row[field] for field in fields} for row in rows],
+        'next_cursor': next_cursor,
+    }
+
+    # Totals only change with the filters, so they are computed once for the first page
+    if not page_cursor and not clauses:
+        counters = read_counters(cursor)
+        result['total'] = counters['total_symlinks']
+        result['unique_targets'] = counters['unique_targets']
+    elif not page_cursor:
+        where = f"WHERE {' AND '.join(clauses)}"
+        execute_with_retry(cursor, f'''
+            SELECT COUNT(*) AS total, COUNT(DISTINCT target_id) AS unique_targets
+            FROM symlink_targets
+            {where}
+        ''', params)
+        totals = cursor.fetchone()
+        result['total'] = totals['total']
+        result['unique_targets'] = totals['unique_targets']
+
+    return jsonify(result)
 
 @app.route('/api/symlinks/<path:symlink>')
 def get_symlink(symlink):
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     try:
         # Normalize the symlink path to ensure consistent comparison
         normalized_symlink = os.path.normpath(symlink)
-        execute_with_retry(cursor, 'SELECT * FROM symlinks WHERE symlink = ?', (normalized_symlink,))
+        execute_with_retry(cursor, 'SELECT id, symlink, target, ref_count FROM symlink_targets WHERE symlink = ?', (normalized_symlink,))
         result = cursor.fetchone()
         if not result:
             return jsonify({'error': 'Symlink not found'}), 404
@@ -324,23 +633,28 @@ def get_symlink(symlink):
     except Exception as e:
         logger.error(f"Unexpected error fetching symlink {symlink}: {str(e)}")
         return jsonify({'error': 'An unexpected error occurred'}), 500
-    finally:
-        conn.close()
 
 @app.route('/api/symlinks/<path:symlink>', methods=['DELETE'])
 def delete_symlink(symlink):
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        execute_with_retry(cursor, 'SELECT target, ref_count FROM symlinks WHERE symlink = ?', (symlink,))
+        execute_with_retry(cursor, 'SELECT target_id, target, ref_count FROM symlink_targets WHERE symlink = ?', (symlink,))
         result = cursor.fetchone()
         if not result:
             return jsonify({'error': 'Symlink not found'}), 404
 
-        target, ref_count = result['target'], result['ref_count']
+        target_id, target, ref_count = result['target_id'], result['target'], result['ref_count']
         deletion_reason = 'manual_deletion'
 
         execute_with_retry(cursor, 'DELETE FROM symlinks WHERE symlink = ?', (symlink,))
+        adjust_counter(cursor, 'total_symlinks', -1)
+
+        if ref_count > 1:
+            execute_with_retry(cursor, 'UPDATE targets SET ref_count = ref_count - 1 WHERE id = ?', (target_id,))
+        else:
+            execute_with_retry(cursor, 'DELETE FROM targets WHERE id = ?', (target_id,))
+            adjust_counter(cursor, 'unique_targets', -1)
 
         if ref_count == 1:
             # Instead of deleting immediately, schedule for deletion
@@ -355,8 +669,15 @@ def delete_symlink(symlink):
             INSERT INTO deletions (symlink, target, timestamp, reason)
             VALUES (?, ?, ?, ?)
         ''', (symlink, target, int(time.time()), deletion_reason))
+        adjust_counter(cursor, 'total_deletions', 1)
 
+        record_event(cursor, 'symlinks', {'added': [], 'removed': [{'symlink': symlink, 'target': target}]})
+        record_event(cursor, 'deletion', {'symlink': symlink, 'target': target, 'timestamp': int(time.time()), 'reason': deletion_reason})
+        bump_data_version(cursor)
         conn.commit()
+        telemetry.inc('alfred_ref_count_changes_total', direction='decrement')
+        if ref_count == 1:
+            telemetry.inc('alfred_deletions_scheduled_total')
         return jsonify({
             'message': 'Symlink deleted successfully',
             'details': {
@@ -369,144 +690,80 @@ def delete_symlink(symlink):
     except Exception as e:
         conn.rollback()
         return jsonify({'error': f'Error during deletion: {str(e)}'}), 500
-    finally:
-        conn.close()
 
 def init_db():
-    with sqlite3.connect(DB_PATH, timeout=30) as conn:
-        # Enable WAL mode
-        conn.execute('PRAGMA journal_mode=WAL')
-        conn.execute('PRAGMA synchronous=NORMAL')
-        conn.execute('PRAGMA busy_timeout=30000')
-        
+    with write_pool.connection() as conn:
         cursor = conn.cursor()
         
-        # Create metrics history table
-        execute_with_retry(cursor, '''
-        CREATE TABLE IF NOT EXISTS metrics_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            total_symlinks INTEGER,
-            unique_targets INTEGER,
-            total_deletions INTEGER
-        )
-        ''')
-        
-        # Check if deletions table exists and has reason column
+        # Deletions tables from before the reason column are replaced
         execute_with_retry(cursor, "PRAGMA table_info(deletions)")
         columns = cursor.fetchall()
-        has_reason = any(col[1] == 'reason' for col in columns)
-        
-        if not has_reason:
-            # Drop the old table if it exists
+        if columns and not any(col[1] == 'reason' for col in columns):
             execute_with_retry(cursor, "DROP TABLE IF EXISTS deletions")
-            # Create new table with reason column
-            execute_with_retry(cursor, '''
-            CREATE TABLE IF NOT EXISTS deletions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                symlink TEXT NOT NULL,
-                target TEXT NOT NULL,
-                timestamp INTEGER NOT NULL,
-                reason TEXT
-            )
-            ''')
-        else:
-            # Just create the table if it doesn't exist
-            execute_with_retry(cursor, '''
-            CREATE TABLE IF NOT EXISTS deletions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                symlink TEXT NOT NULL,
-                target TEXT NOT NULL,
-                timestamp INTEGER NOT NULL,
-                reason TEXT
-            )
-            ''')
-        
-        execute_with_retry(cursor, '''
-        CREATE TABLE IF NOT EXISTS pending_deletions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            target TEXT NOT NULL,
-            scheduled_time INTEGER NOT NULL
-        )
-        ''')
         
+        # Same tables as alfred.py creates, so either can start first
+        create_schema(cursor)
         conn.commit()
 
-def record_metrics():
-    """Record current metrics to the history table"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        # Get current stats
-        execute_with_retry(cursor, 'SELECT COUNT(*) as total, COUNT(DISTINCT target) as unique_targets FROM symlinks')
-        total, unique = cursor.fetchone()
-        
-        # Get total deletions
-        execute_with_retry(cursor, 'SELECT COUNT(*) FROM deletions')
-        deletions = cursor.fetchone()[0]
-        
-        # Record metrics
-        execute_with_retry(cursor, '''
-        INSERT INTO metrics_history (total_symlinks, unique_targets, total_deletions)
-        VALUES (?, ?, ?)
-        ''', (total, unique, deletions))
-        conn.commit()
-    finally:
-        conn.close()
+METRIC_COLUMNS = ['total_symlinks', 'unique_targets', 'total_deletions']
 
 @app.route('/api/metrics')
 def get_metrics():
     metric = request.args.get('metric', 'total_symlinks')
     time_range = request.args.get('range', 'daily')
+    if metric not in METRIC_COLUMNS:
+        return jsonify({'error': f'Unknown metric: {metric}'}), 400
     
-    # Calculate date ranges
-    now = datetime.now()
+    # Samples are bucketed in UTC, the same as metrics_history timestamps
+    now = datetime.utcnow()
     if time_range == 'daily':
         start_date = now - timedelta(days=30)  # Last 30 days
-        group_by = '%Y-%m-%d'
-        interval = 'day'
+        query = '''
+        SELECT bucket as label, max_value as value
+        FROM metrics_rollup
+        WHERE granularity = 'day' AND metric = ? AND bucket >= ?
+        ORDER BY bucket ASC
+        '''
+        start_bucket = start_date.strftime('%Y-%m-%d')
     elif time_range == 'weekly':
         start_date = now - timedelta(weeks=12)  # Last 12 weeks
-        group_by = '%Y-%W'
-        interval = 'week'
+        # At most ~84 daily rows are folded into weeks
+        query = '''
+        SELECT strftime('%Y-%W', bucket) as label, MAX(max_value) as value
+        FROM metrics_rollup
+        WHERE granularity = 'day' AND metric = ? AND bucket >= ?
+        GROUP BY label
+        ORDER BY label ASC
+        '''
+        start_bucket = start_date.strftime('%Y-%m-%d')
     else:  # monthly
         start_date = now - timedelta(days=365)  # Last 12 months
-        group_by = '%Y-%m'
-        interval = 'month'
-
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        
-        # Get the metrics data grouped by the specified interval
-        query = f'''
-        SELECT 
-            strftime('{group_by}', timestamp) as label,
-            MAX({metric}) as value
-        FROM metrics_history
-        WHERE timestamp >= ?
-        GROUP BY strftime('{group_by}', timestamp)
-        ORDER BY label ASC
+        query = '''
+        SELECT bucket as label, max_value as value
+        FROM metrics_rollup
+        WHERE granularity = 'month' AND metric = ? AND bucket >= ?
+        ORDER BY bucket ASC
         '''
-        
-        cur.execute(query, (start_date.strftime('%Y-%m-%d %H:%M:%S'),))
-        rows = cur.fetchall()
-        
-        # Format the data for the chart
-        labels = []
-        values = []
-        for row in rows:
-            labels.append(row['label'])
-            values.append(row['value'])
+        start_bucket = start_date.strftime('%Y-%m')
+
+    cur = get_read_connection().cursor()
+    cur.execute(query, (metric, start_bucket))
+    rows = cur.fetchall()
+    
+    # Format the data for the chart
+    labels = []
+    values = []
+    for row in rows:
+        labels.append(row['label'])
+        values.append(row['value'])
 
     return jsonify({
         'labels': labels,
         'values': values
     })
 
-@app.route('/api/directories')
-def get_directories():
+def directory_status():
+    """Up/down status of the configured symlink and torrent directories"""
     symlink_dirs = os.getenv('SYMLINK_DIR', '').split(',')
     torrent_dirs = os.getenv('TORRENTS_DIR', '').split(',')
     
@@ -524,15 +781,22 @@ def get_directories():
     symlink_status = [check_directory_status(dir.strip()) for dir in symlink_dirs if dir.strip()]
     torrent_status = [check_directory_status(dir.strip()) for dir in torrent_dirs if dir.strip()]
     
-    return jsonify({
+    return {
         'symlink_directories': symlink_status,
         'torrent_directories': torrent_status
-    })
+    }
+
+@app.route('/api/directories')
+def get_directories():
+    response = jsonify(directory_status())
+    # Directory status comes from the filesystem, so the ETag is a hash of the body
+    return conditional_response(response, hashlib.sha1(response.get_data()).hexdigest())
 
 @app.route('/api/deletions')
+@cached_by_data_version
 def get_deletions():
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor()
         
         # Get optional limit parameter, default to 100
@@ -554,137 +818,389 @@ def get_deletions():
         
     except Exception as e:
         return jsonify({'error': f'Error fetching deletions: {str(e)}'}), 500
-    finally:
-        conn.close()
+
+BACKUP_FORMAT_VERSION = 1
+BACKUP_CHUNK_SIZE = 64 * 1024  # Bytes buffered before each write to the client
+BACKUP_FETCH_SIZE = 1000  # Rows fetched from SQLite per round trip
+BACKUP_COMPRESSION = {
+    # name: (file suffix, content type)
+    'none': ('', 'application/x-ndjson'),
+    'gzip': ('.gz', 'application/gzip'),
+    'zstd': ('.zst', 'application/zstd'),
+}
+
+def backup_records(cursor):
+    """Yield every backup record; the caller holds a read transaction so all tables match"""
+    counters = read_counters(cursor)
+    yield {
+        'type': 'header',
+        'version': BACKUP_FORMAT_VERSION,
+        'created': int(time.time()),
+        'symlinks': counters['total_symlinks'],
+        'targets': counters['unique_targets'],
+    }
+    queries = [
+        ('target', 'SELECT path, ref_count FROM targets ORDER BY id'),
+        ('symlink', 'SELECT symlink, target, ref_count FROM symlink_targets'),
+        ('pending_deletion', 'SELECT target, scheduled_time FROM pending_deletions ORDER BY id'),
+    ]
+    for record_type, query in queries:
+        execute_with_retry(cursor, query)
+        while True:
+            rows = cursor.fetchmany(BACKUP_FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                record = {'type': record_type}
+                record.update(dict(row))
+                yield record
+
+def compressor_for(compression):
+    """Streaming compressor with compress()/flush(), or None for plain output"""
+    if compression == 'gzip':
+        return zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor().compressobj()
+    return None
 
 @app.route('/api/backup-symlinks')
 def backup_symlinks():
+    """Stream the database as NDJSON: a header line, then target, symlink and pending_deletion records"""
+    compression = request.args.get('compress', 'none')
+    if compression not in BACKUP_COMPRESSION:
+        return jsonify({'error': f"compress must be one of: {', '.join(BACKUP_COMPRESSION)}"}), 400
+    if compression == 'zstd' and zstandard is None:
+        return jsonify({'error': 'zstd compression requires the zstandard package'}), 400
+
+    def generate():
+        compressor = compressor_for(compression)
+        buffer = []
+        buffered = 0
+        try:
+            # Taken here rather than from flask.g, which is gone before the body
+            # is generated, and only once iteration starts so a response that is
+            # never sent holds no connection
+            with read_pool.connection() as conn:
+                cursor = conn.cursor()
+                # One read transaction gives a consistent snapshot while the daemon keeps writing
+                execute_with_retry(cursor, 'BEGIN')
+                for record in backup_records(cursor):
+                    line = json.dumps(record, separators=(',', ':')) + '\n'
+                    buffer.append(line)
+                    buffered += len(line)
+                    if buffered >= BACKUP_CHUNK_SIZE:
+                        chunk = ''.join(buffer).encode('utf-8')
+                        buffer = []
+                        buffered = 0
+                        if compressor is not None:
+                            chunk = compressor.compress(chunk)
+                        if chunk:
+                            yield chunk
+                chunk = ''.join(buffer).encode('utf-8')
+                if compressor is not None:
+                    chunk = compressor.compress(chunk) + compressor.flush()
+                if chunk:
+                    yield chunk
+        except Exception as e:
+            # Headers are already sent, so all we can do is cut the download short
+            logger.error(f"Error streaming backup: {e}")
+            raise
+
+    suffix, content_type = BACKUP_COMPRESSION[compression]
+    return Response(
+        generate(),
+        mimetype=content_type,
+        headers={
+            'Content-Disposition': f'attachment; filename=symlinks_backup_{int(time.time())}.ndjson{suffix}',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Disable response buffering
+        }
+    )
+
+def open_backup(stream, head):
+    """Binary reader over the uncompressed backup, detecting gzip/zstd from the first bytes"""
+    if head[:2] == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if head[:4] == b'\x28\xb5\x2f\xfd':
+        if zstandard is None:
+            raise ValueError('zstd backups require the zstandard package')
+        return zstandard.ZstdDecompressor().stream_reader(stream)
+    return stream
+
+def read_text_chunks(reader):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        data = reader.read(RESTORE_READ_SIZE)
+        text = decoder.decode(data, final=not data)
+        if text:
+            yield text
+        if not data:
+            return
+
+def json_cut_short(error):
+    """Whether a JSONDecodeError only means the text stopped early, not that it is invalid"""
+    rest = error.doc[error.pos:]
+    return (
+        not rest.strip()
+        or error.msg.startswith('Unterminated string')
+        or (error.msg.startswith('Invalid \\uXXXX escape') and len(rest) < 6)
+        or not rest.strip('0123456789.eE+-')  # A number cut short
+        or any(literal.startswith(rest) for literal in ('true', 'false', 'null'))
+    )
+
+def iter_json_array(buffer, chunks):
+    """Entries of a JSON array, decoded one at a time as the text arrives"""
+    decoder = json.JSONDecoder()
+    position = 0
+    consumed = 0  # Characters dropped from the front of buffer, for error offsets
+    while True:
+        # Skip the separators between entries
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position < len(buffer):
+            if buffer[position] == ']':
+                return
+            try:
+                entry, position = decoder.raw_decode(buffer, position)
+                yield entry
+                continue
+            except json.JSONDecodeError as e:
+                if not json_cut_short(e):
+                    raise ValueError(f'Invalid JSON at character {consumed + e.pos}: {e.msg}')
+                # Entry is split across chunks, read more
+                if len(buffer) - position > RESTORE_MAX_ENTRY_SIZE:
+                    raise ValueError(f'Backup entry at character {consumed + position} is larger than {RESTORE_MAX_ENTRY_SIZE} characters')
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError('Backup file ends in the middle of the JSON array')
+        consumed += position
+        buffer = buffer[position:] + chunk
+        position = 0
+
+def iter_ndjson(buffer, chunks):
+    """Symlink records of an NDJSON backup, one line at a time"""
+    line_number = 0
+
+    def parse(line):
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            raise ValueError(f'Invalid JSON on line {line_number}')
+
+    while True:
+        chunk = next(chunks, None)
+        if chunk is not None:
+            buffer += chunk
+        lines = buffer.split('\n')
+        # Keep the trailing partial line until the rest of it arrives
+        buffer = lines.pop() if chunk is not None else ''
+        for line in lines:
+            line_number += 1
+            if not line.strip():
+                continue
+            record = parse(line)
+            record_type = record.get('type')
+            if record_type == 'header' and record.get('version', 0) > BACKUP_FORMAT_VERSION:
+                raise ValueError(f"Backup format version {record['version']} is newer than this version of Alfred")
+            # Targets are rebuilt from the symlinks, and pending deletions are
+            # not replayed so a restore never schedules files for removal
+            if record_type == 'symlink':
+                yield record
+        if chunk is None:
+            return
+
+def iter_backup_entries(reader):
+    """Symlink entries from NDJSON or the older JSON array format, without reading the whole file"""
+    chunks = read_text_chunks(reader)
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        if buffer.strip():
+            break
+    buffer = buffer.lstrip()
+    if buffer.startswith('['):
+        return iter_json_array(buffer[1:], chunks)
+    return iter_ndjson(buffer, chunks)
+
+def restore_symlink_entry(entry):
+    """Filesystem half of a restore, run on the worker pool. Returns (path, target, error);
+    an error of None means the symlink is in place and should be tracked"""
+    if not isinstance(entry, dict) or not isinstance(entry.get('symlink'), str) or not isinstance(entry.get('target'), str):
+        return None, None, f"Invalid symlink entry: {str(entry)[:200]}"
+
+    symlink_path = entry['symlink']
+    target_path = entry['target']
+
+    # Skip if target doesn't exist
+    if not os.path.exists(target_path):
+        return symlink_path, target_path, f"Target not found: {target_path}"
+
+    # Skip if symlink already exists
+    if os.path.lexists(symlink_path):
+        if not os.path.islink(symlink_path):
+            return symlink_path, target_path, f"Path exists and is not a symlink: {symlink_path}"
+        if os.readlink(symlink_path) != target_path:
+            return symlink_path, target_path, f"Symlink exists but points to different target: {symlink_path}"
+        # Already on disk, just make sure the database knows about it
+        return symlink_path, target_path, None
+
+    # Create parent directory if it doesn't exist
+    symlink_dir = os.path.dirname(symlink_path)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get all symlinks from the database
-        execute_with_retry(cursor, 'SELECT symlink, target, ref_count FROM symlinks')
-        symlinks = [dict(row) for row in cursor.fetchall()]
-        
-        # Create a JSON response with the symlinks data
-        response = jsonify(symlinks)
-        
-        # Set headers for file download
-        response.headers['Content-Disposition'] = f'attachment; filename=symlinks_backup_{int(time.time())}.json'
-        response.headers['Content-Type'] = 'application/json'
-        
-        return response
-        
+        os.makedirs(symlink_dir, exist_ok=True)
     except Exception as e:
-        return jsonify({'error': f'Error creating backup: {str(e)}'}), 500
-    finally:
-        conn.close()
+        return symlink_path, target_path, f"Failed to create directory {symlink_dir}: {str(e)}"
+
+    # Create the symlink
+    try:
+        os.symlink(target_path, symlink_path)
+    except Exception as e:
+        return symlink_path, target_path, f"Failed to create symlink {symlink_path}: {str(e)}"
+    return symlink_path, target_path, None
+
+def insert_symlink_rows(cursor, rows):
+    """Track a batch of (symlink, target) pairs, leaving ref_count matching the symlinks table.
+
+    Returns the number of symlinks and targets added, for adjust_counter.
+    """
+    targets = [(target,) for target in {target for _, target in rows}]
+    cursor.executemany('INSERT INTO targets (path, ref_count) VALUES (?, 0) ON CONFLICT(path) DO NOTHING', targets)
+    targets_added = cursor.rowcount
+    # Symlinks the daemon already picked up from the filesystem are left alone
+    cursor.executemany('''
+        INSERT OR IGNORE INTO symlinks (symlink, target_id)
+        SELECT ?, id FROM targets WHERE path = ?
+    ''', rows)
+    symlinks_added = cursor.rowcount
+    cursor.executemany('''
+        UPDATE targets SET ref_count = (SELECT COUNT(*) FROM symlinks WHERE target_id = targets.id)
+        WHERE path = ?
+    ''', targets)
+    cursor.executemany('DELETE FROM targets WHERE path = ? AND ref_count = 0', targets)
+    return symlinks_added, targets_added - cursor.rowcount
+
+def backup_identity(stream, filename):
+    """Key a restore by file name, size and a hash of the first MB, so an interrupted upload can resume"""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    head = stream.read(1024 * 1024)
+    stream.seek(0)
+    digest = hashlib.sha1(head).hexdigest()
+    return f'{filename}:{size}:{digest}', head
+
+def update_restore_status(**changes):
+    with restore_status_lock:
+        restore_status.update(changes)
+        status = dict(restore_status)
+    broadcaster.publish('restore_status', status)
+
+@app.route('/api/restore-status')
+def get_restore_status():
+    with restore_status_lock:
+        return jsonify(restore_status)
 
 @app.route('/api/restore-symlinks', methods=['POST'])
 def restore_symlinks():
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+
+    file = request.files['file']
+    if not file.filename.endswith(('.json', '.ndjson', '.gz', '.zst')):
+        return jsonify({'error': 'Invalid file type. Please upload a backup file.'}), 400
+
+    if not restore_lock.acquire(blocking=False):
+        return jsonify({'error': 'A restore is already running'}), 409
+
+    restored_count = 0
+    skipped_count = 0
+    processed = 0
+    errors = []
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-            
-        file = request.files['file']
-        if not file.filename.endswith('.json'):
-            return jsonify({'error': 'Invalid file type. Please upload a JSON file.'}), 400
-            
-        # Read and parse the JSON file
-        data = json.loads(file.read())
-        
-        if not isinstance(data, list):
-            return jsonify({'error': 'Invalid backup format'}), 400
-            
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Start a transaction
-        conn.execute('BEGIN TRANSACTION')
-        
-        restored_count = 0
-        skipped_count = 0
-        errors = []
-        
-        try:
-            # Insert restored symlinks
-            for symlink in data:
-                if not all(key in symlink for key in ['symlink', 'target', 'ref_count']):
-                    raise ValueError('Invalid symlink data format')
-                
-                symlink_path = symlink['symlink']
-                target_path = symlink['target']
-                
-                # Skip if target doesn't exist
-                if not os.path.exists(target_path):
-                    errors.append(f"Target not found: {target_path}")
-                    skipped_count += 1
-                    continue
-                
-                # Skip if symlink already exists
-                if os.path.exists(symlink_path):
-                    if os.path.islink(symlink_path):
-                        current_target = os.readlink(symlink_path)
-                        if current_target == target_path:
-                            # If symlink exists and points to the same target, just update the database
-                            execute_with_retry(cursor, '''
-                                INSERT INTO symlinks (symlink, target, ref_count)
-                                VALUES (?, ?, ?)
-                            ''', (symlink_path, target_path, symlink['ref_count']))
-                            restored_count += 1
-                            continue
-                        else:
-                            errors.append(f"Symlink exists but points to different target: {symlink_path}")
-                            skipped_count += 1
-                            continue
-                    else:
-                        errors.append(f"Path exists and is not a symlink: {symlink_path}")
-                        skipped_count += 1
-                        continue
-                
-                # Create parent directory if it doesn't exist
-                symlink_dir = os.path.dirname(symlink_path)
-                if not os.path.exists(symlink_dir):
-                    try:
-                        os.makedirs(symlink_dir, exist_ok=True)
-                    except Exception as e:
-                        errors.append(f"Failed to create directory {symlink_dir}: {str(e)}")
-                        skipped_count += 1
-                        continue
-                
-                # Create the symlink
-                try:
-                    os.symlink(target_path, symlink_path)
-                    execute_with_retry(cursor, '''
-                        INSERT INTO symlinks (symlink, target, ref_count)
-                        VALUES (?, ?, ?)
-                    ''', (symlink_path, target_path, symlink['ref_count']))
-                    restored_count += 1
-                except Exception as e:
-                    errors.append(f"Failed to create symlink {symlink_path}: {str(e)}")
-                    skipped_count += 1
+        backup_key, head = backup_identity(file.stream, file.filename)
+        # A restore can run for a long time, so it borrows a write connection
+        # per batch instead of holding one away from the other endpoints
+        with write_pool.connection() as conn:
+            cursor = conn.cursor()
+            execute_with_retry(cursor, 'SELECT entries_done, restored, skipped FROM restore_progress WHERE backup_key = ?', (backup_key,))
+            row = cursor.fetchone()
+        resumed_from = row['entries_done'] if row else 0
+        if row:
+            restored_count, skipped_count = row['restored'], row['skipped']
+            logger.info(f"Resuming restore of {file.filename} after {resumed_from} entries")
+
+        update_restore_status(
+            running=True, file=file.filename, processed=resumed_from, restored=restored_count,
+            skipped=skipped_count, resumed_from=resumed_from, started=int(time.time()), finished=None, error=None
+        )
+
+        def commit_batch(batch):
+            nonlocal restored_count, skipped_count, processed
+            results = list(executor.map(restore_symlink_entry, batch))
+            rows = [(symlink_path, target_path) for symlink_path, target_path, error in results if error is None]
+            batch_errors = [error for _, _, error in results if error is not None]
+            # Each batch is its own short transaction, recorded with its
+            # position in the file so a re-upload carries on from here
+            with write_pool.connection() as conn:
+                cursor = conn.cursor()
+                if rows:
+                    symlinks_added, targets_added = insert_symlink_rows(cursor, rows)
+                    adjust_counter(cursor, 'total_symlinks', symlinks_added)
+                    adjust_counter(cursor, 'unique_targets', targets_added)
+                    bump_data_version(cursor)
+                execute_with_retry(cursor, '''
+                    INSERT INTO restore_progress (backup_key, entries_done, restored, skipped, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(backup_key) DO UPDATE SET
+                        entries_done = excluded.entries_done,
+                        restored = excluded.restored,
+                        skipped = excluded.skipped,
+                        updated_at = excluded.updated_at
+                ''', (backup_key, processed + len(batch), restored_count + len(rows),
+                      skipped_count + len(batch_errors), int(time.time())))
+                conn.commit()
+            processed += len(batch)
+            restored_count += len(rows)
+            skipped_count += len(batch_errors)
+            errors.extend(batch_errors[:RESTORE_MAX_ERRORS - len(errors)])
+            update_restore_status(processed=processed, restored=restored_count, skipped=skipped_count)
+
+        with ThreadPoolExecutor(max_workers=RESTORE_WORKERS) as executor:
+            batch = []
+            for entry in iter_backup_entries(open_backup(file.stream, head)):
+                if processed < resumed_from:
+                    processed += 1
                     continue
-            
-            # Commit the transaction
+                batch.append(entry)
+                if len(batch) >= RESTORE_BATCH_SIZE:
+                    commit_batch(batch)
+                    batch = []
+            commit_batch(batch)
+
+        # Finished, so uploading the same file again starts over
+        with write_pool.connection() as conn:
+            cursor = conn.cursor()
+            execute_with_retry(cursor, 'DELETE FROM restore_progress WHERE backup_key = ?', (backup_key,))
+            record_event(cursor, 'restore', {'restored_count': restored_count, 'skipped_count': skipped_count})
             conn.commit()
-            
-            return jsonify({
-                'message': 'Symlinks restored successfully',
-                'restored_count': restored_count,
-                'skipped_count': skipped_count,
-                'errors': errors
-            })
-            
-        except Exception as e:
-            # Rollback on error
-            conn.rollback()
-            raise e
-            
+        update_restore_status(running=False, finished=int(time.time()))
+
+        return jsonify({
+            'message': 'Symlinks restored successfully',
+            'restored_count': restored_count,
+            'skipped_count': skipped_count,
+            'resumed_from': resumed_from,
+            'errors': errors,
+            'error_count': skipped_count
+        })
     except Exception as e:
-        return jsonify({'error': f'Error restoring symlinks: {str(e)}'}), 500
+        # Batches already committed stay restored; re-uploading the file resumes after them.
+        # The pool rolls back whatever a failed batch left uncommitted.
+        update_restore_status(running=False, finished=int(time.time()), error=str(e))
+        status = 400 if isinstance(e, (ValueError, OSError, EOFError)) else 500
+        return jsonify({'error': f'Error restoring symlinks: {str(e)}', 'restored_count': restored_count}), status
     finally:
-        conn.close()
+        restore_lock.release()
 
 @app.route('/settings')
 def settings():
@@ -786,18 +1302,9 @@ def reload_settings():
         }), 500
 
 # Initialize database tables
+# Metrics history is sampled by alfred.py on a fixed cadence (METRICS_INTERVAL)
 init_db()
 
-# Set up a background task to record metrics periodically
-def start_metrics_recording():
-    while True:
-        record_metrics()
-        time.sleep(3600)  # Record metrics every hour
-
-import threading
-metrics_thread = threading.Thread(target=start_metrics_recording, daemon=True)
-metrics_thread.start()
-
 if __name__ == '__main__':
     # Suppress all Flask development server logs
     import logging
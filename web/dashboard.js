@@ -4,6 +4,8 @@ document.addEventListener('DOMContentLoaded', () => {
     const lastScanSpan = document.getElementById('last-scan');
     const totalDeletionsSpan = document.getElementById('total-deletions');
     const runScanButton = document.getElementById('run-scan');
+    const runFullScanButton = document.getElementById('run-full-scan');
+    const cancelScanButton = document.getElementById('cancel-scan');
     const dryRunCheckbox = document.getElementById('dry-run');
     const noConfirmCheckbox = document.getElementById('no-confirm');
     const scanStatus = document.getElementById('scan-status');
@@ -151,6 +153,100 @@ document.addEventListener('DOMContentLoaded', () => {
     initChart();
     updateChart();
 
+    // Scan performance chart: one stacked bar per scan, split by phase
+    const scanPhases = {
+        symlink_walk: { label: 'Symlink Walk', color: '0, 123, 255' },
+        symlink_db: { label: 'Symlink Database', color: '111, 66, 193' },
+        torrent_walk: { label: 'Torrent Walk', color: '40, 167, 69' },
+        directory_cache: { label: 'Directory Cache', color: '253, 126, 20' },
+        delete: { label: 'Delete', color: '220, 53, 69' }
+    };
+    const scanPerformanceChart = new Chart(document.getElementById('scan-performance-chart').getContext('2d'), {
+        type: 'bar',
+        data: {
+            labels: [],
+            datasets: Object.values(scanPhases).map(phase => ({
+                label: phase.label,
+                data: [],
+                backgroundColor: `rgba(${phase.color}, 0.5)`,
+                borderColor: `rgba(${phase.color}, 1)`,
+                borderWidth: 1,
+                barPercentage: 0.8
+            }))
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                legend: {
+                    position: 'top',
+                },
+                tooltip: {
+                    mode: 'index',
+                    intersect: false,
+                    callbacks: {
+                        label: function(context) {
+                            return `${context.dataset.label}: ${context.parsed.y.toFixed(2)}s`;
+                        }
+                    }
+                }
+            },
+            scales: {
+                x: {
+                    stacked: true,
+                    grid: {
+                        display: false
+                    }
+                },
+                y: {
+                    stacked: true,
+                    beginAtZero: true,
+                    title: {
+                        display: true,
+                        text: 'Seconds'
+                    }
+                }
+            },
+            animation: {
+                duration: 500
+            }
+        }
+    });
+
+    function formatBytes(bytes) {
+        const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+        let unit = 0;
+        while (bytes >= 1024 && unit < units.length - 1) {
+            bytes /= 1024;
+            unit++;
+        }
+        return `${bytes.toFixed(unit ? 1 : 0)} ${units[unit]}`;
+    }
+
+    function updateScanPerformance(performance) {
+        const last = performance && performance.last;
+        if (!last) {
+            return;
+        }
+        const phases = Object.values(last.phases);
+        const sum = field => phases.reduce((total, phase) => total + phase[field], 0);
+        document.getElementById('scan-duration').textContent = `${(last.duration_seconds || 0).toFixed(1)}s`;
+        document.getElementById('scan-db').textContent =
+            `${(last.db_statements || 0).toLocaleString()} queries, ${(last.db_seconds || 0).toFixed(1)}s`;
+        const syscalls = document.getElementById('scan-syscalls');
+        syscalls.textContent = (sum('scandir_calls') + sum('stat_calls') + sum('readlink_calls') + sum('realpath_calls')).toLocaleString();
+        syscalls.title = `scandir ${sum('scandir_calls').toLocaleString()}, stat ${sum('stat_calls').toLocaleString()}, ` +
+            `readlink ${sum('readlink_calls').toLocaleString()}, realpath ${sum('realpath_calls').toLocaleString()}`;
+        document.getElementById('scan-peak-memory').textContent = last.peak_rss_kb ? formatBytes(last.peak_rss_kb * 1024) : '-';
+        document.getElementById('scan-reclaimed').textContent = formatBytes(last.bytes_deleted || 0);
+
+        scanPerformanceChart.data.labels = performance.history.map(scan => new Date(scan.scan_time * 1000).toLocaleString());
+        Object.keys(scanPhases).forEach((phase, index) => {
+            scanPerformanceChart.data.datasets[index].data = performance.history.map(scan => scan.phases[phase] || 0);
+        });
+        scanPerformanceChart.update();
+    }
+
     // Fetch dashboard data
     async function fetchDashboardData() {
         try {
@@ -182,6 +278,7 @@ document.addEventListener('DOMContentLoaded', () => {
         document.getElementById('files-checked').textContent = scanResults.files_checked;
         document.getElementById('files-deleted').textContent = scanResults.files_deleted;
         document.getElementById('folders-deleted').textContent = scanResults.folders_deleted;
+        updateScanPerformance(data.scan_performance);
         
         // Format next scan time
         const nextScanDate = data.next_scan ? new Date(data.next_scan * 1000) : null;
@@ -245,16 +342,59 @@ document.addEventListener('DOMContentLoaded', () => {
         return `${Math.floor(seconds / 86400)} days ago`;
     }
 
-    // Handle manual scan
-    runScanButton.addEventListener('click', async () => {
-        runScanButton.disabled = true;
+    // Handle manual scan: the daemon runs it as a job, whose progress arrives as scan_job events
+    let activeScanJob = null;
+
+    function describeScanJob(job) {
+        const kind = job.full_scan ? 'Full scan' : 'Scan';
+        switch (job.status) {
+            case 'queued':
+                return `${kind} job #${job.id} queued, waiting for the alfred daemon...`;
+            case 'running':
+                return job.cancel_requested
+                    ? `${kind} job #${job.id} is stopping...`
+                    : `${kind} job #${job.id} running...`;
+            case 'succeeded': {
+                const result = job.result || {};
+                if (result.paused) {
+                    return `${kind} job #${job.id} paused after its time slice; the next scan continues where it stopped.`;
+                }
+                return `${kind} job #${job.id} completed in ${result.duration_seconds}s: ` +
+                    `${(result.files_checked || 0).toLocaleString()} files checked, ` +
+                    `${(result.files_deleted || 0).toLocaleString()} files and ` +
+                    `${(result.folders_deleted || 0).toLocaleString()} folders deleted.`;
+            }
+            case 'cancelled':
+                return `${kind} job #${job.id} was cancelled.`;
+            default:
+                return `${kind} job #${job.id} failed: ${job.error}`;
+        }
+    }
+
+    function showScanJob(job) {
+        const finished = !['queued', 'running'].includes(job.status);
+        activeScanJob = finished ? null : job;
+        runScanButton.disabled = !finished;
+        runFullScanButton.disabled = !finished;
+        cancelScanButton.style.display = finished ? 'none' : '';
+        cancelScanButton.disabled = Boolean(job.cancel_requested);
         scanStatus.style.display = 'block';
-        scanStatus.textContent = '';
-        
+        scanStatus.textContent = describeScanJob(job);
+        if (finished) {
+            fetchDashboardData();
+            const keepVisibleTime = job.status === 'failed' ? 60000 : 30000;
+            setTimeout(() => {
+                if (!activeScanJob) {
+                    scanStatus.style.display = 'none';
+                }
+            }, keepVisibleTime);
+        }
+    }
+
+    async function runScan(fullScan) {
+        runScanButton.disabled = true;
+        runFullScanButton.disabled = true;
         try {
-            const controller = new AbortController();
-            const timeoutId = setTimeout(() => controller.abort(), 300000); // 5 minute timeout
-            
             const response = await fetch('/api/scan', {
                 method: 'POST',
                 headers: {
@@ -262,115 +402,54 @@ document.addEventListener('DOMContentLoaded', () => {
                 },
                 body: JSON.stringify({
                     dry_run: false,
-                    no_confirm: true
-                }),
-                signal: controller.signal
+                    no_confirm: true,
+                    full_scan: fullScan
+                })
             });
-
-            clearTimeout(timeoutId);
-
+            const data = await response.json();
             if (!response.ok) {
-                throw new Error(`Server error: ${response.status} ${response.statusText}`);
-            }
-
-            const reader = response.body.getReader();
-            const decoder = new TextDecoder();
-            let hasOutput = false;
-            let lastUpdate = Date.now();
-            let progressDots = 0;
-
-            while (true) {
-                const { done, value } = await reader.read();
-                if (done) break;
-                
-                const text = decoder.decode(value);
-                if (text.trim()) {
-                    scanStatus.textContent += text;
-                    scanStatus.scrollTop = scanStatus.scrollHeight;
-                    hasOutput = true;
-                    lastUpdate = Date.now();
-                } else {
-                    // Add progress indicator if no new output for 2 seconds
-                    const now = Date.now();
-                    if (now - lastUpdate > 2000) {
-                        progressDots = (progressDots + 1) % 4;
-                        const dots = '.'.repeat(progressDots);
-                        scanStatus.textContent = scanStatus.textContent.replace(/\.{0,3}$/, dots);
-                        lastUpdate = now;
-                    }
-                }
+                throw new Error(data.error || `Server error: ${response.status} ${response.statusText}`);
             }
+            showScanJob(data.job);
+        } catch (error) {
+            console.error('Error starting scan:', error);
+            scanStatus.style.display = 'block';
+            scanStatus.textContent = `Error: ${error.message}`;
+            runScanButton.disabled = false;
+            runFullScanButton.disabled = false;
+        }
+    }
 
-            if (!hasOutput) {
-                throw new Error('No output received from scan');
+    async function cancelScan() {
+        if (!activeScanJob) {
+            return;
+        }
+        cancelScanButton.disabled = true;
+        try {
+            const response = await fetch(`/api/scan-jobs/${activeScanJob.id}/cancel`, { method: 'POST' });
+            const data = await response.json();
+            if (data.job) {
+                showScanJob(data.job);
             }
-
-            // Add a small delay before refreshing dashboard data
-            await new Promise(resolve => setTimeout(resolve, 1000));
-            
-            // Refresh dashboard data after scan
-            await fetchDashboardData();
-            
-            // Keep the scan status visible
-            const keepVisibleTime = scanStatus.textContent.includes('Error') ? 60000 : 30000;
-            setTimeout(() => {
-                scanStatus.style.display = 'none';
-            }, keepVisibleTime);
         } catch (error) {
-            console.error('Error during scan:', error);
-            let errorMessage = error.message;
-            
-            if (error.name === 'AbortError') {
-                errorMessage = 'Scan timed out after 5 minutes. Your library might be too large for the current timeout setting.';
-            } else if (error.message === 'Failed to fetch' || error.message.includes('network')) {
-                errorMessage = 'Network error: Please check your connection and try again. For large libraries, the scan might take several minutes.';
-            }
-            
-            scanStatus.textContent += `\nError: ${errorMessage}`;
-            // Keep error visible longer
-            setTimeout(() => {
-                scanStatus.style.display = 'none';
-            }, 60000); // Show for 1 minute on error
-        } finally {
-            runScanButton.disabled = false;
+            console.error('Error cancelling scan:', error);
+            cancelScanButton.disabled = false;
         }
-    });
+    }
 
-    document.getElementById('backup-symlinks').addEventListener('click', function() {
-        // Show loading state
-        const button = this;
-        const originalText = button.innerHTML;
-        button.innerHTML = '<i class="fa-solid fa-spinner fa-spin"></i> Creating Backup...';
-        button.disabled = true;
+    runScanButton.addEventListener('click', () => runScan(false));
+    runFullScanButton.addEventListener('click', () => runScan(true));
+    cancelScanButton.addEventListener('click', cancelScan);
 
-        // Make the API request
-        fetch('/api/backup-symlinks')
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error('Backup failed');
-                }
-                return response.blob();
-            })
-            .then(blob => {
-                // Create a download link
-                const url = window.URL.createObjectURL(blob);
-                const a = document.createElement('a');
-                a.href = url;
-                a.download = `symlinks_backup_${new Date().toISOString().split('T')[0]}.json`;
-                document.body.appendChild(a);
-                a.click();
-                window.URL.revokeObjectURL(url);
-                document.body.removeChild(a);
-            })
-            .catch(error => {
-                console.error('Error creating backup:', error);
-                alert('Failed to create backup. Please try again.');
-            })
-            .finally(() => {
-                // Reset button state
-                button.innerHTML = originalText;
-                button.disabled = false;
-            });
+    document.getElementById('backup-symlinks').addEventListener('click', function() {
+        // Let the browser stream the download straight to disk instead of
+        // buffering the whole backup in memory as a blob
+        const a = document.createElement('a');
+        a.href = '/api/backup-symlinks?compress=gzip';
+        a.download = `symlinks_backup_${new Date().toISOString().split('T')[0]}.ndjson.gz`;
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
     });
 
     // Add restore functionality
@@ -408,10 +487,16 @@ document.addEventListener('DOMContentLoaded', () => {
         })
         .then(data => {
             let message = `Successfully restored ${data.restored_count} symlinks`;
+            if (data.resumed_from > 0) {
+                message += ` (resumed after ${data.resumed_from} entries)`;
+            }
             if (data.skipped_count > 0) {
                 message += `\nSkipped ${data.skipped_count} symlinks`;
                 if (data.errors && data.errors.length > 0) {
                     message += '\n\nErrors:\n' + data.errors.join('\n');
+                    if (data.error_count > data.errors.length) {
+                        message += `\n...and ${data.error_count - data.errors.length} more`;
+                    }
                 }
             }
             alert(message);
@@ -430,30 +515,27 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 
-    // Scan status indicator polling for sidebar only
+    // Scan status indicator for sidebar only
     const scanStatusIndicatorSidebar = document.getElementById('scan-status-indicator-sidebar');
-    let scanStatusInterval = null;
 
-    function updateScanStatusIndicator() {
-        fetch('/api/scan-status')
-            .then(response => response.json())
-            .then(status => {
-                if (scanStatusIndicatorSidebar) {
-                    if (status.running) {
-                        scanStatusIndicatorSidebar.style.display = 'block';
-                        scanStatusIndicatorSidebar.innerHTML = '<span class="scan-spinner"></span> Scan in progress...';
-                    } else {
-                        scanStatusIndicatorSidebar.style.display = 'none';
-                        scanStatusIndicatorSidebar.innerHTML = '';
-                    }
-                }
-            })
-            .catch(() => {
-                if (scanStatusIndicatorSidebar) {
-                    scanStatusIndicatorSidebar.style.display = 'none';
-                    scanStatusIndicatorSidebar.innerHTML = '';
-                }
-            });
+    let currentScanStatus = {running: false};
+
+    function renderScanStatus(status) {
+        currentScanStatus = status;
+        const progress = status.progress && status.progress.running ? status.progress : null;
+        if (progress && activeScanJob && activeScanJob.status === 'running' && !activeScanJob.cancel_requested) {
+            scanStatus.textContent = `${describeScanJob(activeScanJob)} ${describeScanProgress(progress)}`;
+        }
+        if (scanStatusIndicatorSidebar) {
+            if (status.running || progress) {
+                scanStatusIndicatorSidebar.style.display = 'block';
+                scanStatusIndicatorSidebar.innerHTML = '<span class="scan-spinner"></span> ';
+                scanStatusIndicatorSidebar.append(progress ? describeScanProgress(progress) : 'Scan in progress...');
+            } else {
+                scanStatusIndicatorSidebar.style.display = 'none';
+                scanStatusIndicatorSidebar.innerHTML = '';
+            }
+        }
     }
 
     // Add spinner CSS if not already present
@@ -480,9 +562,43 @@ document.addEventListener('DOMContentLoaded', () => {
         document.head.appendChild(style);
     }
 
-    // Start polling for scan status
-    scanStatusInterval = setInterval(updateScanStatusIndicator, 2000);
-    updateScanStatusIndicator();
+    // Scan progress and data changes are pushed by the server
+    const events = window.alfredEvents;
+    events.addEventListener('scan', (event) => {
+        const status = JSON.parse(event.data);
+        renderScanStatus(status);
+        // Pick up a manual scan started before this page loaded or from another tab
+        if (status.job && !activeScanJob && status.job.requested_by === 'manual') {
+            showScanJob(status.job);
+        }
+        if (!status.running) {
+            fetchDashboardData();
+        }
+    });
+    events.addEventListener('scan_progress', (event) => {
+        renderScanStatus({...currentScanStatus, progress: JSON.parse(event.data)});
+    });
+    events.addEventListener('scan_job', (event) => {
+        const job = JSON.parse(event.data);
+        if (activeScanJob && job.id === activeScanJob.id) {
+            showScanJob(job);
+        }
+    });
+    events.addEventListener('restore_status', (event) => {
+        const status = JSON.parse(event.data);
+        const button = document.getElementById('restore-symlinks');
+        if (status.running && button.disabled) {
+            button.innerHTML = `<i class="fa-solid fa-spinner fa-spin"></i> Restoring... ${status.processed.toLocaleString()}`;
+        }
+    });
+    events.addEventListener('counters', (event) => {
+        const counters = JSON.parse(event.data);
+        document.getElementById('total-symlinks').textContent = counters.total_symlinks;
+        document.getElementById('unique-targets').textContent = counters.unique_targets;
+        document.getElementById('total-deletions').textContent = counters.total_deletions;
+    });
+    // Catch up on anything missed while the stream was disconnected
+    events.addEventListener('open', fetchDashboardData);
 
     // Initial data fetch
     fetchDashboardData();
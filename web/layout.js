@@ -1,3 +1,6 @@
+// Server-sent events shared by the page scripts; the browser reconnects on its own
+window.alfredEvents = new EventSource('/api/events');
+
 // Function to fetch and update directory status
 async function updateDirectoryStatus() {
     try {
@@ -5,36 +8,39 @@ async function updateDirectoryStatus() {
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
-        const data = await response.json();
-        
-        // Update symlink directories
-        const symlinkDirsList = document.getElementById('symlink-directories');
-        if (symlinkDirsList) {
-            symlinkDirsList.innerHTML = '';
-            if (data.symlink_directories && Array.isArray(data.symlink_directories)) {
-                data.symlink_directories.forEach(dir => {
-                    const item = createDirectoryItem(dir);
-                    symlinkDirsList.appendChild(item);
-                });
-            }
-        }
-        
-        // Update torrent directories
-        const torrentDirsList = document.getElementById('torrent-directories');
-        if (torrentDirsList) {
-            torrentDirsList.innerHTML = '';
-            if (data.torrent_directories && Array.isArray(data.torrent_directories)) {
-                data.torrent_directories.forEach(dir => {
-                    const item = createDirectoryItem(dir);
-                    torrentDirsList.appendChild(item);
-                });
-            }
-        }
+        renderDirectoryStatus(await response.json());
     } catch (error) {
         console.error('Error fetching directory status:', error);
     }
 }
 
+// Function to render directory status
+function renderDirectoryStatus(data) {
+    // Update symlink directories
+    const symlinkDirsList = document.getElementById('symlink-directories');
+    if (symlinkDirsList) {
+        symlinkDirsList.innerHTML = '';
+        if (data.symlink_directories && Array.isArray(data.symlink_directories)) {
+            data.symlink_directories.forEach(dir => {
+                const item = createDirectoryItem(dir);
+                symlinkDirsList.appendChild(item);
+            });
+        }
+    }
+    
+    // Update torrent directories
+    const torrentDirsList = document.getElementById('torrent-directories');
+    if (torrentDirsList) {
+        torrentDirsList.innerHTML = '';
+        if (data.torrent_directories && Array.isArray(data.torrent_directories)) {
+            data.torrent_directories.forEach(dir => {
+                const item = createDirectoryItem(dir);
+                torrentDirsList.appendChild(item);
+            });
+        }
+    }
+}
+
 // Function to create a directory item element
 function createDirectoryItem(dir) {
     const item = document.createElement('div');
@@ -98,10 +104,51 @@ document.addEventListener('DOMContentLoaded', () => {
         saveSidebarState(sidebar.classList.contains('collapsed'));
     });
     
-    // Refresh directory status every 30 seconds
-    setInterval(updateDirectoryStatus, 30000);
+    // Directory status changes are pushed by the server
+    window.alfredEvents.addEventListener('directories', (event) => {
+        renderDirectoryStatus(JSON.parse(event.data));
+    });
 });
 
+const scanPhaseLabels = {
+    starting: 'Starting',
+    symlink_walk: 'Scanning symlinks',
+    torrent_walk: 'Scanning torrents',
+    delete: 'Deleting',
+};
+
+function formatDuration(seconds) {
+    if (seconds < 60) {
+        return `${Math.round(seconds)}s`;
+    }
+    if (seconds < 3600) {
+        return `${Math.floor(seconds / 60)}m ${Math.round(seconds % 60)}s`;
+    }
+    return `${Math.floor(seconds / 3600)}h ${Math.round((seconds % 3600) / 60)}m`;
+}
+
+// One-line summary of a scan_progress event, for the scan indicators
+function describeScanProgress(progress) {
+    const parts = [];
+    if (progress.phase === 'delete' && progress.operations) {
+        const finished = (progress.deleted || 0) + (progress.delete_failures || 0);
+        parts.push(`${finished.toLocaleString()} of ${progress.operations.toLocaleString()} deletions`);
+    } else {
+        parts.push(`${progress.files.toLocaleString()} files in ${progress.directories.toLocaleString()} folders`);
+        if (progress.files_per_second) {
+            parts.push(`${Math.round(progress.files_per_second).toLocaleString()} files/s`);
+        }
+    }
+    if (progress.phase !== 'symlink_walk') {
+        parts.push(`${progress.candidates.toLocaleString()} unused`);
+    }
+    if (progress.eta_seconds !== null && progress.eta_seconds !== undefined) {
+        parts.push(`about ${formatDuration(progress.eta_seconds)} left`);
+    }
+    return `${scanPhaseLabels[progress.phase] || 'Scanning'}: ${parts.join(', ')}`;
+}
+window.describeScanProgress = describeScanProgress;
+
 // Global dark mode logic
 function setDarkMode(enabled) {
     if (enabled) {
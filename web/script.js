@@ -13,12 +13,16 @@ document.addEventListener('DOMContentLoaded', () => {
     const modalTarget = document.getElementById('modal-target');
     const modalRefCount = document.getElementById('modal-ref-count');
 
-    let originalData = [];
     let symlinksData = [];
     let searchTimeout;
     let currentPage = 1;
     let rowsPerPage = parseInt(rowsPerPageSelect.value);
     let currentSort = { column: null, ascending: true };
+    // pageCursors[n] is the cursor that loads page n + 1; the first page needs none
+    let pageCursors = [null];
+    let nextCursor = null;
+    let totalSymlinks = 0;
+    let uniqueTargets = 0;
 
     // Modal functionality
     function showModal() {
@@ -36,48 +40,41 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
-    // Fetch data from the backend
+    // Fetch the current page from the backend
     async function fetchSymlinks() {
         const loadingAnimation = document.getElementById('loading-animation');
         try {
             loadingAnimation.classList.add('visible');
-            const response = await fetch(`${window.location.origin}/api/symlinks`);
+            const params = new URLSearchParams({
+                limit: rowsPerPage,
+                sort: currentSort.column || 'symlink',
+                order: currentSort.ascending ? 'asc' : 'desc'
+            });
+            const searchTerm = searchInput.value.trim();
+            if (searchTerm) {
+                params.set('search', searchTerm);
+            }
+            const pageCursor = pageCursors[currentPage - 1];
+            if (pageCursor) {
+                params.set('cursor', pageCursor);
+            }
+
+            const response = await fetch(`${window.location.origin}/api/symlinks?${params}`);
             const data = await response.json();
-            originalData = data;
-            
-            // Store current search term
-            const currentSearchTerm = searchInput.value;
-            
-            // Apply current search filter if exists
-            if (currentSearchTerm) {
-                symlinksData = data.filter(item => 
-                    item.symlink.toLowerCase().includes(currentSearchTerm.toLowerCase()) ||
-                    item.target.toLowerCase().includes(currentSearchTerm.toLowerCase())
-                );
-            } else {
-                symlinksData = [...data];
+            if (!response.ok) {
+                throw new Error(data.error || `HTTP error! status: ${response.status}`);
             }
-            
-            // Re-apply current sort if exists
-            if (currentSort.column) {
-                symlinksData.sort((a, b) => {
-                    let valueA = a[currentSort.column];
-                    let valueB = b[currentSort.column];
-
-                    if (currentSort.column === 'ref_count') {
-                        valueA = parseInt(valueA);
-                        valueB = parseInt(valueB);
-                    } else {
-                        valueA = valueA.toLowerCase();
-                        valueB = valueB.toLowerCase();
-                    }
-
-                    if (valueA < valueB) return currentSort.ascending ? -1 : 1;
-                    if (valueA > valueB) return currentSort.ascending ? 1 : -1;
-                    return 0;
-                });
+
+            symlinksData = data.items;
+            nextCursor = data.next_cursor;
+            pageCursors[currentPage] = nextCursor;
+
+            // Totals are only returned with the first page of a listing
+            if (data.total !== undefined) {
+                totalSymlinks = data.total;
+                uniqueTargets = data.unique_targets;
             }
-            
+
             updateStats();
             renderTable();
         } catch (error) {
@@ -87,31 +84,28 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // Start again from the first page after the listing changes
+    function resetPaging() {
+        currentPage = 1;
+        pageCursors = [null];
+        nextCursor = null;
+    }
+
     // Update statistics
     function updateStats() {
-        const totalSymlinks = symlinksData.length;
-        const uniqueTargets = new Set(symlinksData.map(item => item.target)).size;
-
         totalSymlinksSpan.textContent = totalSymlinks;
         uniqueTargetsSpan.textContent = uniqueTargets;
     }
 
-    // Calculate pagination
-    function getPaginatedData(data) {
-        const start = (currentPage - 1) * rowsPerPage;
-        const end = start + rowsPerPage;
-        return data.slice(start, end);
-    }
-
     // Update pagination controls
     function updatePaginationControls() {
-        const totalPages = Math.ceil(symlinksData.length / rowsPerPage);
+        const totalPages = Math.max(1, Math.ceil(totalSymlinks / rowsPerPage));
         pageInfo.textContent = `Page ${currentPage} of ${totalPages}`;
         prevPageButton.disabled = currentPage === 1;
-        nextPageButton.disabled = currentPage === totalPages;
+        nextPageButton.disabled = !nextCursor;
     }
 
-    // Sort data
+    // Sort data on the server
     function sortData(column) {
         if (currentSort.column === column) {
             currentSort.ascending = !currentSort.ascending;
@@ -120,48 +114,20 @@ document.addEventListener('DOMContentLoaded', () => {
             currentSort.ascending = true;
         }
 
-        symlinksData.sort((a, b) => {
-            let valueA = a[column];
-            let valueB = b[column];
-
-            if (column === 'ref_count') {
-                valueA = parseInt(valueA);
-                valueB = parseInt(valueB);
-            } else {
-                valueA = valueA.toLowerCase();
-                valueB = valueB.toLowerCase();
-            }
-
-            if (valueA < valueB) return currentSort.ascending ? -1 : 1;
-            if (valueA > valueB) return currentSort.ascending ? 1 : -1;
-            return 0;
-        });
-
-        currentPage = 1;
-        renderTable();
+        resetPaging();
+        fetchSymlinks();
     }
 
-    // Filter data
-    function filterData(searchTerm) {
-        if (!searchTerm) {
-            symlinksData = [...originalData];
-        } else {
-            searchTerm = searchTerm.toLowerCase();
-            symlinksData = originalData.filter(item => 
-                item.symlink.toLowerCase().includes(searchTerm) ||
-                item.target.toLowerCase().includes(searchTerm)
-            );
-        }
-        currentPage = 1;
-        updateStats();
-        renderTable();
+    // Filter data on the server
+    function filterData() {
+        resetPaging();
+        fetchSymlinks();
     }
 
-    // Render the table with pagination
+    // Render the current page
     function renderTable() {
         symlinksBody.innerHTML = '';
         const fragment = document.createDocumentFragment();
-        const paginatedData = getPaginatedData(symlinksData);
         
         // Update header sort indicators
         document.querySelectorAll('.sort-indicator').forEach(indicator => {
@@ -173,7 +139,7 @@ document.addEventListener('DOMContentLoaded', () => {
             }
         });
 
-        paginatedData.forEach(item => {
+        symlinksData.forEach(item => {
             const row = document.createElement('tr');
             const escapedSymlink = item.symlink.replace(/'/g, "\\'");
             row.innerHTML = `
@@ -195,31 +161,28 @@ document.addEventListener('DOMContentLoaded', () => {
     // Event listeners for pagination
     rowsPerPageSelect.addEventListener('change', () => {
         rowsPerPage = parseInt(rowsPerPageSelect.value);
-        currentPage = 1;
-        renderTable();
+        resetPaging();
+        fetchSymlinks();
     });
 
     prevPageButton.addEventListener('click', () => {
         if (currentPage > 1) {
             currentPage--;
-            renderTable();
+            fetchSymlinks();
         }
     });
 
     nextPageButton.addEventListener('click', () => {
-        const totalPages = Math.ceil(symlinksData.length / rowsPerPage);
-        if (currentPage < totalPages) {
+        if (nextCursor) {
             currentPage++;
-            renderTable();
+            fetchSymlinks();
         }
     });
 
     // Debounced search functionality
-    searchInput.addEventListener('input', (e) => {
+    searchInput.addEventListener('input', () => {
         clearTimeout(searchTimeout);
-        searchTimeout = setTimeout(() => {
-            filterData(e.target.value);
-        }, 300);
+        searchTimeout = setTimeout(filterData, 300);
     });
 
     // Add click handlers for sorting
@@ -298,34 +261,46 @@ document.addEventListener('DOMContentLoaded', () => {
     // Initial data fetch
     fetchSymlinks();
 
-    // Refresh data every 30 seconds
-    setInterval(fetchSymlinks, 30000);
+    // Reload the visible page when the server reports changes, coalescing bursts
+    let refreshTimeout;
+    function scheduleRefresh() {
+        clearTimeout(refreshTimeout);
+        refreshTimeout = setTimeout(fetchSymlinks, 500);
+    }
+
+    const events = window.alfredEvents;
+    events.addEventListener('counters', (event) => {
+        // Unfiltered totals can be shown as they arrive
+        if (!searchInput.value.trim()) {
+            const counters = JSON.parse(event.data);
+            totalSymlinks = counters.total_symlinks;
+            uniqueTargets = counters.unique_targets;
+            updateStats();
+            updatePaginationControls();
+        }
+        scheduleRefresh();
+    });
+    // Catch up on anything missed while the stream was disconnected
+    events.addEventListener('open', scheduleRefresh);
 
     // Add global error handler for fetch calls
     window.addEventListener('unhandledrejection', function(event) {
         console.error('Unhandled promise rejection:', event.reason);
     });
 
-    // Scan status indicator polling
+    // Scan status indicator
     const scanStatusIndicator = document.getElementById('scan-status-indicator-sidebar');
-    let scanStatusInterval = null;
-
-    function updateScanStatusIndicator() {
-        fetch('/api/scan-status')
-            .then(response => response.json())
-            .then(status => {
-                if (status.running) {
-                    scanStatusIndicator.style.display = 'block';
-                    scanStatusIndicator.innerHTML = '<span class="scan-spinner"></span> Scan in progress...';
-                } else {
-                    scanStatusIndicator.style.display = 'none';
-                    scanStatusIndicator.innerHTML = '';
-                }
-            })
-            .catch(() => {
-                scanStatusIndicator.style.display = 'none';
-                scanStatusIndicator.innerHTML = '';
-            });
+
+    function renderScanStatus(status) {
+        const progress = status.progress && status.progress.running ? status.progress : null;
+        if (status.running || progress) {
+            scanStatusIndicator.style.display = 'block';
+            scanStatusIndicator.innerHTML = '<span class="scan-spinner"></span> ';
+            scanStatusIndicator.append(progress ? describeScanProgress(progress) : 'Scan in progress...');
+        } else {
+            scanStatusIndicator.style.display = 'none';
+            scanStatusIndicator.innerHTML = '';
+        }
     }
 
     // Add spinner CSS
@@ -349,7 +324,14 @@ document.addEventListener('DOMContentLoaded', () => {
     `;
     document.head.appendChild(style);
 
-    // Start polling for scan status
-    scanStatusInterval = setInterval(updateScanStatusIndicator, 2000);
-    updateScanStatusIndicator();
+    // Scan status is pushed by the server, starting with the current state
+    let scanStatus = {running: false};
+    events.addEventListener('scan', (event) => {
+        scanStatus = JSON.parse(event.data);
+        renderScanStatus(scanStatus);
+    });
+    events.addEventListener('scan_progress', (event) => {
+        scanStatus = {...scanStatus, progress: JSON.parse(event.data)};
+        renderScanStatus(scanStatus);
+    });
 }); 
\ No newline at end of file